@@ -0,0 +1,24 @@
+from logging.config import fileConfig
+from alembic import context
+from app.database import Base, engine
+import app.models  # noqa: F401  registers every table on Base.metadata
+
+config = context.config
+if config.config_file_name is not None:
+    fileConfig(config.config_file_name)
+
+
+def run_migrations_online():
+    with engine.connect() as connection:
+        # New tables come from the models as at startup; revisions only alter tables that already existed
+        Base.metadata.create_all(bind=connection)
+        connection.commit()
+
+        context.configure(connection=connection, target_metadata=Base.metadata)
+        with context.begin_transaction():
+            context.run_migrations()
+
+
+if context.is_offline_mode():
+    raise SystemExit("Offline (--sql) migrations are not supported; run against the database")
+run_migrations_online()
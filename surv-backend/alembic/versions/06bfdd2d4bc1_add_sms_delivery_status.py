@@ -0,0 +1,24 @@
+"""add Twilio delivery status columns to sms_messages (user-033)
+
+Revision ID: 06bfdd2d4bc1
+Revises: 118bd2aecb65
+Create Date: 2026-10-19
+"""
+import sqlalchemy as sa
+from alembic import op
+from app.utils.migrations import add_column
+
+revision = "06bfdd2d4bc1"
+down_revision = "118bd2aecb65"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    add_column("sms_messages", sa.Column("error_code", sa.String(10)))
+    add_column("sms_messages", sa.Column("status_updated_at", sa.DateTime()))
+
+
+def downgrade():
+    op.drop_column("sms_messages", "status_updated_at")
+    op.drop_column("sms_messages", "error_code")
@@ -0,0 +1,28 @@
+"""add SMS thread lookup columns and keyset indexes (user-034)
+
+Revision ID: 118bd2aecb65
+Revises: 80cb098f8601
+Create Date: 2026-10-19
+"""
+import sqlalchemy as sa
+from alembic import op
+from app.utils.migrations import add_column, create_index
+
+revision = "118bd2aecb65"
+down_revision = "80cb098f8601"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Existing messages get counterpart_number and threads from
+    # `python -m app.utils.sms_threads backfill`
+    add_column("sms_messages", sa.Column("counterpart_number", sa.String(20)))
+    create_index("ix_sms_messages_thread", "sms_messages", ["counterpart_number", "received_at", "id"])
+    create_index("ix_sms_messages_job", "sms_messages", ["job_id", "received_at", "id"])
+
+
+def downgrade():
+    op.drop_index("ix_sms_messages_job", "sms_messages")
+    op.drop_index("ix_sms_messages_thread", "sms_messages")
+    op.drop_column("sms_messages", "counterpart_number")
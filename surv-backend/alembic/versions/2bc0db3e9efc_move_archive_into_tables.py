@@ -0,0 +1,78 @@
+"""move file-based archive segments into archive tables (user-039)
+
+Revision ID: 2bc0db3e9efc
+Revises: c7c853077144
+Create Date: 2026-10-19
+"""
+import gzip
+import json
+from datetime import date, datetime
+from decimal import Decimal
+from pathlib import Path
+import sqlalchemy as sa
+from alembic import op
+from app.config import settings
+from app.utils.archive import ARCHIVED_TABLES
+
+revision = "2bc0db3e9efc"
+down_revision = "c7c853077144"
+branch_labels = None
+depends_on = None
+
+# Rows per INSERT while importing a file
+IMPORT_BATCH = 5000
+
+
+def _decoders(table):
+    decoders = {}
+    for column in table.columns:
+        if isinstance(column.type, sa.DateTime):
+            decoders[column.name] = datetime.fromisoformat
+        elif isinstance(column.type, sa.Date):
+            decoders[column.name] = date.fromisoformat
+        elif isinstance(column.type, sa.Float):
+            decoders[column.name] = float
+        elif isinstance(column.type, sa.Numeric):
+            decoders[column.name] = Decimal
+    return decoders
+
+
+def _import_file(conn, archive, path: Path):
+    decoders = _decoders(archive)
+    batch = []
+    with gzip.open(path, "rt", encoding="utf-8") as archive_file:
+        for line in archive_file:
+            row = json.loads(line)
+            row = {name: row.get(name) for name in archive.columns.keys()}
+            for name, decode in decoders.items():
+                if row[name] is not None:
+                    row[name] = decode(row[name])
+            batch.append(row)
+            if len(batch) == IMPORT_BATCH:
+                conn.execute(archive.insert(), batch)
+                batch = []
+    if batch:
+        conn.execute(archive.insert(), batch)
+
+
+def upgrade():
+    conn = op.get_bind()
+    if "path" not in {c["name"] for c in sa.inspect(conn).get_columns("archive_segments")}:
+        return
+
+    segments = sa.table("archive_segments", sa.column("id"), sa.column("table_name"), sa.column("path"))
+    for segment_id, table_name, relative_path in conn.execute(sa.select(segments)).all():
+        path = Path(settings.ARCHIVE_DIR) / relative_path
+        if path.exists():
+            _import_file(conn, ARCHIVED_TABLES[table_name][1], path)
+        else:
+            # Lost with an ephemeral disk; the segment would only point at nothing
+            print(f"Archive file {path} is missing; dropping its segment")
+            conn.execute(segments.delete().where(segments.c.id == segment_id))
+
+    with op.batch_alter_table("archive_segments") as batch_op:
+        batch_op.drop_column("path")
+
+
+def downgrade():
+    raise NotImplementedError("Archived rows are not written back to files")
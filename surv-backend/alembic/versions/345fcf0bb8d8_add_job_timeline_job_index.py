@@ -0,0 +1,21 @@
+"""add the per-job timeline index (user-035)
+
+Revision ID: 345fcf0bb8d8
+Revises: 939cd3ff7ed2
+Create Date: 2026-10-19
+"""
+from alembic import op
+from app.utils.migrations import create_index
+
+revision = "345fcf0bb8d8"
+down_revision = "939cd3ff7ed2"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    create_index("ix_job_timeline_job", "job_timeline", ["job_id", "event_time"])
+
+
+def downgrade():
+    op.drop_index("ix_job_timeline_job", "job_timeline")
@@ -0,0 +1,22 @@
+"""add users.skills for technician matching (user-044)
+
+Revision ID: 6a21cfc05af9
+Revises:
+Create Date: 2026-10-19
+"""
+import sqlalchemy as sa
+from alembic import op
+from app.utils.migrations import add_column
+
+revision = "6a21cfc05af9"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    add_column("users", sa.Column("skills", sa.JSON()))
+
+
+def downgrade():
+    op.drop_column("users", "skills")
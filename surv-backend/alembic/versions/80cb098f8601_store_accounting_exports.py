@@ -0,0 +1,51 @@
+"""add accounting export columns to invoices; keep export files in the database (user-050)
+
+Revision ID: 80cb098f8601
+Revises: 2bc0db3e9efc
+Create Date: 2026-10-19
+"""
+from pathlib import Path
+import sqlalchemy as sa
+from alembic import op
+from app.config import settings
+from app.utils.migrations import add_column, create_index
+
+revision = "80cb098f8601"
+down_revision = "2bc0db3e9efc"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    add_column("invoices", sa.Column("change_seq", sa.BigInteger()))
+    create_index("ix_invoices_change_seq", "invoices", ["change_seq"])
+    add_column("invoices", sa.Column(
+        "accounting_export_id", sa.String(),
+        # Named as PostgreSQL names the constraint create_all makes
+        sa.ForeignKey("accounting_exports.id", name="invoices_accounting_export_id_fkey")
+    ))
+    add_column("invoices", sa.Column("accounting_digest", sa.String(64)))
+
+    add_column("accounting_exports", sa.Column(
+        "source_export_id", sa.String(),
+        sa.ForeignKey("accounting_exports.id", name="accounting_exports_source_export_id_fkey")
+    ))
+    add_column("accounting_exports", sa.Column("content", sa.LargeBinary()))
+
+    conn = op.get_bind()
+    if "file_path" not in {c["name"] for c in sa.inspect(conn).get_columns("accounting_exports")}:
+        return
+    exports = sa.table("accounting_exports", sa.column("id"), sa.column("file_path"), sa.column("content", sa.LargeBinary))
+    for export_id, file_path in conn.execute(sa.select(exports.c.id, exports.c.file_path).where(
+        exports.c.file_path.isnot(None), exports.c.content.is_(None)
+    )).all():
+        path = Path(settings.ACCOUNTING_EXPORT_DIR) / file_path
+        # Files already lost stay empty; download answers 410 and the export can be re-exported
+        if path.exists():
+            conn.execute(exports.update().where(exports.c.id == export_id).values(content=path.read_bytes()))
+    with op.batch_alter_table("accounting_exports") as batch_op:
+        batch_op.drop_column("file_path")
+
+
+def downgrade():
+    raise NotImplementedError("Export files are not written back to ACCOUNTING_EXPORT_DIR")
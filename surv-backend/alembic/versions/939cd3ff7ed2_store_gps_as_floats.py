@@ -0,0 +1,98 @@
+"""store GPS coordinates as floats with a grid-cell key (user-040)
+
+Revision ID: 939cd3ff7ed2
+Revises: c0fd17e0c7f4
+Create Date: 2026-10-19
+"""
+import math
+import sqlalchemy as sa
+from alembic import op
+from app.utils.geo import encode_cell
+from app.utils.migrations import add_column, alter_column_type, column_type, create_index
+
+revision = "939cd3ff7ed2"
+down_revision = "c0fd17e0c7f4"
+branch_labels = None
+depends_on = None
+
+# Rows per UPDATE while filling in geo_cell
+UPDATE_BATCH = 1000
+
+COORDINATE_LIMITS = {"latitude": 90, "longitude": 180}
+
+
+def _coordinate_table(table_name: str):
+    return sa.table(table_name, sa.column("id"), sa.column("latitude"), sa.column("longitude"), sa.column("geo_cell"))
+
+
+def _valid(value, limit: int) -> bool:
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return False
+    return math.isfinite(number) and -limit <= number <= limit
+
+
+def _clear_unparseable_coordinates(conn, table_name: str):
+    """Text coordinates that are not numbers cannot be cast, so they are cleared instead"""
+    table = _coordinate_table(table_name)
+    bad_ids = [
+        row.id for row in conn.execute(
+            sa.select(table.c.id, table.c.latitude, table.c.longitude).where(
+                sa.or_(table.c.latitude.isnot(None), table.c.longitude.isnot(None))
+            )
+        )
+        if not all(_valid(getattr(row, name), limit) for name, limit in COORDINATE_LIMITS.items())
+    ]
+    for start in range(0, len(bad_ids), UPDATE_BATCH):
+        conn.execute(
+            table.update().where(table.c.id.in_(bad_ids[start:start + UPDATE_BATCH]))
+            .values(latitude=None, longitude=None)
+        )
+
+
+def _fill_geo_cells(conn, table_name: str):
+    table = _coordinate_table(table_name)
+    rows = conn.execute(
+        sa.select(table.c.id, table.c.latitude, table.c.longitude).where(
+            table.c.latitude.isnot(None),
+            table.c.longitude.isnot(None),
+            table.c.geo_cell.is_(None)
+        )
+    ).all()
+    stmt = table.update().where(table.c.id == sa.bindparam("row_id")).values(geo_cell=sa.bindparam("cell"))
+    for start in range(0, len(rows), UPDATE_BATCH):
+        conn.execute(stmt, [
+            {"row_id": row.id, "cell": encode_cell(float(row.latitude), float(row.longitude))}
+            for row in rows[start:start + UPDATE_BATCH]
+        ])
+
+
+def upgrade():
+    conn = op.get_bind()
+
+    # job_timeline stored coordinates as text, time_entries as NUMERIC
+    if isinstance(column_type("job_timeline", "latitude"), sa.String):
+        _clear_unparseable_coordinates(conn, "job_timeline")
+    for table_name in ("job_timeline", "time_entries"):
+        for column_name in COORDINATE_LIMITS:
+            alter_column_type(
+                table_name, column_name, sa.Float(),
+                postgresql_using=f"{column_name}::double precision"
+            )
+
+    for table_name, time_column in (("job_timeline", "event_time"), ("time_entries", "entry_time")):
+        add_column(table_name, sa.Column("geo_cell", sa.BigInteger()))
+        _fill_geo_cells(conn, table_name)
+        create_index(f"ix_{table_name}_geo_cell", table_name, ["geo_cell", time_column])
+
+    add_column("customers", sa.Column("latitude", sa.Float()))
+    add_column("customers", sa.Column("longitude", sa.Float()))
+
+
+def downgrade():
+    op.drop_column("customers", "longitude")
+    op.drop_column("customers", "latitude")
+    for table_name in ("time_entries", "job_timeline"):
+        op.drop_index(f"ix_{table_name}_geo_cell", table_name)
+        op.drop_column(table_name, "geo_cell")
@@ -0,0 +1,24 @@
+"""record which public client took each slot hold (user-027)
+
+Revision ID: 93d8cdc9a662
+Revises: 06bfdd2d4bc1
+Create Date: 2026-10-19
+"""
+import sqlalchemy as sa
+from alembic import op
+from app.utils.migrations import add_column, create_index
+
+revision = "93d8cdc9a662"
+down_revision = "06bfdd2d4bc1"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    add_column("slot_holds", sa.Column("client_key", sa.String(64)))
+    create_index("ix_slot_holds_client", "slot_holds", ["client_key", "expires_at"])
+
+
+def downgrade():
+    op.drop_index("ix_slot_holds_client", "slot_holds")
+    op.drop_column("slot_holds", "client_key")
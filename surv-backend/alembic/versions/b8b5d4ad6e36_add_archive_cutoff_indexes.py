@@ -0,0 +1,23 @@
+"""add the time indexes the archive job scans by (user-039)
+
+Revision ID: b8b5d4ad6e36
+Revises: fb1a9f07d3e4
+Create Date: 2026-10-19
+"""
+from alembic import op
+from app.utils.migrations import create_index
+
+revision = "b8b5d4ad6e36"
+down_revision = "fb1a9f07d3e4"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    create_index("ix_job_timeline_time", "job_timeline", ["event_time"])
+    create_index("ix_sms_messages_received", "sms_messages", ["received_at"])
+
+
+def downgrade():
+    op.drop_index("ix_sms_messages_received", "sms_messages")
+    op.drop_index("ix_job_timeline_time", "job_timeline")
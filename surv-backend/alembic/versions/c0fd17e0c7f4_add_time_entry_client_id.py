@@ -0,0 +1,25 @@
+"""add the mobile idempotency key to time_entries (user-038)
+
+Revision ID: c0fd17e0c7f4
+Revises: 93d8cdc9a662
+Create Date: 2026-10-19
+"""
+import sqlalchemy as sa
+from alembic import op
+from app.utils.migrations import add_column, create_index
+
+revision = "c0fd17e0c7f4"
+down_revision = "93d8cdc9a662"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    add_column("time_entries", sa.Column("client_entry_id", sa.String(64)))
+    # Existing rows have no key, and NULLs never conflict
+    create_index("uq_time_entries_client_entry", "time_entries", ["employee_id", "client_entry_id"], unique=True)
+
+
+def downgrade():
+    op.drop_index("uq_time_entries_client_entry", "time_entries")
+    op.drop_column("time_entries", "client_entry_id")
@@ -0,0 +1,30 @@
+"""add delta sync cursors to jobs, customers, job notes and files (user-046)
+
+Revision ID: c7c853077144
+Revises: 6a21cfc05af9
+Create Date: 2026-10-19
+"""
+import sqlalchemy as sa
+from alembic import op
+from app.utils.migrations import add_column, create_index
+
+revision = "c7c853077144"
+down_revision = "6a21cfc05af9"
+branch_labels = None
+depends_on = None
+
+SEQUENCED_TABLES = ("jobs", "customers", "job_notes", "file_uploads")
+
+
+def upgrade():
+    for table_name in SEQUENCED_TABLES:
+        add_column(table_name, sa.Column("change_seq", sa.BigInteger()))
+        create_index(f"ix_{table_name}_change_seq", table_name, ["change_seq"])
+    add_column("jobs", sa.Column("scope_seq", sa.BigInteger()))
+
+
+def downgrade():
+    op.drop_column("jobs", "scope_seq")
+    for table_name in SEQUENCED_TABLES:
+        op.drop_index(f"ix_{table_name}_change_seq", table_name)
+        op.drop_column(table_name, "change_seq")
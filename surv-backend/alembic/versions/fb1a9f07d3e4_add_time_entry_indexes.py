@@ -0,0 +1,23 @@
+"""add the timesheet indexes on time_entries (user-037)
+
+Revision ID: fb1a9f07d3e4
+Revises: 345fcf0bb8d8
+Create Date: 2026-10-19
+"""
+from alembic import op
+from app.utils.migrations import create_index
+
+revision = "fb1a9f07d3e4"
+down_revision = "345fcf0bb8d8"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    create_index("ix_time_entries_employee_time", "time_entries", ["employee_id", "entry_time"])
+    create_index("ix_time_entries_time", "time_entries", ["entry_time"])
+
+
+def downgrade():
+    op.drop_index("ix_time_entries_time", "time_entries")
+    op.drop_index("ix_time_entries_employee_time", "time_entries")
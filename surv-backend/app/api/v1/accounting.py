@@ -0,0 +1,190 @@
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Response, status
+from sqlalchemy.orm import Session
+from typing import Literal, Optional
+from datetime import date
+from pydantic import BaseModel
+from app.database import get_db
+from app.models.accounting_export import AccountingExport
+from app.models.user import User, UserRole
+from app.utils.accounting import WRITERS, release_stale_exports, run_export
+from app.utils.dependencies import get_current_user
+
+router = APIRouter(prefix="/accounting", tags=["accounting"])
+
+MEDIA_TYPES = {"iif": "application/octet-stream", "csv": "application/zip"}
+
+
+class AccountingExportCreate(BaseModel):
+    format: Literal["iif", "csv"] = "iif"
+    # Backfill range; leave both empty for an incremental export of changes since the last one
+    date_from: Optional[date] = None
+    date_to: Optional[date] = None
+
+
+def require_accounting_role(current_user: User):
+    if current_user.role not in [UserRole.admin, UserRole.manager]:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Only admins and managers can export accounting data"
+        )
+
+
+def _export_json(export: AccountingExport) -> dict:
+    return {
+        "id": export.id,
+        "format": export.format,
+        "kind": export.kind,
+        "status": export.status,
+        "date_from": export.date_from,
+        "date_to": export.date_to,
+        "source_export_id": export.source_export_id,
+        "invoice_count": export.invoice_count,
+        "line_count": export.line_count,
+        "payment_count": export.payment_count,
+        "voided_invoices": export.voided_invoices or [],
+        "modified_invoices": export.modified_invoices or [],
+        "error": export.error,
+        "created_at": export.created_at,
+        "started_at": export.started_at,
+        "completed_at": export.completed_at
+    }
+
+
+def _get_export(db: Session, export_id: str) -> AccountingExport:
+    export = db.query(AccountingExport).filter(AccountingExport.id == export_id).first()
+    if not export:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Export not found")
+    return export
+
+
+def _queue_export(db: Session, background_tasks: BackgroundTasks, export: AccountingExport) -> AccountingExport:
+    # One run at a time, so two runs never pick up the same invoices
+    release_stale_exports(db)
+    running = db.query(AccountingExport).filter(AccountingExport.status.in_(["pending", "running"])).first()
+    if running:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"Export {running.id} is still {running.status}"
+        )
+
+    db.add(export)
+    db.commit()
+    db.refresh(export)
+
+    background_tasks.add_task(run_export, export.id)
+    return export
+
+
+@router.post("/exports", status_code=status.HTTP_202_ACCEPTED)
+def start_accounting_export(
+    export_data: AccountingExportCreate,
+    background_tasks: BackgroundTasks,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Start a QuickBooks export of invoices, line items and payments (IIF, or a zip
+    of QuickBooks Online CSVs). Without dates it contains everything not exported
+    yet that changed since the last incremental export; with dates it backfills
+    that range. Poll the export, then download it when completed.
+    """
+    require_accounting_role(current_user)
+    if (export_data.date_from is None) != (export_data.date_to is None):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Give both date_from and date_to for a backfill, or neither"
+        )
+    if export_data.date_from and export_data.date_from > export_data.date_to:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="date_from must not be after date_to"
+        )
+
+    export = _queue_export(db, background_tasks, AccountingExport(
+        format=export_data.format,
+        kind="backfill" if export_data.date_from else "incremental",
+        date_from=export_data.date_from,
+        date_to=export_data.date_to,
+        created_by=current_user.id
+    ))
+    return _export_json(export)
+
+
+@router.get("/exports")
+def list_accounting_exports(
+    limit: int = 50,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Recent exports, newest first"""
+    require_accounting_role(current_user)
+    exports = db.query(AccountingExport).order_by(AccountingExport.created_at.desc()).limit(limit).all()
+    return [_export_json(export) for export in exports]
+
+
+@router.get("/exports/{export_id}")
+def get_accounting_export(
+    export_id: str,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Progress and totals of one export"""
+    require_accounting_role(current_user)
+    return _export_json(_get_export(db, export_id))
+
+
+@router.get("/exports/{export_id}/download")
+def download_accounting_export(
+    export_id: str,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """The finished export file"""
+    require_accounting_role(current_user)
+    export = _get_export(db, export_id)
+    if export.status != "completed":
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"Export is {export.status}"
+        )
+    content = db.query(AccountingExport.content).filter(AccountingExport.id == export.id).scalar()
+    if content is None:
+        raise HTTPException(
+            status_code=status.HTTP_410_GONE,
+            detail="Export file no longer exists; re-export it to write its invoices and payments again"
+        )
+    filename = f"quickbooks_{export.kind}_{export.created_at:%Y%m%d_%H%M%S}.{WRITERS[export.format].suffix}"
+    return Response(
+        content,
+        media_type=MEDIA_TYPES[export.format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+
+@router.post("/exports/{export_id}/reexport", status_code=status.HTTP_202_ACCEPTED)
+def reexport_accounting_export(
+    export_id: str,
+    background_tasks: BackgroundTasks,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Write the invoices and payments of a completed export into a new file, e.g.
+    when the original was lost before it reached QuickBooks. The rows move to
+    the new export, so they are not exported a third time.
+    """
+    require_accounting_role(current_user)
+    source = _get_export(db, export_id)
+    if source.status != "completed":
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"Export is {source.status}"
+        )
+
+    export = _queue_export(db, background_tasks, AccountingExport(
+        format=source.format,
+        kind="reexport",
+        source_export_id=source.id,
+        created_by=current_user.id
+    ))
+    return _export_json(export)
@@ -0,0 +1,148 @@
+import asyncio
+import json
+from fastapi import APIRouter, Request
+from pydantic import BaseModel, Field
+from typing import Any, Dict, List, Literal, Optional
+from app.database import SessionLocal, batch_session
+
+router = APIRouter(prefix="/batch", tags=["batch"])
+
+MAX_BATCH_REQUESTS = 20
+
+# Recursion, long-lived streams and streamed file exports cannot run inside a batch
+EXCLUDED_PATHS = (
+    "/api/v1/batch",
+    "/api/v1/jobs/board/stream",
+    "/api/v1/jobs/export",
+    "/api/v1/customers/export",
+    "/api/v1/invoices/export",
+    "/api/v1/time-tracking/timesheets/export"
+)
+
+# Largest sub-response body a batch will hold in memory
+MAX_RESPONSE_BYTES = 1024 * 1024
+
+# Parent request headers every sub-request inherits unless it sets its own
+FORWARDED_HEADERS = ("authorization", "cookie", "user-agent", "accept-language")
+
+
+class BatchItem(BaseModel):
+    id: Optional[str] = None  # echoed back to match results to requests
+    method: Literal["GET", "POST", "PUT", "PATCH", "DELETE"] = "GET"
+    path: str  # e.g. /api/v1/jobs/<id>?include=notes
+    headers: Dict[str, str] = {}
+    body: Optional[Any] = None  # sent as JSON
+
+
+class BatchRequest(BaseModel):
+    requests: List[BatchItem] = Field(..., min_length=1, max_length=MAX_BATCH_REQUESTS)
+
+
+class _ResponseTooLarge(Exception):
+    pass
+
+
+def _error(item: BatchItem, status_code: int, detail: str) -> dict:
+    return {"id": item.id, "status": status_code, "headers": {}, "body": {"detail": detail}}
+
+
+async def _dispatch(request: Request, item: BatchItem) -> dict:
+    """Run one sub-request through the app in-process and capture its response"""
+    path, _, query = item.path.partition("?")
+    if not path.startswith("/api/v1/"):
+        return _error(item, 400, "Batch paths must start with /api/v1/")
+    if path.rstrip("/") in EXCLUDED_PATHS:
+        return _error(item, 400, f"{path} cannot be batched")
+
+    headers = {name: value for name, value in request.headers.items() if name in FORWARDED_HEADERS}
+    headers.update({name.lower(): value for name, value in item.headers.items()})
+    body = b""
+    if item.body is not None:
+        body = json.dumps(item.body).encode()
+        headers["content-type"] = "application/json"
+    headers["content-length"] = str(len(body))
+
+    scope = {
+        **request.scope,
+        "method": item.method,
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": query.encode(),
+        "headers": [(name.encode("latin-1"), value.encode("latin-1")) for name, value in headers.items()],
+        "state": {}
+    }
+    scope.pop("route", None)
+    scope.pop("endpoint", None)
+    scope.pop("path_params", None)
+
+    sent = False
+    # Never set: the batch caller is still connected while the sub-request runs
+    connected = asyncio.Event()
+
+    async def receive():
+        nonlocal sent
+        if sent:
+            # Reporting a disconnect here would make streaming responses stop early
+            await connected.wait()
+        sent = True
+        return {"type": "http.request", "body": body, "more_body": False}
+
+    response = {"status": 500, "headers": [], "body": b""}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            response["status"] = message["status"]
+            response["headers"] = message.get("headers", [])
+        elif message["type"] == "http.response.body":
+            response["body"] += message.get("body", b"")
+            if len(response["body"]) > MAX_RESPONSE_BYTES:
+                # Stops a streaming endpoint instead of buffering all of it
+                raise _ResponseTooLarge()
+
+    try:
+        await request.app(scope, receive, send)
+    except _ResponseTooLarge:
+        return _error(item, 413, f"{path} returned more than {MAX_RESPONSE_BYTES} bytes; call it directly")
+    except Exception as e:
+        print(f"[BATCH ERROR] {item.method} {item.path}: {e}")
+        return _error(item, 500, "Internal server error")
+
+    response_headers = {
+        name.decode("latin-1"): value.decode("latin-1")
+        for name, value in response["headers"]
+        if name.lower() not in (b"content-length", b"content-type")
+    }
+    content_type = dict(response["headers"]).get(b"content-type", b"").decode("latin-1")
+    if response["body"] and not content_type.startswith(("application/json", "text/")):
+        return _error(item, 415, f"{path} returned {content_type or 'a file'}; call it directly")
+    if not response["body"]:
+        result = None
+    elif content_type.startswith("application/json"):
+        result = json.loads(response["body"])
+    else:
+        result = response["body"].decode("utf-8", errors="replace")
+    return {"id": item.id, "status": response["status"], "headers": response_headers, "body": result}
+
+
+@router.post("")
+async def run_batch(batch: BatchRequest, request: Request):
+    """
+    Run several API calls in one round trip. Sub-requests run in order through
+    the normal routes (with their own auth and role checks) on one shared DB
+    session; each result carries its own status, so one failure does not
+    fail the batch.
+    """
+    db = SessionLocal()
+    token = batch_session.set(db)
+    try:
+        results = []
+        for item in batch.requests:
+            result = await _dispatch(request, item)
+            if result["status"] >= 400:
+                # Drop anything the failed call left uncommitted before the next one runs
+                db.rollback()
+            results.append(result)
+        return {"results": results}
+    finally:
+        batch_session.reset(token)
+        db.close()
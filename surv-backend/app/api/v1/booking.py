@@ -1,14 +1,35 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+from sqlalchemy import insert, select
 from sqlalchemy.orm import Session
 from typing import List, Optional
-from datetime import date, time, datetime
+from datetime import date, time, datetime, timedelta
+from app.config import settings
 from app.database import get_db
 from app.models.customer import Customer
 from app.models.job import Job
+from app.api.v1.jobs import generate_job_number
+from app.utils.assignment import auto_assign_jobs
+from app.utils.availability import SLOT_TIMES, SLOT_CAPACITY, get_availability_grid
+from app.utils.reservations import (
+    take_slot_hold, confirm_slot_hold, release_slot_hold, count_live_holds, held_time_slot
+)
+from app.utils.http_cache import cached_json_response
+from app.utils.sql import dialect_insert, has_unique_index
 from pydantic import BaseModel, EmailStr
 
 router = APIRouter(prefix="/booking", tags=["online-booking"])
 
+# Longest date range a single availability request may cover
+MAX_AVAILABILITY_DAYS = 90
+
+SERVICES = [
+    {"id": "plumbing", "name": "Plumbing", "description": "Repairs, installations, maintenance"},
+    {"id": "hvac", "name": "HVAC", "description": "Heating and cooling services"},
+    {"id": "electrical", "name": "Electrical", "description": "Wiring, repairs, installations"},
+    {"id": "general", "name": "General Handyman", "description": "Various home repairs"},
+    {"id": "emergency", "name": "Emergency Service", "description": "Urgent repairs"}
+]
+
 
 class OnlineBookingRequest(BaseModel):
     # Customer info
@@ -27,6 +48,7 @@ class OnlineBookingRequest(BaseModel):
     preferred_date: date
     preferred_time: Optional[str] = None
     priority: str = "normal"
+    hold_id: Optional[str] = None  # From POST /booking/holds
 
 
 class AvailabilitySlot(BaseModel):
@@ -35,6 +57,82 @@ class AvailabilitySlot(BaseModel):
     available: bool
 
 
+class SlotHoldRequest(BaseModel):
+    slot_date: date
+    time_slot: str
+
+
+def client_address(request: Request) -> str:
+    """The caller's IP; behind the Heroku router it is the last X-Forwarded-For entry"""
+    forwarded = request.headers.get("x-forwarded-for")
+    if forwarded:
+        return forwarded.split(",")[-1].strip()
+    return request.client.host if request.client else "unknown"
+
+
+def upsert_booking_customer(db: Session, booking: OnlineBookingRequest) -> str:
+    """Find or create the customer by email and return their ID"""
+    table = Customer.__table__
+    conn = db.connection()
+    values = dict(
+        first_name=booking.first_name,
+        last_name=booking.last_name,
+        email=booking.email,
+        phone=booking.phone,
+        address_line1=booking.address_line1,
+        city=booking.city,
+        state=booking.state,
+        zip_code=booking.zip_code
+    )
+
+    if not has_unique_index(conn.engine, table.name, "email"):
+        # Databases created before customers.email became unique have no index
+        # for ON CONFLICT to target, so look the customer up first instead
+        existing = conn.execute(
+            select(table.c.id).where(table.c.email == booking.email).limit(1)
+        ).scalar()
+        if existing:
+            return existing
+        return conn.execute(insert(table).values(**values).returning(table.c.id)).scalar_one()
+
+    stmt = dialect_insert(conn, table).values(**values)
+    # No-op update so RETURNING also yields the existing row's ID
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["email"],
+        set_={"email": stmt.excluded.email}
+    ).returning(table.c.id)
+    return conn.execute(stmt).scalar_one()
+
+
+@router.post("/holds", status_code=status.HTTP_201_CREATED)
+def create_slot_hold(
+    hold_request: SlotHoldRequest,
+    request: Request,
+    db: Session = Depends(get_db)
+):
+    """
+    Reserve a slot while the customer fills in the booking form
+    Public endpoint - no authentication required; holds are capped per client address
+    """
+    hold = take_slot_hold(db, hold_request.slot_date, hold_request.time_slot, client_address(request))
+    return {
+        "hold_id": hold.id,
+        "slot_date": hold.slot_date,
+        "time_slot": hold.time_slot,
+        "expires_at": hold.expires_at
+    }
+
+
+@router.delete("/holds/{hold_id}", status_code=status.HTTP_204_NO_CONTENT)
+def delete_slot_hold(
+    hold_id: str,
+    db: Session = Depends(get_db)
+):
+    """Release a slot hold the customer no longer needs"""
+    release_slot_hold(db, hold_id)
+    return None
+
+
 @router.post("/submit", status_code=status.HTTP_201_CREATED)
 def submit_booking_request(
     booking: OnlineBookingRequest,
@@ -43,44 +141,57 @@ def submit_booking_request(
     """
     Public endpoint for online booking widget
     No authentication required - this is for customer self-service
+    The slot is confirmed from `hold_id`, or held on the spot when no hold was taken
     """
-    try:
-        # Check if customer exists, create if not
-        customer = db.query(Customer).filter(Customer.email == booking.email).first()
-        
-        if not customer:
-            customer = Customer(
-                first_name=booking.first_name,
-                last_name=booking.last_name,
-                email=booking.email,
-                phone=booking.phone,
-                address_line1=booking.address_line1,
-                city=booking.city,
-                state=booking.state,
-                zip_code=booking.zip_code
+    time_slot = None
+    if booking.preferred_time:
+        try:
+            time_slot = time.fromisoformat(booking.preferred_time).strftime("%H:%M")
+        except ValueError:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="preferred_time must be in HH:MM format"
             )
-            db.add(customer)
-            db.flush()  # Get customer ID
-        
-        # Generate job number
-        job_count = db.query(Job).count()
-        job_number = f"JOB-{job_count + 1:05d}"
+    
+    hold_id = booking.hold_id
+    inline_hold = False
+    if hold_id and not time_slot:
+        time_slot = held_time_slot(db, hold_id, booking.preferred_date)
+    if time_slot and not hold_id:
+        hold_id = take_slot_hold(db, booking.preferred_date, time_slot).id
+        inline_hold = True
+    
+    try:
+        customer_id = upsert_booking_customer(db, booking)
         
         # Create job with "pending" status (requires admin approval)
         job = Job(
-            job_number=job_number,
-            customer_id=customer.id,
+            job_number=generate_job_number(db),
+            customer_id=customer_id,
             title=booking.service_type,
             description=booking.description,
             job_type=booking.service_type,
             status="pending",  # Requires confirmation
             priority=booking.priority,
             scheduled_date=booking.preferred_date,
-            scheduled_start_time=time.fromisoformat(booking.preferred_time) if booking.preferred_time else None
+            scheduled_start_time=time.fromisoformat(time_slot) if time_slot else None
         )
-        
         db.add(job)
+        db.flush()
+        
+        if hold_id:
+            confirm_slot_hold(db, hold_id, job.id, booking.preferred_date, time_slot)
+        
         db.commit()
+        
+        if settings.AUTO_ASSIGN_ONLINE_BOOKINGS:
+            # The booking is already saved; an assignment failure leaves it for dispatch
+            try:
+                auto_assign_jobs(db, [job])
+                db.commit()
+            except Exception as e:
+                db.rollback()
+                print(f"[BOOKING ERROR] Auto-assign failed for {job.id}: {e}")
         db.refresh(job)
         
         # In production, send confirmation email/SMS
@@ -90,83 +201,69 @@ def submit_booking_request(
             "status": "success",
             "message": "Booking request submitted successfully",
             "job_number": job.job_number,
-            "customer_id": customer.id,
+            "customer_id": customer_id,
             "job_id": job.id,
             "confirmation": "You will receive a confirmation email shortly"
         }
-        
+    
+    except HTTPException:
+        db.rollback()
+        if inline_hold:
+            release_slot_hold(db, hold_id)
+        raise
     except Exception as e:
         db.rollback()
+        if inline_hold:
+            release_slot_hold(db, hold_id)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Booking failed: {str(e)}"
         )
 
 
-@router.get("/availability")
+@router.get("/availability", response_model=List[AvailabilitySlot])
 def get_available_slots(
     service_type: str,
     start_date: date,
     end_date: date,
+    request: Request,
     db: Session = Depends(get_db)
 ):
     """
     Get available time slots for online booking
     Public endpoint - no authentication required
+    Served from the precomputed availability grid with ETag/Cache-Control
     """
-    # Get all jobs in date range
-    jobs = db.query(Job).filter(
-        Job.scheduled_date >= start_date,
-        Job.scheduled_date <= end_date,
-        Job.status.in_(["scheduled", "in_progress"])
-    ).all()
-    
-    # Simple availability logic (can be enhanced)
-    # For now, assume 8am-5pm with 2-hour slots
-    time_slots = ["08:00", "10:00", "12:00", "14:00", "16:00"]
+    if (end_date - start_date).days >= MAX_AVAILABILITY_DAYS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Date range cannot exceed {MAX_AVAILABILITY_DAYS} days"
+        )
     
     available_slots = []
-    current_date = start_date
-    
-    while current_date <= end_date:
-        jobs_on_date = [j for j in jobs if j.scheduled_date == current_date]
-        booked_times = [j.scheduled_start_time.strftime("%H:%M") if j.scheduled_start_time else None for j in jobs_on_date]
-        
-        for time_slot in time_slots:
-            available_slots.append(AvailabilitySlot(
-                date=current_date,
-                time_slot=time_slot,
-                available=time_slot not in booked_times
-            ))
-        
-        current_date = date.fromordinal(current_date.toordinal() + 1)
+    if start_date <= end_date:
+        grid = get_availability_grid(db, start_date, end_date)
+        holds = count_live_holds(db, start_date, end_date)
+        current_date = start_date
+        while current_date <= end_date:
+            booked = grid[current_date]
+            held = holds.get(current_date, {})
+            for time_slot in SLOT_TIMES:
+                taken = booked.get(time_slot, 0) + held.get(time_slot, 0)
+                available_slots.append({
+                    "date": current_date,
+                    "time_slot": time_slot,
+                    "available": taken < SLOT_CAPACITY
+                })
+            current_date += timedelta(days=1)
     
-    return available_slots
+    return cached_json_response(request, available_slots, max_age=60)
 
 
 @router.get("/services")
-def get_available_services():
+def get_available_services(request: Request):
     """
     Get list of services available for online booking
     Public endpoint - no authentication required
     """
-    return {
-        "services": [
-            {"id": "plumbing", "name": "Plumbing", "description": "Repairs, installations, maintenance"},
-            {"id": "hvac", "name": "HVAC", "description": "Heating and cooling services"},
-            {"id": "electrical", "name": "Electrical", "description": "Wiring, repairs, installations"},
-            {"id": "general", "name": "General Handyman", "description": "Various home repairs"},
-            {"id": "emergency", "name": "Emergency Service", "description": "Urgent repairs"}
-        ]
-    }
-
-
-
-
-
-
-
-
-
-
-
+    return cached_json_response(request, {"services": SERVICES}, max_age=3600, stale_while_revalidate=86400)
@@ -1,11 +1,17 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, status
 from sqlalchemy.orm import Session
 from typing import List, Optional
-from datetime import datetime
+from datetime import datetime, timezone
 from app.database import get_db
 from app.models.user import User, UserRole
-from app.models.customer import Customer
+from app.models.campaign import Campaign
+from app.models.message_template import MessageTemplate
+from app.models.segment import Segment
+from app.schemas.segment import SegmentFilters, SegmentCreate, SegmentUpdate, SegmentResponse
+from app.utils.campaigns import target_customers_query, prepare_campaign, send_campaign, needs_preparation
+from app.utils.segments import count_segment, estimate_segment_count
 from app.utils.dependencies import get_current_user
+from app.utils.templates import DEFAULT_TEMPLATES, validate_template, invalidate_template, get_template_text
 from pydantic import BaseModel, EmailStr
 
 router = APIRouter(prefix="/campaigns", tags=["marketing"])
@@ -13,11 +19,12 @@ router = APIRouter(prefix="/campaigns", tags=["marketing"])
 
 class EmailCampaign(BaseModel):
     name: str
-    subject: str
-    body: str
-    template: Optional[str] = None
+    subject: Optional[str] = None  # Required unless a template supplies it
+    body: Optional[str] = None  # Required unless a template supplies it
+    template: Optional[str] = None  # Saved or built-in template; subject/body given here override it
     target_customers: List[str] = []  # Customer IDs, empty = all
-    scheduled_at: Optional[datetime] = None
+    segment_id: Optional[str] = None  # Saved segment, combined with target_customers if both given
+    scheduled_at: Optional[datetime] = None  # Sent automatically once this time passes
 
 
 class CampaignResponse(BaseModel):
@@ -27,53 +34,97 @@ class CampaignResponse(BaseModel):
     status: str
     recipients_count: int
     sent_count: int
+    failed_count: int
     opened_count: int
     clicked_count: int
+    scheduled_at: Optional[datetime] = None
+    started_at: Optional[datetime] = None
+    completed_at: Optional[datetime] = None
     created_at: datetime
+    
+    class Config:
+        from_attributes = True
 
 
 @router.post("/email/create")
 def create_email_campaign(
     campaign: EmailCampaign,
+    background_tasks: BackgroundTasks,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    """Create an email marketing campaign"""
+    """
+    Create an email marketing campaign (sent in the background unless scheduled).
+    The text of `template` is copied into the campaign, so later template
+    edits do not change a campaign that is already created.
+    """
     if current_user.role not in [UserRole.admin, UserRole.manager]:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Only admins and managers can create campaigns"
         )
     
-    # Get target customers
-    if campaign.target_customers:
-        customers = db.query(Customer).filter(
-            Customer.id.in_(campaign.target_customers)
-        ).all()
-    else:
-        customers = db.query(Customer).filter(Customer.email.isnot(None)).all()
-    
-    # In production, integrate with SendGrid:
-    # from sendgrid import SendGridAPIClient
-    # from sendgrid.helpers.mail import Mail, Personalization
-    # sg = SendGridAPIClient(settings.SENDGRID_API_KEY)
-    # 
-    # for customer in customers:
-    #     message = Mail(
-    #         from_email='noreply@surv.com',
-    #         to_emails=customer.email,
-    #         subject=campaign.subject,
-    #         html_content=campaign.body
-    #     )
-    #     sg.send(message)
-    
-    # For now, return mock response
+    subject, body = campaign.subject, campaign.body
+    if campaign.template:
+        template_subject, template_body = get_template_text(db, campaign.template)
+        subject = subject or template_subject
+        body = body or template_body
+    if not subject or not body:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Give a subject and body, or a template"
+        )
+    
+    # Campaign text may only use customer placeholders
+    validate_template(subject, body, root="customer")
+    
+    scheduled_at = campaign.scheduled_at
+    if scheduled_at and scheduled_at.tzinfo:
+        # Stored as naive UTC, like every other timestamp
+        scheduled_at = scheduled_at.astimezone(timezone.utc).replace(tzinfo=None)
+    
+    segment = None
+    if campaign.segment_id:
+        db_segment = db.query(Segment).filter(Segment.id == campaign.segment_id).first()
+        if not db_segment:
+            raise HTTPException(status_code=404, detail="Segment not found")
+        segment = SegmentFilters.model_validate(db_segment.filters)
+    
+    # Exact count at send time; the editor shows cached estimates
+    recipients_count = target_customers_query(db, campaign.target_customers, segment).count()
+    
+    db_campaign = Campaign(
+        name=campaign.name,
+        subject=subject,
+        body=body,
+        template=campaign.template,
+        segment_id=campaign.segment_id,
+        target_customers=campaign.target_customers,
+        status="preparing",
+        recipients_count=recipients_count,
+        scheduled_at=scheduled_at,
+        created_by=current_user.id
+    )
+    db.add(db_campaign)
+    db.commit()
+    db.refresh(db_campaign)
+    
+    # Recipients are streamed into campaign_recipients and sent batch by batch
+    background_tasks.add_task(
+        prepare_campaign,
+        db_campaign.id,
+        campaign.target_customers,
+        segment,
+        send_now=scheduled_at is None
+    )
+    
     return {
         "status": "created",
+        "campaign_id": db_campaign.id,
         "campaign_name": campaign.name,
-        "recipients_count": len(customers),
-        "scheduled_for": campaign.scheduled_at or "immediately",
-        "message": f"Campaign created with {len(customers)} recipients"
+        "recipients_count": recipients_count,
+        "scheduled_for": scheduled_at or "immediately",
+        "message": f"Campaign created with {recipients_count} recipients"
     }
 
 
@@ -88,14 +139,201 @@ def list_campaigns(
     if current_user.role not in [UserRole.admin, UserRole.manager]:
         raise HTTPException(status_code=403, detail="Access denied")
     
-    # Mock campaigns (in production, would query campaigns table)
+    total = db.query(Campaign).count()
+    campaigns = db.query(Campaign).order_by(Campaign.created_at.desc()).offset(skip).limit(limit).all()
+    
+    return {
+        "campaigns": [CampaignResponse.model_validate(c) for c in campaigns],
+        "total": total
+    }
+
+
+@router.get("/email/{campaign_id}", response_model=CampaignResponse)
+def get_campaign(
+    campaign_id: str,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Get a campaign and its send progress"""
+    if current_user.role not in [UserRole.admin, UserRole.manager]:
+        raise HTTPException(status_code=403, detail="Access denied")
+    
+    campaign = db.query(Campaign).filter(Campaign.id == campaign_id).first()
+    if not campaign:
+        raise HTTPException(status_code=404, detail="Campaign not found")
+    
+    return CampaignResponse.model_validate(campaign)
+
+
+@router.post("/email/{campaign_id}/send")
+def start_campaign_send(
+    campaign_id: str,
+    background_tasks: BackgroundTasks,
+    resume: bool = False,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Send a scheduled campaign now, or resume one whose send was interrupted.
+    Resuming re-sends only the batches that were in flight when it stopped.
+    A campaign whose recipient list failed to build, or whose preparation
+    stalled, is prepared again before sending.
+    """
+    if current_user.role not in [UserRole.admin, UserRole.manager]:
+        raise HTTPException(status_code=403, detail="Access denied")
+    
+    campaign = db.query(Campaign).filter(Campaign.id == campaign_id).first()
+    if not campaign:
+        raise HTTPException(status_code=404, detail="Campaign not found")
+    
+    if needs_preparation(db, campaign):
+        segment = None
+        if campaign.segment_id:
+            db_segment = db.query(Segment).filter(Segment.id == campaign.segment_id).first()
+            if not db_segment:
+                raise HTTPException(status_code=404, detail="Segment not found")
+            segment = SegmentFilters.model_validate(db_segment.filters)
+        
+        # Only one retry may claim the campaign
+        claimed = db.query(Campaign).filter(
+            Campaign.id == campaign.id,
+            Campaign.status == campaign.status,
+            Campaign.updated_at == campaign.updated_at
+        ).update({"status": "preparing", "updated_at": datetime.utcnow()}, synchronize_session=False)
+        db.commit()
+        if not claimed:
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail="Campaign is already being prepared"
+            )
+        
+        background_tasks.add_task(
+            prepare_campaign, campaign.id, campaign.target_customers, segment, send_now=True
+        )
+        return {
+            "status": "preparing",
+            "campaign_id": campaign.id,
+            "remaining": None
+        }
+    
+    if campaign.status in ["preparing", "sent"] or (campaign.status == "sending" and not resume):
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"Campaign is already {campaign.status}"
+        )
+    
+    background_tasks.add_task(send_campaign, campaign.id, resume=resume)
+    
     return {
-        "campaigns": [],
-        "total": 0,
-        "message": "Campaign history will appear here once campaigns are sent"
+        "status": "sending",
+        "campaign_id": campaign.id,
+        "remaining": campaign.recipients_count - campaign.sent_count - campaign.failed_count
     }
 
 
+def _require_marketing_role(current_user: User):
+    if current_user.role not in [UserRole.admin, UserRole.manager]:
+        raise HTTPException(status_code=403, detail="Access denied")
+
+
+@router.post("/segments/estimate")
+def estimate_segment(
+    filters: SegmentFilters,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Approximate audience size while a segment is being edited"""
+    _require_marketing_role(current_user)
+    return {"estimated_count": estimate_segment_count(db, filters)}
+
+
+@router.post("/segments", response_model=SegmentResponse, status_code=status.HTTP_201_CREATED)
+def create_segment(
+    segment_data: SegmentCreate,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Save a customer segment"""
+    _require_marketing_role(current_user)
+    
+    segment = Segment(
+        name=segment_data.name,
+        description=segment_data.description,
+        filters=segment_data.filters.model_dump(mode="json"),
+        estimated_count=estimate_segment_count(db, segment_data.filters),
+        estimated_at=datetime.utcnow(),
+        created_by=current_user.id
+    )
+    db.add(segment)
+    db.commit()
+    db.refresh(segment)
+    
+    return SegmentResponse.model_validate(segment)
+
+
+@router.get("/segments", response_model=List[SegmentResponse])
+def list_segments(
+    skip: int = 0,
+    limit: int = 100,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """List saved segments"""
+    _require_marketing_role(current_user)
+    segments = db.query(Segment).order_by(Segment.created_at.desc()).offset(skip).limit(limit).all()
+    return [SegmentResponse.model_validate(s) for s in segments]
+
+
+@router.put("/segments/{segment_id}", response_model=SegmentResponse)
+def update_segment(
+    segment_id: str,
+    segment_data: SegmentUpdate,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Update a saved segment"""
+    _require_marketing_role(current_user)
+    
+    segment = db.query(Segment).filter(Segment.id == segment_id).first()
+    if not segment:
+        raise HTTPException(status_code=404, detail="Segment not found")
+    
+    update_data = segment_data.model_dump(exclude_unset=True)
+    if "name" in update_data:
+        segment.name = update_data["name"]
+    if "description" in update_data:
+        segment.description = update_data["description"]
+    if segment_data.filters is not None:
+        segment.filters = segment_data.filters.model_dump(mode="json")
+        segment.estimated_count = estimate_segment_count(db, segment_data.filters)
+        segment.estimated_at = datetime.utcnow()
+    
+    db.commit()
+    db.refresh(segment)
+    
+    return SegmentResponse.model_validate(segment)
+
+
+@router.get("/segments/{segment_id}/count")
+def get_segment_count(
+    segment_id: str,
+    exact: bool = False,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Segment size: cached estimate by default, exact count on request"""
+    _require_marketing_role(current_user)
+    
+    segment = db.query(Segment).filter(Segment.id == segment_id).first()
+    if not segment:
+        raise HTTPException(status_code=404, detail="Segment not found")
+    
+    filters = SegmentFilters.model_validate(segment.filters)
+    if exact:
+        return {"segment_id": segment.id, "count": count_segment(db, filters), "exact": True}
+    return {"segment_id": segment.id, "count": estimate_segment_count(db, filters), "exact": False}
+
+
 @router.post("/templates/create")
 def create_email_template(
     name: str,
@@ -109,52 +347,96 @@ def create_email_template(
     if current_user.role not in [UserRole.admin, UserRole.manager]:
         raise HTTPException(status_code=403, detail="Access denied")
     
-    # In production, save to templates table
-    templates = {
-        "job_confirmation": {
-            "subject": "Your Service Appointment is Confirmed",
-            "body": "Dear {customer_name},\n\nYour {service_type} is scheduled for {date}."
-        },
-        "invoice_reminder": {
-            "subject": "Invoice Due Reminder",
-            "body": "Dear {customer_name},\n\nYour invoice #{invoice_number} is due on {due_date}."
-        },
-        "service_complete": {
-            "subject": "Service Completed - Thank You!",
-            "body": "Dear {customer_name},\n\nThank you for choosing Surv for your {service_type}."
-        }
-    }
+    existing = db.query(MessageTemplate).filter(MessageTemplate.name == name).first()
+    if existing:
+        raise HTTPException(status_code=400, detail="A template with this name already exists")
+    
+    message = validate_template(subject, body)
+    
+    template = MessageTemplate(
+        name=name,
+        subject=subject,
+        body=body,
+        category=category,
+        created_by=current_user.id
+    )
+    db.add(template)
+    db.commit()
+    invalidate_template(name)
     
     return {
         "status": "created",
         "name": name,
         "category": category,
+        "fields": sorted(message.fields),
         "message": "Template created successfully"
     }
 
 
-@router.get("/templates/list")
-def list_templates(
+@router.put("/templates/{name}")
+def update_email_template(
+    name: str,
+    subject: Optional[str] = None,
+    body: Optional[str] = None,
+    category: Optional[str] = None,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    """List all email templates"""
+    """Edit a template (a built-in template is copied into the store on first edit)"""
+    if current_user.role not in [UserRole.admin, UserRole.manager]:
+        raise HTTPException(status_code=403, detail="Access denied")
+    
+    template = db.query(MessageTemplate).filter(MessageTemplate.name == name).first()
+    if not template:
+        if name not in DEFAULT_TEMPLATES:
+            raise HTTPException(status_code=404, detail="Template not found")
+        default = DEFAULT_TEMPLATES[name]
+        template = MessageTemplate(
+            name=name,
+            subject=default["subject"],
+            body=default["body"],
+            category=default["category"],
+            version=0,
+            created_by=current_user.id
+        )
+        db.add(template)
+    
+    if subject is not None:
+        template.subject = subject
+    if body is not None:
+        template.body = body
+    if category is not None:
+        template.category = category
+    
+    message = validate_template(template.subject, template.body)
+    template.version += 1
+    db.commit()
+    invalidate_template(name)
+    
     return {
-        "templates": [
-            {"name": "job_confirmation", "subject": "Job Confirmation", "category": "operations"},
-            {"name": "invoice_reminder", "subject": "Invoice Reminder", "category": "billing"},
-            {"name": "service_complete", "subject": "Service Complete", "category": "operations"},
-            {"name": "review_request", "subject": "We'd Love Your Feedback", "category": "marketing"}
-        ]
+        "status": "updated",
+        "name": name,
+        "version": template.version,
+        "fields": sorted(message.fields),
+        "message": "Template updated successfully"
     }
 
 
-
-
-
-
-
-
-
-
-
+@router.get("/templates/list")
+def list_templates(
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """List all email templates"""
+    templates = {
+        name: {"name": name, "subject": default["subject"], "category": default["category"]}
+        for name, default in DEFAULT_TEMPLATES.items()
+    }
+    for template in db.query(MessageTemplate).filter(MessageTemplate.is_active == True).all():
+        templates[template.name] = {
+            "name": template.name,
+            "subject": template.subject,
+            "category": template.category
+        }
+    
+    return {"templates": list(templates.values())}
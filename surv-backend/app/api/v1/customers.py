@@ -1,15 +1,29 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, status
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
 from app.database import get_db
 from app.models.customer import Customer
 from app.models.user import User, UserRole
 from app.schemas.customer import CustomerCreate, CustomerUpdate, CustomerResponse
 from app.utils.dependencies import get_current_user
+from app.utils.export import ExportFormat, export_columns, export_response, require_export_role
 
 router = APIRouter(prefix="/customers", tags=["customers"])
 
 
+def filter_customers(query, search: Optional[str]):
+    """The filters shared by the customer list and export"""
+    if search:
+        search_term = f"%{search}%"
+        query = query.filter(
+            (Customer.first_name.ilike(search_term)) |
+            (Customer.last_name.ilike(search_term)) |
+            (Customer.email.ilike(search_term)) |
+            (Customer.phone.ilike(search_term))
+        )
+    return query
+
+
 @router.get("", response_model=List[CustomerResponse])
 def list_customers(
     skip: int = 0,
@@ -19,21 +33,25 @@ def list_customers(
     current_user: User = Depends(get_current_user)
 ):
     """List all customers with optional search"""
-    query = db.query(Customer)
-    
-    if search:
-        search_term = f"%{search}%"
-        query = query.filter(
-            (Customer.first_name.ilike(search_term)) |
-            (Customer.last_name.ilike(search_term)) |
-            (Customer.email.ilike(search_term)) |
-            (Customer.phone.ilike(search_term))
-        )
-    
+    query = filter_customers(db.query(Customer), search)
     customers = query.offset(skip).limit(limit).all()
     return [CustomerResponse.model_validate(c) for c in customers]
 
 
+@router.get("/export")
+def export_customers(
+    request: Request,
+    format: ExportFormat = "csv",
+    search: Optional[str] = None,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Every customer matching the list search as streamed CSV or NDJSON"""
+    require_export_role(current_user)
+    query = filter_customers(db.query(*export_columns(Customer, CustomerResponse)), search)
+    return export_response(request, query.statement, format, "customers")
+
+
 @router.post("", response_model=CustomerResponse, status_code=status.HTTP_201_CREATED)
 def create_customer(
     customer_data: CustomerCreate,
@@ -47,6 +65,14 @@ def create_customer(
             detail="Only admins and managers can create customers"
         )
     
+    if customer_data.email:
+        existing = db.query(Customer).filter(Customer.email == customer_data.email).first()
+        if existing:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Email already registered to another customer"
+            )
+    
     db_customer = Customer(
         **customer_data.model_dump(),
         created_by=current_user.id
@@ -100,6 +126,14 @@ def update_customer(
     
     # Update only provided fields
     update_data = customer_data.model_dump(exclude_unset=True)
+    if update_data.get("email") and update_data["email"] != customer.email:
+        existing = db.query(Customer).filter(Customer.email == update_data["email"]).first()
+        if existing:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Email already registered to another customer"
+            )
+    
     for field, value in update_data.items():
         setattr(customer, field, value)
     
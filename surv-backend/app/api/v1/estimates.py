@@ -1,6 +1,6 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, status
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
 from decimal import Decimal
 from datetime import datetime
 from app.database import get_db
@@ -8,11 +8,20 @@ from app.models.estimate import Estimate, EstimateLineItem
 from app.models.customer import Customer
 from app.models.job import Job
 from app.models.user import User, UserRole
+from app.schemas.customer import CustomerResponse
 from app.schemas.estimate import EstimateCreate, EstimateUpdate, EstimateResponse
+from app.schemas.job import JobResponse
 from app.utils.dependencies import get_current_user
+from app.utils.expand import ResourceView
 
 router = APIRouter(prefix="/estimates", tags=["estimates"])
 
+# Related resources list_estimates can embed with ?include=
+ESTIMATE_INCLUDES = {
+    "customer": (Estimate.customer, CustomerResponse),
+    "job": (Estimate.converted_job, JobResponse)
+}
+
 
 def generate_estimate_number(db: Session) -> str:
     """Generate a unique estimate number"""
@@ -37,11 +46,14 @@ def list_estimates(
     limit: int = 100,
     status_filter: str = None,
     customer_id: str = None,
+    include: Optional[str] = Query(None, description="Comma-separated: customer, job"),
+    fields: Optional[str] = Query(None, description="Comma-separated estimate fields to return"),
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
     """List estimates with optional filters"""
-    query = db.query(Estimate)
+    view = ResourceView(Estimate, EstimateResponse, ESTIMATE_INCLUDES, fields, include)
+    query = view.apply(db.query(Estimate))
     
     if status_filter:
         query = query.filter(Estimate.status == status_filter)
@@ -52,6 +64,8 @@ def list_estimates(
     query = query.order_by(Estimate.created_at.desc())
     estimates = query.offset(skip).limit(limit).all()
     
+    if view.active:
+        return view.response(estimates)
     return [EstimateResponse.model_validate(est) for est in estimates]
 
 
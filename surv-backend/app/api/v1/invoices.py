@@ -1,16 +1,27 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
 from decimal import Decimal
 from app.database import get_db
 from app.models.invoice import Invoice
 from app.models.customer import Customer
+from app.models.payment import Payment
 from app.models.user import User, UserRole
+from app.schemas.customer import CustomerResponse
 from app.schemas.invoice import InvoiceCreate, InvoiceUpdate, InvoiceResponse
+from app.schemas.job import JobResponse
 from app.utils.dependencies import get_current_user
+from app.utils.expand import ResourceView
+from app.utils.export import ExportFormat, export_columns, export_response, require_export_role
 
 router = APIRouter(prefix="/invoices", tags=["invoices"])
 
+# Related resources list_invoices can embed with ?include=
+INVOICE_INCLUDES = {
+    "customer": (Invoice.customer, CustomerResponse),
+    "job": (Invoice.job, JobResponse)
+}
+
 
 def generate_invoice_number(db: Session) -> str:
     """Generate a unique invoice number"""
@@ -29,30 +40,53 @@ def calculate_invoice_totals(invoice: Invoice):
     invoice.amount_due = amount_due
 
 
+def filter_invoices(query, status_filter: Optional[str], customer_id: Optional[str]):
+    """The filters shared by the invoice list and export"""
+    if status_filter:
+        query = query.filter(Invoice.status == status_filter)
+    
+    if customer_id:
+        query = query.filter(Invoice.customer_id == customer_id)
+    
+    return query.order_by(Invoice.created_at.desc())
+
+
 @router.get("", response_model=List[InvoiceResponse])
 def list_invoices(
     skip: int = 0,
     limit: int = 100,
     status_filter: str = None,
     customer_id: str = None,
+    include: Optional[str] = Query(None, description="Comma-separated: customer, job"),
+    fields: Optional[str] = Query(None, description="Comma-separated invoice fields to return"),
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
     """List invoices with optional filters"""
-    query = db.query(Invoice)
-    
-    if status_filter:
-        query = query.filter(Invoice.status == status_filter)
-    
-    if customer_id:
-        query = query.filter(Invoice.customer_id == customer_id)
-    
-    query = query.order_by(Invoice.created_at.desc())
+    view = ResourceView(Invoice, InvoiceResponse, INVOICE_INCLUDES, fields, include)
+    query = filter_invoices(view.apply(db.query(Invoice)), status_filter, customer_id)
     invoices = query.offset(skip).limit(limit).all()
     
+    if view.active:
+        return view.response(invoices)
     return [InvoiceResponse.model_validate(inv) for inv in invoices]
 
 
+@router.get("/export")
+def export_invoices(
+    request: Request,
+    format: ExportFormat = "csv",
+    status_filter: Optional[str] = None,
+    customer_id: Optional[str] = None,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Every invoice matching the list filters as streamed CSV or NDJSON"""
+    require_export_role(current_user)
+    query = filter_invoices(db.query(*export_columns(Invoice, InvoiceResponse)), status_filter, customer_id)
+    return export_response(request, query.statement, format, "invoices")
+
+
 @router.post("", response_model=InvoiceResponse, status_code=status.HTTP_201_CREATED)
 def create_invoice(
     invoice_data: InvoiceCreate,
@@ -200,6 +234,7 @@ def mark_invoice_paid(
         )
     
     from datetime import datetime
+    db.add(Payment(invoice_id=invoice.id, amount=amount, recorded_by=current_user.id))
     invoice.amount_paid += amount
     invoice.amount_due = invoice.total_amount - invoice.amount_paid
     
@@ -1,37 +1,50 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 from typing import List, Optional
 from datetime import date
+import asyncio
+import json
 from app.database import get_db
 from app.models.job import Job
+from app.models.job_state import JobState
 from app.models.customer import Customer
 from app.models.user import User, UserRole
-from app.schemas.job import JobCreate, JobUpdate, JobResponse
+from app.schemas.customer import CustomerResponse
+from app.schemas.invoice import InvoiceResponse
+from app.schemas.job import JobCreate, JobUpdate, JobResponse, JobAutoAssign
+from app.schemas.user import UserSummary
+from app.utils.assignment import AssignmentBoard, auto_assign_jobs, load_job_requests
 from app.utils.dependencies import get_current_user
+from app.utils.events import event_bus
+from app.utils.expand import ResourceView
+from app.utils.export import ExportFormat, export_columns, export_response, require_export_role
+from app.utils.job_state_machine import transition_job
+from app.utils.routing import load_day_stops, plan_route
+from app.utils.sql import next_sequence_value
 
 router = APIRouter(prefix="/jobs", tags=["jobs"])
 
+# Seconds between keep-alive comments on an idle board stream
+BOARD_HEARTBEAT_SECONDS = 15
+
+# Related resources list_jobs can embed with ?include=
+JOB_INCLUDES = {
+    "customer": (Job.customer, CustomerResponse),
+    "technician": (Job.technician, UserSummary),
+    "invoice": (Job.invoice, InvoiceResponse)
+}
+
 
 def generate_job_number(db: Session) -> str:
-    """Generate a unique job number"""
-    count = db.query(Job).count()
-    return f"JOB-{count + 1:05d}"
+    """Generate a unique job number (safe under concurrent inserts)"""
+    number = next_sequence_value(db, "job", seed=lambda: db.query(Job).count())
+    return f"JOB-{number:05d}"
 
 
-@router.get("", response_model=List[JobResponse])
-def list_jobs(
-    skip: int = 0,
-    limit: int = 100,
-    status_filter: Optional[str] = None,
-    date_from: Optional[date] = None,
-    date_to: Optional[date] = None,
-    assigned_to: Optional[str] = None,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
-):
-    """List jobs with optional filters"""
-    query = db.query(Job)
-    
+def filter_jobs(query, current_user: User, status_filter: Optional[str], date_from: Optional[date],
+                date_to: Optional[date], assigned_to: Optional[str]):
+    """The filters shared by the job list and export"""
     # Technicians can only see their assigned jobs
     if current_user.role == UserRole.technician:
         query = query.filter(Job.assigned_to == current_user.id)
@@ -47,19 +60,58 @@ def list_jobs(
     if date_to:
         query = query.filter(Job.scheduled_date <= date_to)
     
-    query = query.order_by(Job.scheduled_date.desc())
+    return query.order_by(Job.scheduled_date.desc())
+
+
+@router.get("", response_model=List[JobResponse])
+def list_jobs(
+    skip: int = 0,
+    limit: int = 100,
+    status_filter: Optional[str] = None,
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+    assigned_to: Optional[str] = None,
+    include: Optional[str] = Query(None, description="Comma-separated: customer, technician, invoice"),
+    fields: Optional[str] = Query(None, description="Comma-separated job fields to return"),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """List jobs with optional filters"""
+    view = ResourceView(Job, JobResponse, JOB_INCLUDES, fields, include)
+    query = filter_jobs(view.apply(db.query(Job)), current_user, status_filter, date_from, date_to, assigned_to)
     jobs = query.offset(skip).limit(limit).all()
     
+    if view.active:
+        return view.response(jobs)
     return [JobResponse.model_validate(j) for j in jobs]
 
 
+@router.get("/export")
+def export_jobs(
+    request: Request,
+    format: ExportFormat = "csv",
+    status_filter: Optional[str] = None,
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+    assigned_to: Optional[str] = None,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Every job matching the list filters as streamed CSV or NDJSON"""
+    require_export_role(current_user)
+    query = filter_jobs(db.query(*export_columns(Job, JobResponse)), current_user,
+                        status_filter, date_from, date_to, assigned_to)
+    return export_response(request, query.statement, format, "jobs")
+
+
 @router.post("", response_model=JobResponse, status_code=status.HTTP_201_CREATED)
 def create_job(
     job_data: JobCreate,
+    auto_assign: bool = False,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    """Create a new job"""
+    """Create a new job, optionally giving it the best-ranked technician"""
     if current_user.role not in [UserRole.admin, UserRole.manager]:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
@@ -84,11 +136,229 @@ def create_job(
     )
     db.add(db_job)
     db.commit()
+    
+    if auto_assign and not db_job.assigned_to:
+        auto_assign_jobs(db, [db_job])
+        db.commit()
     db.refresh(db_job)
     
     return JobResponse.model_validate(db_job)
 
 
+def require_dispatch_role(current_user: User):
+    if current_user.role not in [UserRole.admin, UserRole.manager]:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Only admins and managers can assign jobs"
+        )
+
+
+@router.post("/auto-assign")
+def auto_assign_pending_jobs(
+    request: JobAutoAssign,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Assign technicians to many jobs in one call: the given job_ids, or every
+    unassigned pending job (online bookings) in the date range
+    """
+    require_dispatch_role(current_user)
+    
+    query = db.query(Job).filter(Job.assigned_to.is_(None))
+    if request.job_ids:
+        query = query.filter(Job.id.in_(request.job_ids))
+    else:
+        query = query.filter(Job.status == "pending", Job.scheduled_date >= (request.date_from or date.today()))
+    if request.date_to:
+        query = query.filter(Job.scheduled_date <= request.date_to)
+    
+    results = auto_assign_jobs(db, query.all())
+    db.commit()
+    return {
+        "assigned": sum(1 for result in results if result["assigned_to"]),
+        "unassigned": sum(1 for result in results if not result["assigned_to"]),
+        "results": results
+    }
+
+
+@router.get("/board")
+def get_dispatch_board(
+    board_date: Optional[date] = None,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Jobs for a day with live status and timings, read from the job state projection"""
+    board_date = board_date or date.today()
+    query = db.query(Job, JobState, User.first_name, User.last_name).outerjoin(
+        JobState, JobState.job_id == Job.id
+    ).outerjoin(User, User.id == Job.assigned_to).filter(Job.scheduled_date == board_date)
+    
+    # Technicians can only see their assigned jobs
+    if current_user.role == UserRole.technician:
+        query = query.filter(Job.assigned_to == current_user.id)
+    
+    rows = query.order_by(Job.scheduled_start_time, Job.job_number).all()
+    
+    return {
+        "date": board_date,
+        "jobs": [{
+            "id": job.id,
+            "job_number": job.job_number,
+            "title": job.title,
+            "scheduled_start_time": job.scheduled_start_time,
+            "assigned_to": job.assigned_to,
+            "technician_name": f"{first_name} {last_name}" if job.assigned_to and first_name is not None else None,
+            "status": state.status if state else job.status,
+            "current_state": state.current_state if state else None,
+            "status_changed_at": state.status_changed_at if state else None,
+            "on_my_way_at": state.on_my_way_at if state else None,
+            "started_at": state.started_at if state else None,
+            "completed_at": state.completed_at if state else None,
+            "travel_minutes": state.travel_seconds // 60 if state else 0,
+            "on_site_minutes": state.on_site_seconds // 60 if state else 0
+        } for job, state, first_name, last_name in rows]
+    }
+
+
+@router.get("/routes")
+def get_fleet_routes(
+    route_date: Optional[date] = None,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Proposed visit order for every technician with jobs on a day"""
+    if current_user.role not in [UserRole.admin, UserRole.manager]:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Only admins and managers can optimize the fleet"
+        )
+    
+    route_date = route_date or date.today()
+    stops = load_day_stops(db, route_date)
+    return {
+        "date": route_date,
+        "routes": [
+            {"technician_id": technician_id, **plan_route(technician_stops)}
+            for technician_id, technician_stops in stops.items()
+        ]
+    }
+
+
+@router.get("/routes/{technician_id}")
+def get_technician_route(
+    technician_id: str,
+    route_date: Optional[date] = None,
+    start_latitude: Optional[float] = Query(None, ge=-90, le=90),
+    start_longitude: Optional[float] = Query(None, ge=-180, le=180),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Proposed visit order for one technician's day, optionally starting from a
+    given point, alongside the totals of the current order
+    """
+    if current_user.role == UserRole.technician and current_user.id != technician_id:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="You can only view your own route"
+        )
+    
+    route_date = route_date or date.today()
+    start = (start_latitude, start_longitude) if start_latitude is not None and start_longitude is not None else None
+    stops = load_day_stops(db, route_date, [technician_id]).get(technician_id, [])
+    return {"technician_id": technician_id, "date": route_date, **plan_route(stops, start)}
+
+
+@router.get("/board/stream")
+def stream_dispatch_board(
+    board_date: Optional[date] = None,
+    technician_id: Optional[str] = None,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Server-sent events for the dispatch board: job created/updated/status/assigned
+    and timeline events as they are committed, filtered by date and technician.
+    A `resync` event means updates were dropped and the board should be reloaded.
+    """
+    # Technicians only follow their own jobs
+    if current_user.role == UserRole.technician:
+        technician_id = current_user.id
+    # The stream can stay open for hours; do not hold a connection for it
+    db.close()
+    
+    async def events():
+        subscription = event_bus.subscribe(board_date, technician_id)
+        try:
+            yield "retry: 3000\n\n"
+            while True:
+                try:
+                    payload = await asyncio.wait_for(subscription.queue.get(), timeout=BOARD_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                if payload["type"] == "resync":
+                    subscription.overflowed = False
+                data = json.dumps({key: value for key, value in payload.items() if key not in ("dates", "technicians")}, default=str)
+                yield f"event: {payload['type']}\ndata: {data}\n\n"
+        finally:
+            event_bus.unsubscribe(subscription)
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@router.get("/{job_id}/candidates")
+def get_job_candidates(
+    job_id: str,
+    limit: int = 10,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Technicians ranked for a job by load, skills, proximity and past on-site time"""
+    require_dispatch_role(current_user)
+    
+    requests = load_job_requests(db, [job_id])
+    if not requests:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Job not found"
+        )
+    board = AssignmentBoard(db, requests[0].scheduled_date)
+    return {"job_id": job_id, "candidates": board.rank(requests[0])[:limit]}
+
+
+@router.post("/{job_id}/auto-assign", response_model=JobResponse)
+def auto_assign_job(
+    job_id: str,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Assign a job to its best-ranked technician"""
+    require_dispatch_role(current_user)
+    
+    job = db.query(Job).filter(Job.id == job_id).first()
+    if not job:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Job not found"
+        )
+    
+    result = auto_assign_jobs(db, [job])[0]
+    if not result["assigned_to"]:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=result["reason"]
+        )
+    db.commit()
+    db.refresh(job)
+    return JobResponse.model_validate(job)
+
+
 @router.get("/{job_id}", response_model=JobResponse)
 def get_job(
     job_id: str,
@@ -146,11 +416,15 @@ def update_job(
                 detail="Technicians can only update job status and notes"
             )
     
-    # Update only provided fields
+    # Update only provided fields; status goes through the state machine
     update_data = job_data.model_dump(exclude_unset=True)
+    new_status = update_data.pop("status", None)
     for field, value in update_data.items():
         setattr(job, field, value)
     
+    if new_status:
+        transition_job(db, job, new_status, employee_id=current_user.id)
+    
     db.commit()
     db.refresh(job)
     
@@ -179,7 +453,7 @@ def delete_job(
         )
     
     # Set status to cancelled instead of deleting
-    job.status = "cancelled"
+    transition_job(db, job, "cancelled", employee_id=current_user.id)
     db.commit()
     
     return None
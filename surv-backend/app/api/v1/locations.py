@@ -0,0 +1,291 @@
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from sqlalchemy.orm import Session
+from typing import List, Optional
+from datetime import datetime, date, timedelta, timezone
+from pydantic import BaseModel, Field
+from app.database import get_db
+from app.models.customer import Customer
+from app.models.job import Job
+from app.models.job_timeline import JobTimeline
+from app.models.time_entry import TimeEntry
+from app.models.user import User, UserRole
+from app.utils.breadcrumbs import UNKNOWN_ACCURACY, append_breadcrumbs, compute_mileage, load_tracks
+from app.utils.dependencies import get_current_user
+from app.utils.geo import bbox_filter, haversine_m, radius_filter
+from app.utils.live_locations import live_locations
+
+router = APIRouter(prefix="/locations", tags=["locations"])
+
+# Largest radius a job-site search may use
+MAX_RADIUS_M = 5000
+
+# Longest range a mileage report may cover
+MAX_MILEAGE_DAYS = 62
+
+
+class BreadcrumbPoint(BaseModel):
+    recorded_at: datetime
+    latitude: float = Field(..., ge=-90, le=90)
+    longitude: float = Field(..., ge=-180, le=180)
+    accuracy_m: Optional[float] = Field(None, ge=0)
+
+
+class BreadcrumbBatch(BaseModel):
+    points: List[BreadcrumbPoint] = Field(..., max_length=5000)
+
+
+def _check_employee_access(current_user: User, employee_id: str):
+    if current_user.role == UserRole.technician and current_user.id != employee_id:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="You can only view your own locations"
+        )
+
+
+def _utc_naive(value: datetime) -> datetime:
+    return value.astimezone(timezone.utc).replace(tzinfo=None) if value.tzinfo else value
+
+
+def _time_window(query, column, date_from: Optional[date], date_to: Optional[date]):
+    if date_from:
+        query = query.filter(column >= datetime.combine(date_from, datetime.min.time()))
+    if date_to:
+        query = query.filter(column <= datetime.combine(date_to, datetime.max.time()))
+    return query
+
+
+def _event_json(event: JobTimeline, distance_m: Optional[float] = None) -> dict:
+    result = {
+        "id": event.id,
+        "job_id": event.job_id,
+        "event_type": event.event_type,
+        "event_time": event.event_time,
+        "employee_id": event.employee_id,
+        "latitude": event.latitude,
+        "longitude": event.longitude
+    }
+    if distance_m is not None:
+        result["distance_m"] = round(distance_m, 1)
+    return result
+
+
+def _entry_json(entry: TimeEntry, distance_m: Optional[float] = None) -> dict:
+    result = {
+        "id": entry.id,
+        "job_id": entry.job_id,
+        "entry_type": entry.entry_type,
+        "entry_time": entry.entry_time,
+        "employee_id": entry.employee_id,
+        "latitude": entry.latitude,
+        "longitude": entry.longitude
+    }
+    if distance_m is not None:
+        result["distance_m"] = round(distance_m, 1)
+    return result
+
+
+@router.get("/jobs/{job_id}/nearby")
+def get_activity_near_job_site(
+    job_id: str,
+    radius_m: float = Query(150, gt=0, le=MAX_RADIUS_M),
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+    latitude: Optional[float] = Query(None, ge=-90, le=90),
+    longitude: Optional[float] = Query(None, ge=-180, le=180),
+    limit: int = Query(500, ge=1, le=5000),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Punches and timeline events recorded within radius_m of a job site.
+    The site is the customer's service address unless latitude/longitude are given.
+    """
+    site = db.query(Customer.latitude, Customer.longitude).join(
+        Job, Job.customer_id == Customer.id
+    ).filter(Job.id == job_id).first()
+    if not site:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Job not found")
+
+    if latitude is None or longitude is None:
+        latitude, longitude = site.latitude, site.longitude
+    if latitude is None or longitude is None:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="The job site has no coordinates; set the customer's latitude/longitude or pass them"
+        )
+
+    entries = db.query(TimeEntry).filter(radius_filter(TimeEntry, latitude, longitude, radius_m))
+    events = db.query(JobTimeline).filter(radius_filter(JobTimeline, latitude, longitude, radius_m))
+
+    # Technicians only see their own locations
+    if current_user.role == UserRole.technician:
+        entries = entries.filter(TimeEntry.employee_id == current_user.id)
+        events = events.filter(JobTimeline.employee_id == current_user.id)
+
+    entries = _time_window(entries, TimeEntry.entry_time, date_from, date_to)
+    events = _time_window(events, JobTimeline.event_time, date_from, date_to)
+
+    return {
+        "job_id": job_id,
+        "site": {"latitude": latitude, "longitude": longitude},
+        "radius_m": radius_m,
+        "time_entries": [
+            _entry_json(entry, haversine_m(latitude, longitude, entry.latitude, entry.longitude))
+            for entry in entries.order_by(TimeEntry.entry_time.desc()).limit(limit)
+        ],
+        "events": [
+            _event_json(event, haversine_m(latitude, longitude, event.latitude, event.longitude))
+            for event in events.order_by(JobTimeline.event_time.desc()).limit(limit)
+        ]
+    }
+
+
+@router.get("/viewport")
+def get_activity_in_viewport(
+    min_lat: float = Query(..., ge=-90, le=90),
+    min_lng: float = Query(..., ge=-180, le=180),
+    max_lat: float = Query(..., ge=-90, le=90),
+    max_lng: float = Query(..., ge=-180, le=180),
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+    include_time_entries: bool = False,
+    limit: int = Query(1000, ge=1, le=5000),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Timeline events (and optionally punches) inside a map viewport, newest first"""
+    if min_lat > max_lat or min_lng > max_lng:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="min_lat/min_lng must not exceed max_lat/max_lng"
+        )
+
+    events = db.query(JobTimeline).filter(bbox_filter(JobTimeline, min_lat, min_lng, max_lat, max_lng))
+    if current_user.role == UserRole.technician:
+        events = events.filter(JobTimeline.employee_id == current_user.id)
+    events = _time_window(events, JobTimeline.event_time, date_from, date_to)
+    result = {"events": [_event_json(event) for event in events.order_by(JobTimeline.event_time.desc()).limit(limit)]}
+
+    if include_time_entries:
+        entries = db.query(TimeEntry).filter(bbox_filter(TimeEntry, min_lat, min_lng, max_lat, max_lng))
+        if current_user.role == UserRole.technician:
+            entries = entries.filter(TimeEntry.employee_id == current_user.id)
+        entries = _time_window(entries, TimeEntry.entry_time, date_from, date_to)
+        result["time_entries"] = [_entry_json(entry) for entry in entries.order_by(TimeEntry.entry_time.desc()).limit(limit)]
+
+    return result
+
+
+@router.post("/breadcrumbs")
+def upload_breadcrumbs(
+    batch: BreadcrumbBatch,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Record a batch of GPS points from the technician's device"""
+    counts = append_breadcrumbs(db, current_user.id, (
+        (_utc_naive(point.recorded_at), point.latitude, point.longitude, point.accuracy_m)
+        for point in batch.points
+    ))
+    db.commit()
+    return {
+        "accepted": len(batch.points),
+        "days": [{"date": day, "points": count} for day, count in counts.items()]
+    }
+
+
+@router.post("/live", status_code=status.HTTP_202_ACCEPTED)
+def report_live_location(
+    batch: BreadcrumbBatch,
+    current_user: User = Depends(get_current_user)
+):
+    """
+    High-rate location updates from a technician's device. The newest point
+    becomes their live position; all points are stored in the background.
+    """
+    live_locations.update(
+        current_user.id,
+        f"{current_user.first_name} {current_user.last_name}",
+        [(_utc_naive(point.recorded_at), point.latitude, point.longitude, point.accuracy_m) for point in batch.points]
+    )
+    return {"accepted": len(batch.points)}
+
+
+@router.get("/live")
+def get_live_locations(
+    max_age_minutes: Optional[int] = Query(None, ge=1),
+    current_user: User = Depends(get_current_user)
+):
+    """Latest position of every technician for the dispatch map, served from memory"""
+    if current_user.role not in [UserRole.admin, UserRole.manager]:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Only admins and managers can view the live map"
+        )
+
+    now = datetime.utcnow()
+    cutoff = now - timedelta(minutes=max_age_minutes) if max_age_minutes else None
+    return [{
+        "employee_id": employee_id,
+        "name": position.name,
+        "latitude": position.latitude,
+        "longitude": position.longitude,
+        "accuracy_m": position.accuracy_m,
+        "recorded_at": position.recorded_at,
+        "age_seconds": max(0, int((now - position.recorded_at).total_seconds()))
+    } for employee_id, position in live_locations.snapshot().items()
+        if cutoff is None or position.recorded_at >= cutoff]
+
+
+@router.get("/breadcrumbs/{employee_id}/{day}")
+def get_breadcrumbs(
+    employee_id: str,
+    day: date,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """A technician's GPS trail for one day, for map playback"""
+    _check_employee_access(current_user, employee_id)
+    tracks = load_tracks(db, employee_id, day, day)
+    midnight = datetime.combine(day, datetime.min.time())
+    return {
+        "employee_id": employee_id,
+        "date": day,
+        "points": [{
+            "recorded_at": midnight + timedelta(seconds=seconds),
+            "latitude": lat / 1e6,
+            "longitude": lng / 1e6,
+            "accuracy_m": None if accuracy == UNKNOWN_ACCURACY else accuracy
+        } for track in tracks for seconds, lat, lng, accuracy in zip(track.seconds, track.lat_e6, track.lng_e6, track.accuracy)]
+    }
+
+
+@router.get("/mileage/{employee_id}")
+def get_mileage(
+    employee_id: str,
+    date_from: date,
+    date_to: date,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Miles driven per day from GPS breadcrumbs, split across the jobs driven to"""
+    _check_employee_access(current_user, employee_id)
+    if (date_to - date_from).days >= MAX_MILEAGE_DAYS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Date range cannot exceed {MAX_MILEAGE_DAYS} days"
+        )
+
+    days = compute_mileage(db, employee_id, date_from, date_to)
+    job_miles = {}
+    for day in days:
+        for job_id, miles in day["job_miles"].items():
+            job_miles[job_id] = round(job_miles.get(job_id, 0.0) + miles, 2)
+    return {
+        "employee_id": employee_id,
+        "date_from": date_from,
+        "date_to": date_to,
+        "total_miles": round(sum(day["miles"] for day in days), 2),
+        "job_miles": job_miles,
+        "days": days
+    }
@@ -1,11 +1,19 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, status
+from sqlalchemy import func
 from sqlalchemy.orm import Session
 from typing import Optional
+from datetime import date, timedelta
 from app.database import get_db
-from app.models.user import User
+from app.models.user import User, UserRole
 from app.models.customer import Customer
 from app.models.job import Job
+from app.models.notification_delivery import NotificationDelivery
+from app.models.outbox_message import OutboxMessage
+from app.models.sms_message import SMSMessage
 from app.utils.dependencies import get_current_user
+from app.utils.reminders import REMINDER_KIND, send_next_day_reminders
+from app.utils.outbox import enqueue_sms
+from app.utils.templates import render_messages
 from app.config import settings
 from pydantic import BaseModel
 
@@ -31,40 +39,25 @@ def send_sms(
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    """Send SMS notification via Twilio"""
-    from app.config import settings
-    
-    # Check if Twilio is configured
-    if not settings.TWILIO_ACCOUNT_SID or not settings.TWILIO_AUTH_TOKEN:
-        print(f"[SMS MOCK] To: {sms_data.to}, Message: {sms_data.message}")
-        return {
-            "status": "mock_sent",
-            "to": sms_data.to,
-            "message": "SMS logged (Twilio not configured)"
-        }
-    
-    try:
-        from twilio.rest import Client
-        client = Client(settings.TWILIO_ACCOUNT_SID, settings.TWILIO_AUTH_TOKEN)
-        message = client.messages.create(
-            body=sms_data.message,
-            from_=settings.TWILIO_PHONE_NUMBER,
-            to=sms_data.to
-        )
-        
-        return {
-            "status": "sent",
-            "to": sms_data.to,
-            "sid": message.sid,
-            "message": "SMS sent successfully"
-        }
-    except Exception as e:
-        print(f"[SMS ERROR] {e}")
-        return {
-            "status": "error",
-            "to": sms_data.to,
-            "message": f"Failed to send SMS: {str(e)}"
-        }
+    """Queue an SMS notification; it is sent via Twilio once this request commits"""
+    sms_log = SMSMessage(
+        from_number=settings.TWILIO_PHONE_NUMBER,
+        to_number=sms_data.to,
+        body=sms_data.message,
+        direction="outbound",
+        status="queued",
+        job_id=sms_data.job_id
+    )
+    db.add(sms_log)
+    outbox_message = enqueue_sms(db, sms_data.to, sms_data.message, sms_message=sms_log)
+    db.commit()
+    
+    return {
+        "status": "queued",
+        "to": sms_data.to,
+        "id": outbox_message.id,
+        "message": "SMS queued for delivery"
+    }
 
 
 @router.post("/email/send")
@@ -120,7 +113,7 @@ def send_job_reminder(
             detail="Customer not found"
         )
     
-    message = f"Reminder: Your {job.title} is scheduled for {job.scheduled_date}"
+    subject, message = render_messages(db, "job_reminder", "job", [job.id])[job.id]
     
     notifications_sent = []
     
@@ -131,7 +124,7 @@ def send_job_reminder(
     
     if send_email and customer.email:
         # Send email (mock for now)
-        print(f"[EMAIL] {message} to {customer.email}")
+        print(f"[EMAIL] To: {customer.email}, Subject: {subject}\n{message}")
         notifications_sent.append("email")
     
     return {
@@ -157,7 +150,7 @@ def send_job_confirmation(
     if not customer:
         raise HTTPException(status_code=404, detail="Customer not found")
     
-    message = f"Job Confirmed: {job.title} on {job.scheduled_date}"
+    subject, message = render_messages(db, "job_confirmed", "job", [job.id])[job.id]
     
     # Mock sending
     notifications = []
@@ -165,7 +158,7 @@ def send_job_confirmation(
         print(f"[SMS] {message} to {customer.phone}")
         notifications.append("sms")
     if customer.email:
-        print(f"[EMAIL] {message} to {customer.email}")
+        print(f"[EMAIL] To: {customer.email}, Subject: {subject}\n{message}")
         notifications.append("email")
     
     return {
@@ -174,3 +167,87 @@ def send_job_confirmation(
     }
 
 
+
+
+@router.post("/reminders/run", status_code=status.HTTP_202_ACCEPTED)
+def run_job_reminders(
+    background_tasks: BackgroundTasks,
+    target_date: Optional[date] = None,
+    current_user: User = Depends(get_current_user)
+):
+    """Send reminders for all jobs on a date (default tomorrow); already-sent reminders are skipped"""
+    if current_user.role not in [UserRole.admin, UserRole.manager]:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Not enough permissions"
+        )
+    
+    target_date = target_date or date.today() + timedelta(days=1)
+    background_tasks.add_task(send_next_day_reminders, target_date)
+    
+    return {
+        "status": "queued",
+        "target_date": target_date
+    }
+
+
+@router.get("/reminders/status")
+def get_job_reminder_status(
+    target_date: Optional[date] = None,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Reminder delivery counts by channel and status for a date"""
+    if current_user.role not in [UserRole.admin, UserRole.manager]:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Not enough permissions"
+        )
+    
+    target_date = target_date or date.today() + timedelta(days=1)
+    rows = db.query(
+        NotificationDelivery.channel,
+        NotificationDelivery.status,
+        func.count(NotificationDelivery.id)
+    ).filter(
+        NotificationDelivery.kind == REMINDER_KIND,
+        NotificationDelivery.notification_date == target_date
+    ).group_by(NotificationDelivery.channel, NotificationDelivery.status).all()
+    
+    channels = {}
+    for channel, delivery_status, count in rows:
+        channels.setdefault(channel, {})[delivery_status] = count
+    
+    return {
+        "target_date": target_date,
+        "channels": channels
+    }
+
+
+@router.get("/outbox/status")
+def get_outbox_status(
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Outbound message counts by status, with the most recent delivery failures"""
+    if current_user.role not in [UserRole.admin, UserRole.manager]:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Not enough permissions"
+        )
+    
+    counts = dict(db.query(OutboxMessage.status, func.count(OutboxMessage.id)).group_by(OutboxMessage.status).all())
+    failures = db.query(OutboxMessage).filter(
+        OutboxMessage.status == "failed"
+    ).order_by(OutboxMessage.created_at.desc()).limit(20).all()
+    
+    return {
+        "counts": counts,
+        "recent_failures": [{
+            "id": message.id,
+            "recipient": message.recipient,
+            "attempts": message.attempts,
+            "error": message.last_error,
+            "created_at": message.created_at
+        } for message in failures]
+    }
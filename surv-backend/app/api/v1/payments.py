@@ -4,6 +4,7 @@ from typing import Optional
 from decimal import Decimal
 from app.database import get_db
 from app.models.invoice import Invoice
+from app.models.payment import Payment
 from app.models.user import User
 from app.utils.dependencies import get_current_user
 from app.config import settings
@@ -83,6 +84,16 @@ def confirm_payment(
     # if intent.status == "succeeded":
     
     # For now, mark as paid
+    amount = invoice.total_amount - (invoice.amount_paid or 0)
+    if amount > 0:
+        # Already paid in full: confirming again records nothing for QuickBooks
+        db.add(Payment(
+            invoice_id=invoice.id,
+            amount=amount,
+            payment_method="card",
+            reference=payment_confirm.payment_intent_id,
+            recorded_by=current_user.id
+        ))
     invoice.amount_paid = invoice.total_amount
     invoice.amount_due = Decimal('0.00')
     invoice.status = "paid"
@@ -115,6 +126,14 @@ def record_manual_payment(
             detail="Invoice not found"
         )
     
+    db.add(Payment(
+        invoice_id=invoice.id,
+        amount=Decimal(str(amount)),
+        payment_method=payment_method,
+        notes=notes,
+        recorded_by=current_user.id
+    ))
+    
     # Update payment amounts
     current_paid = float(invoice.amount_paid) if invoice.amount_paid else 0
     new_paid = current_paid + amount
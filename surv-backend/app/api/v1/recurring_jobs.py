@@ -8,16 +8,11 @@ from app.models.job import Job
 from app.models.customer import Customer
 from app.models.user import User, UserRole
 from app.utils.dependencies import get_current_user
+from app.api.v1.jobs import generate_job_number
 
 router = APIRouter(prefix="/recurring-jobs", tags=["recurring-jobs"])
 
 
-def generate_job_number(db: Session) -> str:
-    """Generate a unique job number"""
-    count = db.query(Job).count()
-    return f"JOB-{count + 1:05d}"
-
-
 def calculate_next_occurrence(recurring_job: RecurringJob, from_date: datetime) -> datetime:
     """Calculate the next occurrence date based on recurrence pattern"""
     if recurring_job.frequency == "daily":
@@ -1,14 +1,16 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.orm import Session
-from sqlalchemy import func, extract
+from sqlalchemy import case, func, extract
 from datetime import datetime, timedelta, date
 from decimal import Decimal
 from app.database import get_db
 from app.models.customer import Customer
 from app.models.job import Job
 from app.models.invoice import Invoice
+from app.models.sms_message import SMSMessage
 from app.models.user import User, UserRole
 from app.utils.dependencies import get_current_user
+from app.utils.sms_status import FAILED_STATUSES
 
 router = APIRouter(prefix="/reports", tags=["reports"])
 
@@ -183,3 +185,73 @@ def get_jobs_by_status(
 # Import case for SQLite compatibility
 from sqlalchemy import case
 
+
+@router.get("/sms-delivery")
+def get_sms_delivery_report(
+    date_from: date = None,
+    date_to: date = None,
+    limit: int = 50,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Outbound SMS failure rates per technician and per customer number"""
+    if current_user.role not in [UserRole.admin, UserRole.manager]:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Only admins and managers can view SMS delivery reports"
+        )
+    
+    if not date_from:
+        date_from = date.today() - timedelta(days=30)
+    if not date_to:
+        date_to = date.today()
+    
+    failed = func.sum(case((SMSMessage.status.in_(FAILED_STATUSES), 1), else_=0))
+    delivered = func.sum(case((SMSMessage.status == "delivered", 1), else_=0))
+    period = (
+        SMSMessage.direction == "outbound",
+        SMSMessage.received_at >= datetime.combine(date_from, datetime.min.time()),
+        SMSMessage.received_at <= datetime.combine(date_to, datetime.max.time())
+    )
+    
+    technician_stats = db.query(
+        User.id,
+        User.first_name,
+        User.last_name,
+        func.count(SMSMessage.id).label('total'),
+        delivered.label('delivered'),
+        failed.label('failed')
+    ).join(SMSMessage, SMSMessage.employee_id == User.id).filter(*period).group_by(
+        User.id, User.first_name, User.last_name
+    ).all()
+    
+    # Numbers with the most failures first
+    number_stats = db.query(
+        SMSMessage.to_number,
+        func.count(SMSMessage.id).label('total'),
+        delivered.label('delivered'),
+        failed.label('failed')
+    ).filter(*period).group_by(SMSMessage.to_number).having(failed > 0).order_by(
+        failed.desc()
+    ).limit(limit).all()
+    
+    def rates(row):
+        return {
+            "total": row.total,
+            "delivered": row.delivered or 0,
+            "failed": row.failed or 0,
+            "failure_rate": round((row.failed or 0) / row.total * 100, 1) if row.total > 0 else 0
+        }
+    
+    return {
+        "date_from": date_from,
+        "date_to": date_to,
+        "technicians": [
+            {"id": tech.id, "name": f"{tech.first_name} {tech.last_name}", **rates(tech)}
+            for tech in technician_stats
+        ],
+        "customer_numbers": [
+            {"to_number": row.to_number, **rates(row)}
+            for row in number_stats
+        ]
+    }
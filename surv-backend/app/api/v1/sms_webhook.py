@@ -1,13 +1,25 @@
-from fastapi import APIRouter, Request, HTTPException, Form
+from fastapi import APIRouter, Depends, Request, Response, HTTPException, Form, Query, status
 from sqlalchemy.orm import Session
 from typing import Optional
 from datetime import datetime
-from app.database import SessionLocal
+from app.config import settings
+from app.database import get_db
 from app.models.sms_message import SMSMessage
+from app.models.sms_thread import SMSThread
 from app.models.job import Job
+from app.models.job_state import JobState
 from app.models.job_timeline import JobTimeline
-from app.models.user import User
+from app.models.user import User, UserRole
 from app.models.customer import Customer
+from app.utils.archive import archive_covers, read_archive, with_archive
+from app.utils.dependencies import get_current_user
+from app.utils.job_state_machine import can_transition, transition_job
+from app.utils.job_timeline import get_job_state, record_timeline_event
+from app.utils.outbox import enqueue_sms
+from app.utils.pagination import keyset_page
+from app.utils.sms import normalize_phone, valid_twilio_signature
+from app.utils.sms_status import status_buffer
+import app.utils.sms_threads  # keeps sms_threads in step with new messages
 import re
 
 router = APIRouter(prefix="/sms", tags=["sms-webhook"])
@@ -61,28 +73,9 @@ def parse_command(message_body: str):
     return {"command": "unknown"}
 
 
-def send_sms_response(to_number: str, message: str):
-    """Send SMS response via Twilio"""
-    from app.config import settings
-    
-    # Check if Twilio is configured
-    if not settings.TWILIO_ACCOUNT_SID or not settings.TWILIO_AUTH_TOKEN:
-        print(f"[SMS MOCK] To: {to_number}, Message: {message}")
-        return {"status": "mock_sent"}
-    
-    try:
-        from twilio.rest import Client
-        client = Client(settings.TWILIO_ACCOUNT_SID, settings.TWILIO_AUTH_TOKEN)
-        msg = client.messages.create(
-            body=message,
-            from_=settings.TWILIO_PHONE_NUMBER,
-            to=to_number
-        )
-        print(f"[SMS SENT] To: {to_number}, SID: {msg.sid}")
-        return {"status": "sent", "sid": msg.sid}
-    except Exception as e:
-        print(f"[SMS ERROR] {e}")
-        return {"status": "error", "message": str(e)}
+def send_sms_response(db: Session, to_number: str, message: str):
+    """Queue an SMS reply; it is sent by the outbox workers once the request commits"""
+    return enqueue_sms(db, to_number, message)
 
 
 @router.post("/webhook")
@@ -93,19 +86,31 @@ async def handle_sms_webhook(
     MessageSid: str = Form(...),
     NumMedia: Optional[str] = Form("0"),
     MediaUrl0: Optional[str] = Form(None),
-    MediaContentType0: Optional[str] = Form(None)
+    MediaContentType0: Optional[str] = Form(None),
+    db: Session = Depends(get_db)
 ):
     """
     Twilio webhook endpoint to receive SMS commands from technicians
     This endpoint is called by Twilio when a technician sends a text
     """
-    db = SessionLocal()
-    
     try:
         # Find technician by phone number
         tech = db.query(User).filter(User.phone == From).first()
         if not tech:
-            send_sms_response(From, "Phone number not registered. Please contact your administrator.")
+            # Keep the message so it shows up in the inbox
+            db.add(SMSMessage(
+                message_sid=MessageSid,
+                from_number=From,
+                to_number=To,
+                body=Body,
+                direction="inbound",
+                status="received",
+                media_url=MediaUrl0,
+                media_type=MediaContentType0,
+                received_at=datetime.utcnow()
+            ))
+            send_sms_response(db, From, "Phone number not registered. Please contact your administrator.")
+            db.commit()
             return {"status": "unknown_user"}
         
         # Parse command
@@ -135,7 +140,7 @@ async def handle_sms_webhook(
                 entry_time=datetime.utcnow()
             )
             db.add(entry)
-            send_sms_response(From, f"✓ Clocked in at {datetime.now().strftime('%I:%M %p')}")
+            send_sms_response(db, From, f"✓ Clocked in at {datetime.now().strftime('%I:%M %p')}")
             sms_log.command_processed = True
         
         elif cmd["command"] == "clock_out":
@@ -146,7 +151,7 @@ async def handle_sms_webhook(
                 entry_time=datetime.utcnow()
             )
             db.add(entry)
-            send_sms_response(From, f"✓ Clocked out at {datetime.now().strftime('%I:%M %p')}")
+            send_sms_response(db, From, f"✓ Clocked out at {datetime.now().strftime('%I:%M %p')}")
             sms_log.command_processed = True
         
         elif cmd["command"] == "on_my_way":
@@ -154,37 +159,31 @@ async def handle_sms_webhook(
             job = db.query(Job).filter(Job.job_number.ilike(f"%{job_num}%")).first()
             
             if not job:
-                send_sms_response(From, f"Job #{job_num} not found. Text 'jobs' to see your jobs.")
+                send_sms_response(db, From, f"Job #{job_num} not found. Text 'jobs' to see your jobs.")
             else:
                 # Log timeline event
-                timeline = JobTimeline(
-                    job_id=job.id,
-                    event_type="on_my_way",
-                    event_time=datetime.utcnow(),
-                    employee_id=tech.id
-                )
-                db.add(timeline)
+                record_timeline_event(db, job.id, "on_my_way", employee_id=tech.id)
                 
                 # Send message to customer
                 customer = db.query(Customer).filter(Customer.id == job.customer_id).first()
                 if customer and customer.phone:
                     customer_msg = f"Good news! Your technician {tech.first_name} is on the way for your {job.title} appointment."
-                    send_sms_response(customer.phone, customer_msg)
                     
-                    # Log customer notification
+                    # Log customer notification; marked sent once the outbox delivers it
                     customer_sms = SMSMessage(
                         from_number=To,
                         to_number=customer.phone,
                         body=customer_msg,
                         direction="outbound",
-                        status="sent",
+                        status="queued",
                         job_id=job.id,
-                        customer_id=customer.id,
-                        sent_at=datetime.utcnow()
+                        employee_id=tech.id,
+                        customer_id=customer.id
                     )
                     db.add(customer_sms)
+                    enqueue_sms(db, customer.phone, customer_msg, sms_message=customer_sms)
                 
-                send_sms_response(From, f"✓ Customer notified for Job #{job.job_number}. Travel timer started.")
+                send_sms_response(db, From, f"✓ Customer notified for Job #{job.job_number}. Travel timer started.")
                 sms_log.job_id = job.id
                 sms_log.command_processed = True
         
@@ -193,34 +192,16 @@ async def handle_sms_webhook(
             job = db.query(Job).filter(Job.job_number.ilike(f"%{job_num}%")).first()
             
             if not job:
-                send_sms_response(From, f"Job #{job_num} not found.")
+                send_sms_response(db, From, f"Job #{job_num} not found.")
+            elif not can_transition(job.status, "in_progress"):
+                send_sms_response(db, From, f"Job #{job.job_number} is {job.status} and can't be started.")
             else:
-                # Calculate travel time
-                on_my_way_event = db.query(JobTimeline).filter(
-                    JobTimeline.job_id == job.id,
-                    JobTimeline.event_type == "on_my_way"
-                ).order_by(JobTimeline.event_time.desc()).first()
-                
-                travel_time = None
-                if on_my_way_event:
-                    travel_time = int((datetime.utcnow() - on_my_way_event.event_time).total_seconds())
-                
-                # Log timeline event
-                timeline = JobTimeline(
-                    job_id=job.id,
-                    event_type="started",
-                    event_time=datetime.utcnow(),
-                    employee_id=tech.id,
-                    travel_time=travel_time
-                )
-                db.add(timeline)
-                
-                # Update job status
-                job.status = "in_progress"
-                job.actual_start_time = datetime.utcnow()
+                # Status change and timeline event; travel time comes from the job's projection
+                timeline = transition_job(db, job, "in_progress", employee_id=tech.id)
+                travel_time = timeline.travel_time if timeline else None
                 
                 travel_msg = f" (Travel time: {travel_time // 60} min)" if travel_time else ""
-                send_sms_response(From, f"✓ Started Job #{job.job_number}{travel_msg}. Job timer running.")
+                send_sms_response(db, From, f"✓ Started Job #{job.job_number}{travel_msg}. Job timer running.")
                 sms_log.job_id = job.id
                 sms_log.command_processed = True
         
@@ -229,34 +210,16 @@ async def handle_sms_webhook(
             job = db.query(Job).filter(Job.job_number.ilike(f"%{job_num}%")).first()
             
             if not job:
-                send_sms_response(From, f"Job #{job_num} not found.")
+                send_sms_response(db, From, f"Job #{job_num} not found.")
+            elif not can_transition(job.status, "completed"):
+                send_sms_response(db, From, f"Job #{job.job_number} is {job.status} and can't be completed.")
             else:
-                # Calculate job duration
-                start_event = db.query(JobTimeline).filter(
-                    JobTimeline.job_id == job.id,
-                    JobTimeline.event_type == "started"
-                ).order_by(JobTimeline.event_time.desc()).first()
-                
-                job_duration = None
-                if start_event:
-                    job_duration = int((datetime.utcnow() - start_event.event_time).total_seconds())
-                
-                # Log timeline event
-                timeline = JobTimeline(
-                    job_id=job.id,
-                    event_type="completed",
-                    event_time=datetime.utcnow(),
-                    employee_id=tech.id,
-                    job_duration=job_duration
-                )
-                db.add(timeline)
-                
-                # Update job status
-                job.status = "completed"
-                job.actual_end_time = datetime.utcnow()
+                # Status change and timeline event; duration comes from the job's projection
+                timeline = transition_job(db, job, "completed", employee_id=tech.id)
+                job_duration = timeline.job_duration if timeline else None
                 
                 duration_msg = f" (Duration: {job_duration // 60} min)" if job_duration else ""
-                send_sms_response(From, f"✓ Completed Job #{job.job_number}{duration_msg}. Great work!")
+                send_sms_response(db, From, f"✓ Completed Job #{job.job_number}{duration_msg}. Great work!")
                 sms_log.job_id = job.id
                 sms_log.command_processed = True
         
@@ -266,7 +229,7 @@ async def handle_sms_webhook(
             job = db.query(Job).filter(Job.job_number.ilike(f"%{job_num}%")).first()
             
             if not job:
-                send_sms_response(From, f"Job #{job_num} not found.")
+                send_sms_response(db, From, f"Job #{job_num} not found.")
             else:
                 from app.models.job_note import JobNote
                 note = JobNote(
@@ -277,7 +240,7 @@ async def handle_sms_webhook(
                     created_by=tech.id
                 )
                 db.add(note)
-                send_sms_response(From, f"✓ Summary added to Job #{job.job_number}")
+                send_sms_response(db, From, f"✓ Summary added to Job #{job.job_number}")
                 sms_log.job_id = job.id
                 sms_log.command_processed = True
         
@@ -292,12 +255,12 @@ async def handle_sms_webhook(
             ).all()
             
             if not jobs:
-                send_sms_response(From, "No jobs scheduled for today.")
+                send_sms_response(db, From, "No jobs scheduled for today.")
             else:
                 job_list = "Your jobs today:\n"
                 for job in jobs:
                     job_list += f"• #{job.job_number}: {job.title} at {job.scheduled_start_time.strftime('%I:%M %p') if job.scheduled_start_time else 'TBD'}\n"
-                send_sms_response(From, job_list)
+                send_sms_response(db, From, job_list)
             sms_log.command_processed = True
         
         elif cmd["command"] == "help":
@@ -310,11 +273,11 @@ async def handle_sms_webhook(
 • summary #123: [text] - Add job notes
 • jobs - List today's jobs
 • help - Show this message"""
-            send_sms_response(From, help_text)
+            send_sms_response(db, From, help_text)
             sms_log.command_processed = True
         
         else:
-            send_sms_response(From, "Command not recognized. Text 'help' for commands.")
+            send_sms_response(db, From, "Command not recognized. Text 'help' for commands.")
         
         # Handle photo uploads (MMS)
         if NumMedia and int(NumMedia) > 0 and MediaUrl0:
@@ -338,7 +301,7 @@ async def handle_sms_webhook(
                         uploaded_by=tech.id
                     )
                     db.add(photo)
-                    send_sms_response(From, f"✓ Photo saved to Job #{job.job_number}")
+                    send_sms_response(db, From, f"✓ Photo saved to Job #{job.job_number}")
         
         db.add(sms_log)
         db.commit()
@@ -350,54 +313,226 @@ async def handle_sms_webhook(
     except Exception as e:
         print(f"Error processing SMS: {e}")
         db.rollback()
-        send_sms_response(From, "Error processing your request. Please try again or contact support.")
+        send_sms_response(db, From, "Error processing your request. Please try again or contact support.")
+        db.commit()
         return {"status": "error", "message": str(e)}
-    finally:
-        db.close()
+
+
+@router.post("/status")
+async def handle_status_callback(
+    request: Request,
+    MessageSid: str = Form(...),
+    MessageStatus: str = Form(...),
+    ErrorCode: Optional[str] = Form(None)
+):
+    """
+    Twilio delivery status callback (queued, sent, delivered, failed...)
+    Updates are buffered and written in bulk a few times per second
+    """
+    # Twilio signs the exact status_callback URL it was given
+    url = settings.TWILIO_STATUS_CALLBACK_URL or str(request.url)
+    params = dict((await request.form()).items())
+    if not valid_twilio_signature(url, params, request.headers.get("X-Twilio-Signature")):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Invalid Twilio signature")
+    
+    status_buffer.add(MessageSid, MessageStatus, ErrorCode)
+    return """<?xml version="1.0" encoding="UTF-8"?>
+<Response></Response>"""
+
+
+def message_to_dict(msg) -> dict:
+    """`msg` is an SMSMessage or a row of the same columns (e.g. from the archive)"""
+    return {
+        "id": msg.id,
+        "from_number": msg.from_number,
+        "to_number": msg.to_number,
+        "body": msg.body,
+        "direction": msg.direction,
+        "status": msg.status,
+        "command_type": msg.command_type,
+        "job_id": msg.job_id,
+        "received_at": msg.received_at,
+        "sent_at": msg.sent_at,
+        "has_media": bool(msg.media_url)
+    }
 
 
 @router.get("/messages/{job_id}")
-def get_job_messages(job_id: str):
-    """Get all SMS messages for a job"""
-    db = SessionLocal()
-    try:
-        messages = db.query(SMSMessage).filter(SMSMessage.job_id == job_id).order_by(SMSMessage.received_at.desc()).all()
-        return [{
-            "id": msg.id,
-            "from_number": msg.from_number,
-            "to_number": msg.to_number,
-            "body": msg.body,
-            "direction": msg.direction,
-            "command_type": msg.command_type,
-            "received_at": msg.received_at,
-            "sent_at": msg.sent_at,
-            "has_media": bool(msg.media_url)
-        } for msg in messages]
-    finally:
-        db.close()
+def get_job_messages(
+    job_id: str,
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=500),
+    cursor: Optional[str] = None,
+    db: Session = Depends(get_db)
+):
+    """
+    Get SMS messages for a job, newest first. All of them unless limit or cursor
+    is given; a page's next cursor is then in X-Next-Cursor.
+    """
+    messages = with_archive("sms_messages", job_id=job_id).subquery()
+    if limit is None and cursor is None:
+        query = db.query(messages).order_by(messages.c.received_at.desc(), messages.c.id.desc())
+        return [message_to_dict(msg) for msg in query]
+    messages, next_cursor = keyset_page(
+        db.query(messages), messages.c.received_at, messages.c.id, cursor, limit or 100
+    )
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return [message_to_dict(msg) for msg in messages]
+
+
+def _require_inbox_role(current_user: User):
+    # Threads span every job and customer on a number, so only the office sees them
+    if current_user.role not in [UserRole.admin, UserRole.manager]:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Access denied")
+
+
+@router.get("/threads")
+def list_threads(
+    limit: int = Query(50, ge=1, le=200),
+    cursor: Optional[str] = None,
+    unread_only: bool = False,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Conversations by phone number, most recent first"""
+    _require_inbox_role(current_user)
+    query = db.query(SMSThread)
+    if unread_only:
+        query = query.filter(SMSThread.unread_count > 0)
+    threads, next_cursor = keyset_page(query, SMSThread.last_message_at, SMSThread.id, cursor, limit)
+    
+    return {
+        "threads": [{
+            "id": thread.id,
+            "counterpart_number": thread.counterpart_number,
+            "customer_id": thread.customer_id,
+            "employee_id": thread.employee_id,
+            "last_message_at": thread.last_message_at,
+            "last_message_preview": thread.last_message_preview,
+            "last_direction": thread.last_direction,
+            "message_count": thread.message_count,
+            "unread_count": thread.unread_count
+        } for thread in threads],
+        "next_cursor": next_cursor
+    }
+
+
+def get_thread_or_404(db: Session, thread_id: str) -> SMSThread:
+    thread = db.query(SMSThread).filter(SMSThread.id == thread_id).first()
+    if not thread:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Thread not found")
+    return thread
+
+
+@router.get("/threads/{thread_id}/messages")
+def get_thread_messages(
+    thread_id: str,
+    limit: int = Query(50, ge=1, le=200),
+    cursor: Optional[str] = None,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Messages exchanged with one number across all jobs, newest first"""
+    _require_inbox_role(current_user)
+    thread = get_thread_or_404(db, thread_id)
+    messages = with_archive("sms_messages", counterpart_number=thread.counterpart_number).subquery()
+    messages, next_cursor = keyset_page(db.query(messages), messages.c.received_at, messages.c.id, cursor, limit)
+    
+    return {
+        "thread_id": thread.id,
+        "counterpart_number": thread.counterpart_number,
+        "messages": [message_to_dict(msg) for msg in messages],
+        "next_cursor": next_cursor
+    }
+
+
+@router.get("/threads/by-number/{phone}")
+def get_thread_by_number(
+    phone: str,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Find the conversation with a phone number"""
+    _require_inbox_role(current_user)
+    thread = db.query(SMSThread).filter(SMSThread.counterpart_number == normalize_phone(phone)).first()
+    if not thread:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Thread not found")
+    return {"id": thread.id, "counterpart_number": thread.counterpart_number, "unread_count": thread.unread_count}
+
+
+@router.post("/threads/{thread_id}/read")
+def mark_thread_read(
+    thread_id: str,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Clear a conversation's unread count"""
+    _require_inbox_role(current_user)
+    thread = get_thread_or_404(db, thread_id)
+    thread.unread_count = 0
+    db.commit()
+    return {"id": thread.id, "unread_count": 0}
 
 
 @router.get("/timeline/{job_id}")
-def get_job_timeline(job_id: str):
+def get_job_timeline(job_id: str, db: Session = Depends(get_db)):
     """Get timeline/activity log for a job"""
-    db = SessionLocal()
-    try:
-        timeline = db.query(JobTimeline).filter(JobTimeline.job_id == job_id).order_by(JobTimeline.event_time).all()
-        
-        result = []
-        for event in timeline:
-            employee = db.query(User).filter(User.id == event.employee_id).first()
-            result.append({
-                "id": event.id,
-                "event_type": event.event_type,
-                "event_time": event.event_time,
-                "employee_name": f"{employee.first_name} {employee.last_name}" if employee else "Unknown",
-                "travel_time_minutes": event.travel_time // 60 if event.travel_time else None,
-                "job_duration_minutes": event.job_duration // 60 if event.job_duration else None,
-                "notes": event.notes
-            })
-        
-        return result
-    finally:
-        db.close()
+    timeline = db.query(JobTimeline, User.first_name, User.last_name).outerjoin(
+        User, User.id == JobTimeline.employee_id
+    ).filter(JobTimeline.job_id == job_id).order_by(JobTimeline.event_time).all()
+    events = [(event, first_name, last_name) for event, first_name, last_name in timeline]
+    
+    # Older jobs may have events in the cold archive, no later than the job's last event
+    bounds = db.query(Job.created_at, JobState.last_event_at).outerjoin(
+        JobState, JobState.job_id == Job.id
+    ).filter(Job.id == job_id).first()
+    created_at, last_event_at = bounds or (None, None)
+    archive_end = last_event_at or datetime.utcnow()
+    if created_at and archive_covers(db, "job_timeline", created_at, archive_end):
+        archived = [JobTimeline(**row) for row in read_archive(db, "job_timeline", created_at, archive_end, job_id=job_id)]
+        names = dict(
+            (user_id, (first_name, last_name)) for user_id, first_name, last_name in db.query(
+                User.id, User.first_name, User.last_name
+            ).filter(User.id.in_({event.employee_id for event in archived}))
+        )
+        events = sorted(
+            events + [(event, *names.get(event.employee_id, (None, None))) for event in archived],
+            key=lambda item: item[0].event_time
+        )
+    
+    return [{
+        "id": event.id,
+        "event_type": event.event_type,
+        "event_time": event.event_time,
+        "employee_name": f"{first_name} {last_name}" if event.employee_id and first_name is not None else "Unknown",
+        "travel_time_minutes": event.travel_time // 60 if event.travel_time else None,
+        "job_duration_minutes": event.job_duration // 60 if event.job_duration else None,
+        "latitude": event.latitude,
+        "longitude": event.longitude,
+        "notes": event.notes
+    } for event, first_name, last_name in events]
+
 
+@router.get("/timeline/{job_id}/state")
+def get_job_timeline_state(job_id: str, db: Session = Depends(get_db)):
+    """Current timeline state of a job with accumulated travel and on-site time"""
+    state = db.query(JobState).filter(JobState.job_id == job_id).first()
+    if not state:
+        if not db.query(Job.id).filter(Job.id == job_id).first():
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Job not found")
+        state = get_job_state(db, job_id)
+        db.commit()
+    
+    return {
+        "job_id": job_id,
+        "current_state": state.current_state,
+        "last_event_at": state.last_event_at,
+        "event_count": state.event_count,
+        "on_my_way_at": state.on_my_way_at,
+        "arrived_at": state.arrived_at,
+        "started_at": state.started_at,
+        "completed_at": state.completed_at,
+        "travel_minutes": state.travel_seconds // 60,
+        "on_site_minutes": state.on_site_seconds // 60
+    }
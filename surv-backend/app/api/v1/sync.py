@@ -0,0 +1,31 @@
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from sqlalchemy.orm import Session
+from typing import Optional
+from app.database import get_db
+from app.models.user import User, UserRole
+from app.utils.dependencies import get_current_user
+from app.utils.sync import sync_changes
+
+router = APIRouter(prefix="/sync", tags=["sync"])
+
+
+@router.get("")
+def sync(
+    since: int = Query(0, ge=0),
+    technician_id: Optional[str] = None,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Delta sync for the technician app: jobs, customers, notes and files changed
+    after the `since` cursor, and IDs to remove. Store the returned cursor and
+    send it next time; when reset is true, replace the local copy entirely.
+    """
+    if technician_id is None or technician_id == current_user.id:
+        technician_id = current_user.id
+    elif current_user.role not in [UserRole.admin, UserRole.manager]:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="You can only sync your own jobs"
+        )
+    return sync_changes(db, technician_id, since)
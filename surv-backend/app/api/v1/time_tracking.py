@@ -1,15 +1,33 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 from typing import List, Optional
 from datetime import datetime, date
+import csv
+import io
+import uuid
 from app.database import get_db
 from app.models.time_entry import TimeEntry
 from app.models.user import User, UserRole
-from app.schemas.time_entry import TimeEntryCreate, TimeEntryResponse
+from app.schemas.job import JobResponse
+from app.schemas.time_entry import TimeEntryCreate, TimeEntryResponse, TimeEntryBatch, TimeEntryBatchResult
+from app.schemas.user import UserSummary
+from app.utils.archive import archive_covers, read_archive
 from app.utils.dependencies import get_current_user
+from app.utils.expand import ResourceView
+from app.utils.geo import encode_cell
+from app.utils.sql import dialect_insert
+from app.utils.timesheets import ENTRY_TYPES, build_timesheets
 
 router = APIRouter(prefix="/time-tracking", tags=["time-tracking"])
 
+# Related resources list_time_entries can embed with ?include=
+TIME_ENTRY_INCLUDES = {
+    "employee": (TimeEntry.employee, UserSummary),
+    "job": (TimeEntry.job, JobResponse)
+}
+
 
 @router.get("", response_model=List[TimeEntryResponse])
 def list_time_entries(
@@ -18,11 +36,14 @@ def list_time_entries(
     date_to: Optional[date] = None,
     skip: int = 0,
     limit: int = 100,
+    include: Optional[str] = Query(None, description="Comma-separated: employee, job"),
+    fields: Optional[str] = Query(None, description="Comma-separated time entry fields to return"),
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
     """List time entries with optional filters"""
-    query = db.query(TimeEntry)
+    view = ResourceView(TimeEntry, TimeEntryResponse, TIME_ENTRY_INCLUDES, fields, include)
+    query = view.apply(db.query(TimeEntry))
     
     # Technicians can only see their own entries
     if current_user.role == UserRole.technician:
@@ -37,8 +58,27 @@ def list_time_entries(
         query = query.filter(TimeEntry.entry_time <= datetime.combine(date_to, datetime.max.time()))
     
     query = query.order_by(TimeEntry.entry_time.desc())
-    entries = query.offset(skip).limit(limit).all()
     
+    # Ranges reaching into archived months are served from the archive as well
+    range_start = datetime.combine(date_from, datetime.min.time()) if date_from else None
+    range_end = datetime.combine(date_to, datetime.max.time()) if date_to else datetime.utcnow()
+    if range_start and archive_covers(db, "time_entries", range_start, range_end):
+        employee_filter = current_user.id if current_user.role == UserRole.technician else employee_id
+        archived = read_archive(
+            db, "time_entries", range_start, range_end,
+            **({"employee_id": employee_filter} if employee_filter else {})
+        )
+        entries = sorted(
+            query.limit(skip + limit).all() + [TimeEntry(**row) for row in archived],
+            key=lambda entry: entry.entry_time,
+            reverse=True
+        )[skip:skip + limit]
+    else:
+        entries = query.offset(skip).limit(limit).all()
+    
+    if view.active:
+        view.attach(db, entries)
+        return view.response(entries)
     return [TimeEntryResponse.model_validate(entry) for entry in entries]
 
 
@@ -49,17 +89,103 @@ def create_time_entry(
     current_user: User = Depends(get_current_user)
 ):
     """Create a new time entry (clock in/out)"""
+    def find_replayed():
+        return db.query(TimeEntry).filter(
+            TimeEntry.employee_id == current_user.id,
+            TimeEntry.client_entry_id == entry_data.client_entry_id
+        ).first()
+    
+    if entry_data.client_entry_id:
+        existing = find_replayed()
+        if existing:
+            return TimeEntryResponse.model_validate(existing)
+    
     db_entry = TimeEntry(
         **entry_data.model_dump(),
         employee_id=current_user.id
     )
     db.add(db_entry)
-    db.commit()
+    try:
+        db.commit()
+    except IntegrityError:
+        # A concurrent replay of the same punch was inserted first
+        db.rollback()
+        existing = find_replayed() if entry_data.client_entry_id else None
+        if not existing:
+            raise
+        return TimeEntryResponse.model_validate(existing)
     db.refresh(db_entry)
     
     return TimeEntryResponse.model_validate(db_entry)
 
 
+@router.post("/batch", response_model=List[TimeEntryBatchResult])
+def create_time_entries_batch(
+    batch: TimeEntryBatch,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Record punches queued by the mobile app while offline, in one transaction.
+    Items already received (same client_entry_id) are reported as duplicates.
+    """
+    table = TimeEntry.__table__
+    now = datetime.utcnow()
+    rows = []
+    rejected = {}
+    seen = set()
+    for item in batch.entries:
+        # Replays can repeat an item within one batch too; the first copy wins
+        if item.client_entry_id in seen:
+            continue
+        seen.add(item.client_entry_id)
+        if item.entry_type not in ENTRY_TYPES:
+            rejected[item.client_entry_id] = f"Unknown entry type: {item.entry_type}"
+            continue
+        rows.append({
+            **item.model_dump(),
+            "id": str(uuid.uuid4()),
+            "employee_id": current_user.id,
+            "geo_cell": encode_cell(item.latitude, item.longitude),
+            "created_at": now
+        })
+    
+    created = {}
+    if rows:
+        conn = db.connection()
+        stmt = dialect_insert(conn, table).values(rows).on_conflict_do_nothing(
+            index_elements=["employee_id", "client_entry_id"]
+        ).returning(table.c.client_entry_id, table.c.id)
+        created = dict(conn.execute(stmt).all())
+    
+    existing = {}
+    missing = [row["client_entry_id"] for row in rows if row["client_entry_id"] not in created]
+    if missing:
+        existing = dict(db.query(TimeEntry.client_entry_id, TimeEntry.id).filter(
+            TimeEntry.employee_id == current_user.id,
+            TimeEntry.client_entry_id.in_(missing)
+        ).all())
+    db.commit()
+    
+    results = []
+    reported = set()
+    for item in batch.entries:
+        client_entry_id = item.client_entry_id
+        if client_entry_id in rejected:
+            results.append(TimeEntryBatchResult(client_entry_id=client_entry_id, status="rejected", error=rejected[client_entry_id]))
+        elif client_entry_id in created and client_entry_id not in reported:
+            results.append(TimeEntryBatchResult(client_entry_id=client_entry_id, status="created", id=created[client_entry_id]))
+        else:
+            results.append(TimeEntryBatchResult(
+                client_entry_id=client_entry_id,
+                status="duplicate",
+                id=created.get(client_entry_id) or existing.get(client_entry_id)
+            ))
+        reported.add(client_entry_id)
+    
+    return results
+
+
 @router.get("/summary/{employee_id}")
 def get_time_summary(
     employee_id: str,
@@ -76,28 +202,126 @@ def get_time_summary(
             detail="You can only view your own time summary"
         )
     
-    entries = db.query(TimeEntry).filter(
+    sheet = build_timesheets(db, date_from, date_to, employee_ids=[employee_id]).get(employee_id)
+    total_entries = db.query(TimeEntry).filter(
         TimeEntry.employee_id == employee_id,
         TimeEntry.entry_time >= datetime.combine(date_from, datetime.min.time()),
         TimeEntry.entry_time <= datetime.combine(date_to, datetime.max.time())
-    ).order_by(TimeEntry.entry_time).all()
+    ).count()
+    
+    return {
+        "employee_id": employee_id,
+        "date_from": date_from,
+        "date_to": date_to,
+        "total_hours": round(sheet.regular_hours + sheet.overtime_hours, 2) if sheet else 0.0,
+        "regular_hours": sheet.regular_hours if sheet else 0.0,
+        "overtime_hours": sheet.overtime_hours if sheet else 0.0,
+        "break_hours": sheet.break_hours if sheet else 0.0,
+        "flags": sheet.flags if sheet else [],
+        "total_entries": total_entries
+    }
+
+
+def require_payroll_role(current_user: User):
+    if current_user.role not in [UserRole.admin, UserRole.manager]:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Only admins and managers can run payroll"
+        )
+
+
+def employee_names(db: Session, employee_ids) -> dict:
+    return {
+        user_id: f"{first_name} {last_name}"
+        for user_id, first_name, last_name in db.query(User.id, User.first_name, User.last_name).filter(
+            User.id.in_(list(employee_ids))
+        )
+    }
+
+
+@router.get("/timesheets")
+def get_timesheets(
+    date_from: date,
+    date_to: date,
+    include_days: bool = False,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Pay-period timesheets for all employees, with breaks deducted and overtime applied"""
+    require_payroll_role(current_user)
     
-    total_hours = 0.0
-    clock_in = None
+    sheets = [sheet for sheet in build_timesheets(db, date_from, date_to).values() if sheet.days or sheet.flags]
+    names = employee_names(db, [sheet.employee_id for sheet in sheets])
     
-    for entry in entries:
-        if entry.entry_type == "clock_in":
-            clock_in = entry.entry_time
-        elif entry.entry_type == "clock_out" and clock_in:
-            hours = (entry.entry_time - clock_in).total_seconds() / 3600
-            total_hours += hours
-            clock_in = None
+    result = []
+    for sheet in sorted(sheets, key=lambda sheet: names.get(sheet.employee_id, "")):
+        row = {
+            "employee_id": sheet.employee_id,
+            "employee_name": names.get(sheet.employee_id, "Unknown"),
+            "shifts": sheet.shifts,
+            "regular_hours": sheet.regular_hours,
+            "overtime_hours": sheet.overtime_hours,
+            "break_hours": sheet.break_hours,
+            "flags": sheet.flags
+        }
+        if include_days:
+            row["days"] = [{
+                "date": day_date,
+                "shifts": day.shifts,
+                "regular_hours": day.regular_hours,
+                "overtime_hours": day.overtime_hours,
+                "break_hours": round(day.break_seconds / 3600, 2)
+            } for day_date, day in sorted(sheet.days.items())]
+        result.append(row)
     
     return {
-        "employee_id": employee_id,
         "date_from": date_from,
         "date_to": date_to,
-        "total_hours": round(total_hours, 2),
-        "total_entries": len(entries)
+        "employees": result
     }
 
+
+@router.get("/timesheets/export")
+def export_timesheets(
+    date_from: date,
+    date_to: date,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Pay-period timesheets as CSV, one row per employee per day worked"""
+    require_payroll_role(current_user)
+    
+    sheets = build_timesheets(db, date_from, date_to)
+    names = employee_names(db, sheets.keys())
+    
+    def rows():
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(["employee_id", "employee_name", "date", "shifts", "regular_hours",
+                         "overtime_hours", "break_hours", "flags"])
+        for sheet in sorted(sheets.values(), key=lambda sheet: names.get(sheet.employee_id, "")):
+            flags_by_day = {}
+            for flag in sheet.flags:
+                flags_by_day.setdefault(flag["entry_time"].date(), []).append(flag["type"])
+            for day_date in sorted(set(sheet.days) | set(flags_by_day)):
+                day = sheet.days.get(day_date)
+                writer.writerow([
+                    sheet.employee_id,
+                    names.get(sheet.employee_id, ""),
+                    day_date.isoformat(),
+                    day.shifts if day else 0,
+                    f"{day.regular_hours:.2f}" if day else "0.00",
+                    f"{day.overtime_hours:.2f}" if day else "0.00",
+                    f"{day.break_seconds / 3600:.2f}" if day else "0.00",
+                    ";".join(flags_by_day.get(day_date, []))
+                ])
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    
+    filename = f"timesheets_{date_from}_{date_to}.csv"
+    return StreamingResponse(
+        rows(),
+        media_type="text/csv",
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
@@ -1,6 +1,6 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
 from app.database import get_db
 from app.models.user import User, UserRole
 from app.utils.dependencies import get_current_user
@@ -14,6 +14,7 @@ class UserUpdate(BaseModel):
     last_name: str = None
     phone: str = None
     is_active: bool = None
+    skills: Optional[List[str]] = None
 
 
 class UserResponse(BaseModel):
@@ -25,6 +26,7 @@ class UserResponse(BaseModel):
     role: str
     is_active: bool
     email_verified: bool
+    skills: Optional[List[str]] = None
 
     class Config:
         from_attributes = True
@@ -90,6 +92,8 @@ def update_user(
     
     # Update only provided fields
     update_data = user_data.model_dump(exclude_unset=True)
+    if "skills" in update_data and current_user.role not in [UserRole.admin, UserRole.manager]:
+        raise HTTPException(status_code=403, detail="Only admins and managers can change skills")
     for field, value in update_data.items():
         setattr(user, field, value)
     
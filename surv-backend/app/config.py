@@ -20,6 +20,9 @@ class Settings(BaseSettings):
     TWILIO_ACCOUNT_SID: str = ""
     TWILIO_AUTH_TOKEN: str = ""
     TWILIO_PHONE_NUMBER: str = ""
+    TWILIO_MESSAGES_PER_SECOND: float = 30.0
+    TWILIO_STATUS_CALLBACK_URL: str = ""  # e.g. https://<app>/api/v1/sms/status
+    SMS_STATUS_FLUSH_SECONDS: float = 0.25
     
     # Stripe Payment Settings - Set via Heroku config vars
     STRIPE_SECRET_KEY: str = ""
@@ -27,6 +30,72 @@ class Settings(BaseSettings):
     
     # SendGrid Email Settings - Set via Heroku config vars
     SENDGRID_API_KEY: str = ""
+    SENDGRID_API_URL: str = "https://api.sendgrid.com/v3/mail/send"
+    SENDGRID_FROM_EMAIL: str = "noreply@surv.com"
+    SENDGRID_REQUESTS_PER_SECOND: float = 10.0
+    CAMPAIGN_SEND_WORKERS: int = 4
+    CAMPAIGN_PREPARE_STALE_MINUTES: int = 30  # A campaign preparing this long is treated as crashed
+    CAMPAIGN_SCHEDULER_ENABLED: bool = True
+    CAMPAIGN_SCHEDULE_POLL_SECONDS: float = 60.0  # how often scheduled campaigns are checked
+    
+    # Next-day job reminders
+    REMINDER_SCHEDULER_ENABLED: bool = True
+    REMINDER_SEND_HOUR_UTC: int = 22  # ~5-6pm US Eastern
+    
+    # Outbound message outbox
+    OUTBOX_WORKER_ENABLED: bool = True
+    OUTBOX_WORKERS: int = 2
+    OUTBOX_BATCH_SIZE: int = 50
+    OUTBOX_POLL_SECONDS: float = 5.0
+    OUTBOX_MAX_ATTEMPTS: int = 6
+    
+    # Payroll overtime rules (0 disables a rule)
+    PAYROLL_DAILY_OVERTIME_HOURS: float = 8.0
+    PAYROLL_WEEKLY_OVERTIME_HOURS: float = 40.0
+    PAYROLL_WEEK_START_DAY: int = 0  # 0 = Monday
+    
+    # Cold archive for append-only tables (rows move to <table>_archive)
+    ARCHIVE_DIR: str = "archive"  # files from the earlier file-based archive, imported by `alembic upgrade head`
+    ARCHIVE_RETENTION_MONTHS: int = 12
+    
+    # Mileage from GPS breadcrumbs
+    MILEAGE_MIN_MOVE_METERS: float = 25.0  # smaller moves are treated as jitter
+    MILEAGE_MAX_SPEED_MPH: float = 100.0  # faster jumps are treated as GPS spikes
+    MILEAGE_MAX_ACCURACY_METERS: float = 65.0  # less accurate fixes are ignored
+    
+    # Live technician locations
+    LIVE_LOCATION_FLUSH_SECONDS: float = 2.0
+    BREADCRUMB_FULL_RESOLUTION_DAYS: int = 1  # older trails are downsampled
+    BREADCRUMB_DOWNSAMPLE_SECONDS: int = 30
+    
+    # Route optimizer
+    ROUTE_DAY_START_HOUR: int = 8
+    ROUTE_AVERAGE_SPEED_MPH: float = 30.0
+    ROUTE_CIRCUITY_FACTOR: float = 1.3  # road distance / straight-line distance
+    ROUTE_ARRIVAL_WINDOW_MINUTES: int = 60  # arriving later than start time + window is late
+    ROUTE_LATE_PENALTY: float = 10.0  # cost minutes per minute late
+    ROUTE_DEFAULT_DURATION_MINUTES: int = 60
+    
+    # Auto-assignment scoring (score is in minutes; lower is better)
+    ASSIGN_DAY_CAPACITY_MINUTES: int = 480
+    ASSIGN_LOAD_WEIGHT: float = 10.0  # score minutes per hour already booked that day
+    ASSIGN_EMPTY_DAY_TRAVEL_MINUTES: float = 20.0  # assumed travel for a technician with no stops
+    ASSIGN_MIN_HISTORY_JOBS: int = 3  # completed jobs of a type before their average duration is used
+    AUTO_ASSIGN_ONLINE_BOOKINGS: bool = False
+    BOOKING_MAX_HOLDS_PER_CLIENT: int = 3  # unexpired slot holds one public client may keep
+    
+    # Technician app delta sync
+    SYNC_HISTORY_DAYS: int = 14  # jobs scheduled before today - N days are not synced
+    SYNC_TOMBSTONE_RETENTION_DAYS: int = 30  # clients offline longer get a full resync
+    
+    # QuickBooks accounting export
+    ACCOUNTING_EXPORT_DIR: str = "exports"  # files from before exports were stored in the database, imported by `alembic upgrade head`
+    ACCOUNTING_EXPORT_STALE_MINUTES: int = 60  # a run silent this long is treated as crashed
+    QB_AR_ACCOUNT: str = "Accounts Receivable"
+    QB_INCOME_ACCOUNT: str = "Services"
+    QB_TAX_ACCOUNT: str = "Sales Tax Payable"
+    QB_DISCOUNT_ACCOUNT: str = "Discounts Given"
+    QB_DEPOSIT_ACCOUNT: str = "Undeposited Funds"
     
     # Lemma IAM Settings - Set via Heroku config vars
     LEMMA_API_KEY: str = ""
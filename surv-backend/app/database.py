@@ -1,6 +1,8 @@
+from contextvars import ContextVar
+from typing import Optional
 from sqlalchemy import create_engine
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import Session, sessionmaker
 from app.config import settings
 
 # Fix Heroku postgres:// URL to postgresql://
@@ -19,8 +21,16 @@ SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
 
+# Set by POST /batch so its sub-requests share one session
+batch_session: ContextVar[Optional[Session]] = ContextVar("batch_session", default=None)
+
+
 # Dependency for getting DB session
 def get_db():
+    shared = batch_session.get()
+    if shared is not None:
+        yield shared
+        return
     db = SessionLocal()
     try:
         yield db
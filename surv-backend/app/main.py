@@ -5,7 +5,12 @@ from fastapi.responses import FileResponse
 from pathlib import Path
 from app.config import settings
 from app.database import engine, Base
-from app.api.v1 import auth, customers, jobs, invoices, estimates, time_tracking, recurring_jobs, reports, files, payments, notifications, booking, campaigns, sms_webhook, users, lemma_auth
+from app.utils.live_locations import live_locations
+from app.utils.campaigns import start_campaign_scheduler, stop_campaign_scheduler
+from app.utils.outbox import start_outbox_workers, stop_outbox_workers
+from app.utils.reminders import start_reminder_scheduler, stop_reminder_scheduler
+from app.utils.sms_status import status_buffer
+from app.api.v1 import auth, customers, jobs, invoices, estimates, time_tracking, recurring_jobs, reports, files, payments, notifications, booking, campaigns, sms_webhook, users, lemma_auth, locations, sync, batch, accounting
 
 # Create database tables
 Base.metadata.create_all(bind=engine)
@@ -25,6 +30,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 
 # Include routers
@@ -44,6 +50,30 @@ app.include_router(campaigns.router, prefix="/api/v1")
 app.include_router(sms_webhook.router, prefix="/api/v1")
 app.include_router(users.router, prefix="/api/v1")
 app.include_router(lemma_auth.router, prefix="/api/v1")
+app.include_router(locations.router, prefix="/api/v1")
+app.include_router(sync.router, prefix="/api/v1")
+app.include_router(batch.router, prefix="/api/v1")
+app.include_router(accounting.router, prefix="/api/v1")
+
+
+@app.on_event("startup")
+def start_background_jobs():
+    if settings.REMINDER_SCHEDULER_ENABLED:
+        start_reminder_scheduler()
+    if settings.CAMPAIGN_SCHEDULER_ENABLED:
+        start_campaign_scheduler()
+    if settings.OUTBOX_WORKER_ENABLED:
+        start_outbox_workers()
+    live_locations.start()
+
+
+@app.on_event("shutdown")
+def stop_background_jobs():
+    stop_reminder_scheduler()
+    stop_campaign_scheduler()
+    stop_outbox_workers()
+    status_buffer.stop()
+    live_locations.stop()
 
 
 @app.get("/api")
@@ -8,6 +8,27 @@ from app.models.time_entry import TimeEntry
 from app.models.job_note import JobNote
 from app.models.recurring_job import RecurringJob
 from app.models.file_upload import FileUpload
+from app.models.sms_message import SMSMessage
+from app.models.job_timeline import JobTimeline
+from app.models.service_plan import ServicePlan, CustomerServicePlan
+from app.models.availability import AvailabilityDay
+from app.models.slot_hold import SlotHold
+from app.models.number_sequence import NumberSequence
+from app.models.campaign import Campaign, CampaignRecipient
+from app.models.message_template import MessageTemplate
+from app.models.segment import Segment
+from app.models.notification_delivery import NotificationDelivery
+from app.models.outbox_message import OutboxMessage
+from app.models.sms_thread import SMSThread
+from app.models.job_state import JobState
+from app.models.archive_segment import ArchiveSegment, time_entries_archive, sms_messages_archive, job_timeline_archive
+from app.models.breadcrumb_day import BreadcrumbDay
+from app.models.technician_location import TechnicianLocation
+from app.models.zip_centroid import ZipCentroid
+from app.models.technician_day_load import TechnicianDayLoad
+from app.models.sync_tombstone import SyncTombstone
+from app.models.payment import Payment
+from app.models.accounting_export import AccountingExport
 
-__all__ = ["User", "Customer", "Job", "Invoice", "InvoiceLineItem", "Estimate", "EstimateLineItem", "TimeEntry", "JobNote", "RecurringJob", "FileUpload"]
+__all__ = ["User", "Customer", "Job", "Invoice", "InvoiceLineItem", "Estimate", "EstimateLineItem", "TimeEntry", "JobNote", "RecurringJob", "FileUpload", "SMSMessage", "JobTimeline", "ServicePlan", "CustomerServicePlan", "AvailabilityDay", "SlotHold", "NumberSequence", "Campaign", "CampaignRecipient", "MessageTemplate", "Segment", "NotificationDelivery", "OutboxMessage", "SMSThread", "JobState", "ArchiveSegment", "time_entries_archive", "sms_messages_archive", "job_timeline_archive", "BreadcrumbDay", "TechnicianLocation", "ZipCentroid", "TechnicianDayLoad", "SyncTombstone", "Payment", "AccountingExport"]
 
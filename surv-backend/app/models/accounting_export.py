@@ -0,0 +1,31 @@
+from sqlalchemy import Column, String, DateTime, ForeignKey, Date, Integer, BigInteger, Text, JSON, LargeBinary
+from sqlalchemy.orm import deferred
+from datetime import datetime
+import uuid
+from app.database import Base
+
+
+class AccountingExport(Base):
+    """One run of the QuickBooks export and the file it produced"""
+    __tablename__ = "accounting_exports"
+
+    id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
+    format = Column(String(10), nullable=False)  # iif, csv
+    kind = Column(String(20), nullable=False)  # incremental, backfill, reexport
+    status = Column(String(20), nullable=False, default="pending")  # pending, running, completed, failed
+    date_from = Column(Date)  # backfill range (invoice issue date / payment date)
+    date_to = Column(Date)
+    source_export_id = Column(String, ForeignKey("accounting_exports.id"))  # reexport: the run whose rows it writes again
+    seq_from = Column(BigInteger)  # incremental: change_seq range covered
+    seq_to = Column(BigInteger)
+    invoice_count = Column(Integer, default=0)
+    line_count = Column(Integer, default=0)
+    payment_count = Column(Integer, default=0)
+    voided_invoices = Column(JSON)  # invoice numbers voided after an earlier export
+    modified_invoices = Column(JSON)  # invoice numbers whose exported fields changed after an earlier export
+    content = deferred(Column(LargeBinary))  # the finished IIF file or CSV zip
+    error = Column(Text)
+    created_by = Column(String, ForeignKey("users.id"))
+    created_at = Column(DateTime, default=datetime.utcnow)
+    started_at = Column(DateTime)
+    completed_at = Column(DateTime)
@@ -0,0 +1,52 @@
+from sqlalchemy import Column, String, DateTime, Date, Integer, Index, Table
+from datetime import datetime
+import uuid
+from app.database import Base
+from app.models.job_timeline import JobTimeline
+from app.models.sms_message import SMSMessage
+from app.models.time_entry import TimeEntry
+
+
+class ArchiveSegment(Base):
+    """One chunk of rows moved from a hot table to its archive table by the retention job"""
+    __tablename__ = "archive_segments"
+    __table_args__ = (
+        Index("ix_archive_segments_month", "table_name", "month"),
+    )
+
+    id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
+    table_name = Column(String(50), nullable=False)  # time_entries, sms_messages, job_timeline
+    month = Column(Date, nullable=False)  # first day of the month the rows belong to
+    row_count = Column(Integer, nullable=False)
+    min_time = Column(DateTime, nullable=False)
+    max_time = Column(DateTime, nullable=False)
+    archived_at = Column(DateTime, default=datetime.utcnow)
+
+
+def _archive_table(model, *indexes) -> Table:
+    """Same columns as the hot table, without foreign keys or unique constraints"""
+    columns = [
+        Column(column.name, column.type, primary_key=column.primary_key, nullable=column.nullable)
+        for column in model.__table__.columns
+    ]
+    return Table(f"{model.__tablename__}_archive", Base.metadata, *columns, *indexes)
+
+
+time_entries_archive = _archive_table(
+    TimeEntry,
+    Index("ix_time_entries_archive_employee_time", "employee_id", "entry_time"),
+    Index("ix_time_entries_archive_time", "entry_time")
+)
+
+sms_messages_archive = _archive_table(
+    SMSMessage,
+    Index("ix_sms_messages_archive_thread", "counterpart_number", "received_at", "id"),
+    Index("ix_sms_messages_archive_job", "job_id", "received_at", "id"),
+    Index("ix_sms_messages_archive_received", "received_at")
+)
+
+job_timeline_archive = _archive_table(
+    JobTimeline,
+    Index("ix_job_timeline_archive_job", "job_id", "event_time"),
+    Index("ix_job_timeline_archive_time", "event_time")
+)
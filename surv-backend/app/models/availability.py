@@ -0,0 +1,12 @@
+from sqlalchemy import Column, Date, DateTime, JSON
+from datetime import datetime
+from app.database import Base
+
+
+class AvailabilityDay(Base):
+    """Precomputed booking slot counts for one calendar day"""
+    __tablename__ = "availability_days"
+
+    slot_date = Column(Date, primary_key=True)
+    booked_counts = Column(JSON, nullable=False, default=dict)  # {"08:00": 1, ...}
+    refreshed_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -0,0 +1,36 @@
+from sqlalchemy import Column, String, DateTime, Date, ForeignKey, Integer, LargeBinary, UniqueConstraint, JSON
+from sqlalchemy.orm import relationship
+from datetime import datetime
+import uuid
+from app.database import Base
+
+
+class BreadcrumbDay(Base):
+    """
+    One technician's GPS trail for one (UTC) day, stored as packed arrays
+    (see app.utils.breadcrumbs) instead of one row per point
+    """
+    __tablename__ = "breadcrumb_days"
+    __table_args__ = (
+        UniqueConstraint("employee_id", "day", name="uq_breadcrumb_days_employee_day"),
+    )
+
+    id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
+    employee_id = Column(String, ForeignKey("users.id"), nullable=False)
+    day = Column(Date, nullable=False, index=True)
+    point_count = Column(Integer, nullable=False, default=0)
+    resolution_seconds = Column(Integer, nullable=False, default=0)  # 0 = as recorded
+
+    # Parallel little-endian arrays sorted by time
+    seconds = Column(LargeBinary, nullable=False, default=b"")  # uint32 seconds since midnight
+    lat_e6 = Column(LargeBinary, nullable=False, default=b"")  # int32 microdegrees
+    lng_e6 = Column(LargeBinary, nullable=False, default=b"")  # int32 microdegrees
+    accuracy = Column(LargeBinary, nullable=False, default=b"")  # uint16 meters, 65535 = unknown
+
+    # Mileage measured at full resolution just before the trail was first thinned
+    mileage = Column(JSON)
+
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    # Relationships
+    employee = relationship("User")
@@ -0,0 +1,52 @@
+from sqlalchemy import Column, String, DateTime, ForeignKey, Text, Integer, Index, JSON
+from sqlalchemy.orm import relationship
+from datetime import datetime
+import uuid
+from app.database import Base
+
+
+class Campaign(Base):
+    """Email marketing campaign and its send progress"""
+    __tablename__ = "campaigns"
+
+    id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
+    name = Column(String(255), nullable=False)
+    subject = Column(String(255), nullable=False)
+    body = Column(Text, nullable=False)
+    template = Column(String(100))
+    segment_id = Column(String, ForeignKey("segments.id"))
+    target_customers = Column(JSON)  # Customer IDs picked at creation, kept so preparation can be re-run
+    status = Column(String(50), default="draft")  # preparing, draft, scheduled, sending, sent, failed
+    recipients_count = Column(Integer, default=0)
+    sent_count = Column(Integer, default=0)
+    failed_count = Column(Integer, default=0)
+    opened_count = Column(Integer, default=0)
+    clicked_count = Column(Integer, default=0)
+    scheduled_at = Column(DateTime)
+    started_at = Column(DateTime)
+    completed_at = Column(DateTime)
+    created_by = Column(String, ForeignKey("users.id"))
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    # Relationships
+    recipients = relationship("CampaignRecipient", back_populates="campaign", cascade="all, delete-orphan")
+
+
+class CampaignRecipient(Base):
+    """One customer in a campaign, grouped into provider-sized send batches"""
+    __tablename__ = "campaign_recipients"
+    __table_args__ = (
+        Index("ix_campaign_recipients_batch", "campaign_id", "status", "batch_number"),
+    )
+
+    campaign_id = Column(String, ForeignKey("campaigns.id", ondelete="CASCADE"), primary_key=True)
+    customer_id = Column(String, ForeignKey("customers.id"), primary_key=True)
+    email = Column(String(255), nullable=False)
+    name = Column(String(255))
+    batch_number = Column(Integer, nullable=False)
+    status = Column(String(20), nullable=False, default="pending")  # pending, sending, sent, failed
+    sent_at = Column(DateTime)
+
+    # Relationships
+    campaign = relationship("Campaign", back_populates="recipients")
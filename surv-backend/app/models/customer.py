@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, DateTime, ForeignKey, Text
+from sqlalchemy import Column, String, DateTime, ForeignKey, Float, Text, BigInteger
 from sqlalchemy.orm import relationship
 from datetime import datetime
 import uuid
@@ -11,7 +11,7 @@ class Customer(Base):
     id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
     first_name = Column(String(100), nullable=False)
     last_name = Column(String(100), nullable=False)
-    email = Column(String(255), index=True)
+    email = Column(String(255), unique=True, index=True)
     phone = Column(String(20), index=True)
     mobile = Column(String(20))
     company_name = Column(String(255))
@@ -20,11 +20,14 @@ class Customer(Base):
     city = Column(String(100))
     state = Column(String(50))
     zip_code = Column(String(20))
+    latitude = Column(Float)  # service address, used as the job site location
+    longitude = Column(Float)
     notes = Column(Text)
     status = Column(String(50), default="active")  # active, inactive, archived
     created_by = Column(String, ForeignKey("users.id"))
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    change_seq = Column(BigInteger, index=True)  # delta sync cursor, see app.utils.sync
 
     # Relationships
     created_by_user = relationship("User", back_populates="created_customers", foreign_keys=[created_by])
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, DateTime, ForeignKey, Integer
+from sqlalchemy import Column, String, DateTime, ForeignKey, Integer, BigInteger
 from sqlalchemy.orm import relationship
 from datetime import datetime
 import uuid
@@ -26,6 +26,7 @@ class FileUpload(Base):
     # Upload metadata
     uploaded_by = Column(String, ForeignKey("users.id"))
     uploaded_at = Column(DateTime, default=datetime.utcnow)
+    change_seq = Column(BigInteger, index=True)  # delta sync cursor, see app.utils.sync
 
     # Relationships
     uploader = relationship("User")
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, DateTime, ForeignKey, Text, Date, Numeric
+from sqlalchemy import Column, String, DateTime, ForeignKey, Text, Date, Numeric, BigInteger
 from sqlalchemy.orm import relationship
 from datetime import datetime, timedelta
 import uuid
@@ -29,9 +29,13 @@ class Invoice(Base):
     paid_at = Column(DateTime)
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    change_seq = Column(BigInteger, index=True)  # accounting export high-water mark, see app.utils.sync
+    accounting_export_id = Column(String, ForeignKey("accounting_exports.id"))  # set once sent to QuickBooks
+    accounting_digest = Column(String(64))  # hash of the fields last sent to QuickBooks
 
     # Relationships
     customer = relationship("Customer", back_populates="invoices")
     job = relationship("Job", back_populates="invoice")
     line_items = relationship("InvoiceLineItem", back_populates="invoice", cascade="all, delete-orphan")
+    payments = relationship("Payment", back_populates="invoice")
 
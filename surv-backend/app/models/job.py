@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, DateTime, ForeignKey, Text, Date, Time, Integer
+from sqlalchemy import Column, String, DateTime, ForeignKey, Text, Date, Time, Integer, BigInteger
 from sqlalchemy.orm import relationship
 from datetime import datetime
 import uuid
@@ -26,6 +26,8 @@ class Job(Base):
     created_by = Column(String, ForeignKey("users.id"))
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    change_seq = Column(BigInteger, index=True)  # delta sync cursor, see app.utils.sync
+    scope_seq = Column(BigInteger)  # change_seq when the job last entered a technician's synced set
 
     # Relationships
     customer = relationship("Customer", back_populates="jobs")
@@ -33,4 +35,5 @@ class Job(Base):
     invoice = relationship("Invoice", back_populates="job", uselist=False)
     sms_messages = relationship("SMSMessage", back_populates="job", cascade="all, delete-orphan")
     timeline = relationship("JobTimeline", back_populates="job", cascade="all, delete-orphan")
+    state = relationship("JobState", back_populates="job", uselist=False, cascade="all, delete-orphan")
 
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, DateTime, ForeignKey, Text
+from sqlalchemy import Column, String, DateTime, ForeignKey, Text, BigInteger
 from sqlalchemy.orm import relationship
 from datetime import datetime
 import uuid
@@ -14,6 +14,7 @@ class JobNote(Base):
     note = Column(Text, nullable=False)
     is_internal = Column(String, default=False)  # True for internal notes, False for customer-visible
     created_at = Column(DateTime, default=datetime.utcnow)
+    change_seq = Column(BigInteger, index=True)  # delta sync cursor, see app.utils.sync
 
     # Relationships
     job = relationship("Job")
@@ -0,0 +1,35 @@
+from sqlalchemy import Column, String, DateTime, ForeignKey, Integer
+from sqlalchemy.orm import relationship
+from datetime import datetime
+from app.database import Base
+
+
+class JobState(Base):
+    """Per-job projection of status and timeline, updated with every timeline event"""
+    __tablename__ = "job_state"
+
+    job_id = Column(String, ForeignKey("jobs.id"), primary_key=True)
+
+    # Job status, changed only through app.utils.job_state_machine
+    status = Column(String(50), index=True)
+    status_changed_at = Column(DateTime)
+
+    # Latest timeline event
+    current_state = Column(String(50))  # on_my_way, arrived, started, completed, scheduled, cancelled...
+    last_event_at = Column(DateTime)
+    event_count = Column(Integer, nullable=False, default=0)
+
+    # Most recent time of each event type
+    on_my_way_at = Column(DateTime)
+    arrived_at = Column(DateTime)
+    started_at = Column(DateTime)
+    completed_at = Column(DateTime)
+    cancelled_at = Column(DateTime)
+
+    # Accumulated over every visit (in seconds)
+    travel_seconds = Column(Integer, nullable=False, default=0)
+    on_site_seconds = Column(Integer, nullable=False, default=0)
+
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    job = relationship("Job", back_populates="state")
@@ -1,12 +1,18 @@
-from sqlalchemy import Column, String, DateTime, ForeignKey, Integer
+from sqlalchemy import Column, String, DateTime, ForeignKey, Integer, Float, BigInteger, Index, event
 from sqlalchemy.orm import relationship
 from datetime import datetime
 import uuid
 from app.database import Base
+from app.utils.geo import set_geo_cell
 
 
 class JobTimeline(Base):
     __tablename__ = "job_timeline"
+    __table_args__ = (
+        Index("ix_job_timeline_job", "job_id", "event_time"),
+        Index("ix_job_timeline_time", "event_time"),
+        Index("ix_job_timeline_geo_cell", "geo_cell", "event_time"),
+    )
 
     id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
     job_id = Column(String, ForeignKey("jobs.id"), nullable=False)
@@ -23,8 +29,9 @@ class JobTimeline(Base):
     job_duration = Column(Integer)  # seconds from started to completed
     
     # Location data
-    latitude = Column(String(20))
-    longitude = Column(String(20))
+    latitude = Column(Float)
+    longitude = Column(Float)
+    geo_cell = Column(BigInteger)  # app.utils.geo.encode_cell(latitude, longitude)
     
     # Notes
     notes = Column(String(500))
@@ -34,11 +41,5 @@ class JobTimeline(Base):
     employee = relationship("User")
 
 
-
-
-
-
-
-
-
-
+event.listen(JobTimeline, "before_insert", set_geo_cell)
+event.listen(JobTimeline, "before_update", set_geo_cell)
@@ -0,0 +1,20 @@
+from sqlalchemy import Column, String, DateTime, ForeignKey, Text, Integer, Boolean
+from datetime import datetime
+import uuid
+from app.database import Base
+
+
+class MessageTemplate(Base):
+    """Reusable email/SMS message with {field} placeholders"""
+    __tablename__ = "message_templates"
+
+    id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
+    name = Column(String(100), unique=True, nullable=False, index=True)
+    category = Column(String(50), default="general")  # operations, billing, marketing, general
+    subject = Column(String(255))
+    body = Column(Text, nullable=False)
+    version = Column(Integer, nullable=False, default=1)  # bumped on every edit
+    is_active = Column(Boolean, default=True)
+    created_by = Column(String, ForeignKey("users.id"))
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
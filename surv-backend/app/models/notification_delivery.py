@@ -0,0 +1,27 @@
+from sqlalchemy import Column, String, DateTime, Date, ForeignKey, Text, UniqueConstraint, Index
+from datetime import datetime
+import uuid
+from app.database import Base
+
+
+class NotificationDelivery(Base):
+    """One automated customer notification and its delivery status"""
+    __tablename__ = "notification_deliveries"
+    __table_args__ = (
+        UniqueConstraint("job_id", "kind", "channel", "notification_date", name="uq_notification_deliveries_once"),
+        Index("ix_notification_deliveries_run", "kind", "notification_date", "status"),
+    )
+
+    id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
+    job_id = Column(String, ForeignKey("jobs.id"), nullable=False)
+    kind = Column(String(50), nullable=False)  # job_reminder
+    channel = Column(String(20), nullable=False)  # sms, email
+    notification_date = Column(Date, nullable=False)  # day the notification is about
+    recipient = Column(String(255), nullable=False)
+    status = Column(String(20), nullable=False, default="pending")  # pending, sending, queued (SMS, handed to the outbox), sent, mock_sent, failed
+    provider_message_id = Column(String(100))  # Twilio SID
+    error = Column(Text)
+    run_id = Column(String(36))
+    claimed_at = Column(DateTime)
+    sent_at = Column(DateTime)
+    created_at = Column(DateTime, default=datetime.utcnow)
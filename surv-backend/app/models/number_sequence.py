@@ -0,0 +1,10 @@
+from sqlalchemy import Column, String, Integer
+from app.database import Base
+
+
+class NumberSequence(Base):
+    """Monotonic counters for human-readable document numbers"""
+    __tablename__ = "number_sequences"
+
+    name = Column(String(50), primary_key=True)  # job, ...
+    value = Column(Integer, nullable=False, default=0)
@@ -0,0 +1,33 @@
+from sqlalchemy import Column, String, DateTime, ForeignKey, Text, Integer, Index
+from sqlalchemy.orm import relationship
+from datetime import datetime
+import uuid
+from app.database import Base
+
+
+class OutboxMessage(Base):
+    """Outbound message written with the change that caused it and delivered by the outbox workers"""
+    __tablename__ = "outbox_messages"
+    __table_args__ = (
+        Index("ix_outbox_messages_due", "status", "next_attempt_at"),
+    )
+
+    id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
+    channel = Column(String(20), nullable=False, default="sms")  # sms
+    recipient = Column(String(255), nullable=False)
+    body = Column(Text, nullable=False)
+    status = Column(String(20), nullable=False, default="pending")  # pending, sending, sent, failed
+    attempts = Column(Integer, nullable=False, default=0)
+    next_attempt_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    last_error = Column(Text)
+    provider_message_id = Column(String(100))  # Twilio SID
+
+    # SMS log row updated once the message is delivered
+    sms_message_id = Column(String, ForeignKey("sms_messages.id"))
+
+    claim_id = Column(String(36))
+    claimed_at = Column(DateTime)
+    sent_at = Column(DateTime)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    sms_message = relationship("SMSMessage")
@@ -0,0 +1,25 @@
+from sqlalchemy import Column, String, DateTime, ForeignKey, Numeric, BigInteger
+from sqlalchemy.orm import relationship
+from datetime import datetime
+import uuid
+from app.database import Base
+
+
+class Payment(Base):
+    """One payment received against an invoice"""
+    __tablename__ = "payments"
+
+    id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
+    invoice_id = Column(String, ForeignKey("invoices.id"), nullable=False, index=True)
+    amount = Column(Numeric(10, 2), nullable=False)
+    payment_method = Column(String(50))  # card, ach, cash, check
+    reference = Column(String(255))  # Stripe payment intent, check number, ...
+    notes = Column(String)
+    received_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    recorded_by = Column(String, ForeignKey("users.id"))
+    change_seq = Column(BigInteger, index=True)  # accounting export high-water mark, see app.utils.sync
+    accounting_export_id = Column(String, ForeignKey("accounting_exports.id"))
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    # Relationships
+    invoice = relationship("Invoice", back_populates="payments")
@@ -0,0 +1,19 @@
+from sqlalchemy import Column, String, DateTime, ForeignKey, Text, Integer, JSON
+from datetime import datetime
+import uuid
+from app.database import Base
+
+
+class Segment(Base):
+    """Saved customer targeting rules for campaigns"""
+    __tablename__ = "segments"
+
+    id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
+    name = Column(String(255), nullable=False)
+    description = Column(Text)
+    filters = Column(JSON, nullable=False)  # SegmentFilters
+    estimated_count = Column(Integer)
+    estimated_at = Column(DateTime)
+    created_by = Column(String, ForeignKey("users.id"))
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
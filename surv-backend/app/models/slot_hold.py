@@ -0,0 +1,23 @@
+from sqlalchemy import Column, String, DateTime, Date, ForeignKey, Integer, UniqueConstraint, Index
+from datetime import datetime
+import uuid
+from app.database import Base
+
+
+class SlotHold(Base):
+    """Claim on one seat of an online booking slot"""
+    __tablename__ = "slot_holds"
+    __table_args__ = (
+        UniqueConstraint("slot_date", "time_slot", "seat", name="uq_slot_holds_seat"),
+        Index("ix_slot_holds_client", "client_key", "expires_at"),
+    )
+
+    id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
+    slot_date = Column(Date, nullable=False)
+    time_slot = Column(String(5), nullable=False)  # "08:00"
+    seat = Column(Integer, nullable=False, default=0)  # 0 .. SLOT_CAPACITY - 1
+    status = Column(String(20), nullable=False, default="held")  # held, confirmed
+    job_id = Column(String, ForeignKey("jobs.id"))
+    expires_at = Column(DateTime)  # null once confirmed
+    client_key = Column(String(64))  # address of the public client that took the hold
+    created_at = Column(DateTime, default=datetime.utcnow)
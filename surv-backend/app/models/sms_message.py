@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, DateTime, ForeignKey, Text, Boolean
+from sqlalchemy import Column, String, DateTime, ForeignKey, Text, Boolean, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime
 import uuid
@@ -7,6 +7,11 @@ from app.database import Base
 
 class SMSMessage(Base):
     __tablename__ = "sms_messages"
+    __table_args__ = (
+        Index("ix_sms_messages_thread", "counterpart_number", "received_at", "id"),
+        Index("ix_sms_messages_job", "job_id", "received_at", "id"),
+        Index("ix_sms_messages_received", "received_at"),
+    )
 
     id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
     
@@ -16,7 +21,10 @@ class SMSMessage(Base):
     to_number = Column(String(20), nullable=False)
     body = Column(Text)
     direction = Column(String(20))  # inbound, outbound
-    status = Column(String(20))  # received, sent, delivered, failed
+    counterpart_number = Column(String(20))  # normalized number on the other end; set on insert
+    status = Column(String(20))  # received, queued, sent, delivered, undelivered, failed
+    error_code = Column(String(10))  # Twilio error code for failed/undelivered
+    status_updated_at = Column(DateTime)  # last delivery status callback
     
     # Link to entities
     job_id = Column(String, ForeignKey("jobs.id"))
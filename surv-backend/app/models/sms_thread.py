@@ -0,0 +1,29 @@
+from sqlalchemy import Column, String, DateTime, ForeignKey, Integer, Index
+from datetime import datetime
+import uuid
+from app.database import Base
+
+
+class SMSThread(Base):
+    """Summary of the SMS conversation with one phone number, across all jobs"""
+    __tablename__ = "sms_threads"
+    __table_args__ = (
+        Index("ix_sms_threads_recent", "last_message_at", "id"),
+    )
+
+    id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
+    counterpart_number = Column(String(20), nullable=False, unique=True)  # normalized E.164
+
+    # Who the number belongs to, when known
+    customer_id = Column(String, ForeignKey("customers.id"))
+    employee_id = Column(String, ForeignKey("users.id"))
+
+    # Latest message
+    last_message_id = Column(String)
+    last_message_at = Column(DateTime, nullable=False)
+    last_message_preview = Column(String(160))
+    last_direction = Column(String(20))  # inbound, outbound
+
+    message_count = Column(Integer, nullable=False, default=0)
+    unread_count = Column(Integer, nullable=False, default=0)  # inbound messages since last read
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
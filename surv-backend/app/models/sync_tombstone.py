@@ -0,0 +1,15 @@
+from sqlalchemy import Column, String, DateTime, BigInteger, Integer
+from datetime import datetime
+from app.database import Base
+
+
+class SyncTombstone(Base):
+    """A row removed from a technician's synced data set, maintained by app.utils.sync"""
+    __tablename__ = "sync_tombstones"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    entity_type = Column(String(20), nullable=False)  # job, customer, note, file
+    entity_id = Column(String, nullable=False)
+    technician_id = Column(String, index=True)  # null: removed for everyone
+    change_seq = Column(BigInteger, nullable=False, index=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
@@ -0,0 +1,16 @@
+from sqlalchemy import Column, String, Date, DateTime, ForeignKey, Integer, JSON
+from datetime import datetime
+from app.database import Base
+
+
+class TechnicianDayLoad(Base):
+    """Precomputed workload of one technician on one day, maintained by app.utils.assignment"""
+    __tablename__ = "technician_day_loads"
+
+    technician_id = Column(String, ForeignKey("users.id"), primary_key=True)
+    load_date = Column(Date, primary_key=True)
+    job_count = Column(Integer, nullable=False, default=0)
+    booked_minutes = Column(Integer, nullable=False, default=0)
+    # [[start_minute or null, end_minute or null, latitude, longitude, job_id], ...] sorted by start
+    stops = Column(JSON, nullable=False, default=list)
+    refreshed_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -0,0 +1,19 @@
+from sqlalchemy import Column, String, DateTime, ForeignKey, Float
+from sqlalchemy.orm import relationship
+from datetime import datetime
+from app.database import Base
+
+
+class TechnicianLocation(Base):
+    """Latest known position per technician, written behind by app.utils.live_locations"""
+    __tablename__ = "technician_locations"
+
+    employee_id = Column(String, ForeignKey("users.id"), primary_key=True)
+    latitude = Column(Float, nullable=False)
+    longitude = Column(Float, nullable=False)
+    accuracy_m = Column(Float)
+    recorded_at = Column(DateTime, nullable=False)
+    updated_at = Column(DateTime, default=datetime.utcnow, index=True)
+
+    # Relationships
+    employee = relationship("User")
@@ -1,24 +1,36 @@
-from sqlalchemy import Column, String, DateTime, ForeignKey, Numeric
+from sqlalchemy import Column, String, DateTime, ForeignKey, Float, BigInteger, Index, UniqueConstraint, event
 from sqlalchemy.orm import relationship
 from datetime import datetime
 import uuid
 from app.database import Base
+from app.utils.geo import set_geo_cell
 
 
 class TimeEntry(Base):
     __tablename__ = "time_entries"
+    __table_args__ = (
+        Index("ix_time_entries_employee_time", "employee_id", "entry_time"),
+        Index("ix_time_entries_time", "entry_time"),
+        Index("ix_time_entries_geo_cell", "geo_cell", "entry_time"),
+        UniqueConstraint("employee_id", "client_entry_id", name="uq_time_entries_client_entry"),
+    )
 
     id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
     employee_id = Column(String, ForeignKey("users.id"), nullable=False)
     job_id = Column(String, ForeignKey("jobs.id"))
     entry_type = Column(String(50), nullable=False)  # clock_in, clock_out, break_start, break_end
     entry_time = Column(DateTime, nullable=False, default=datetime.utcnow)
-    latitude = Column(Numeric(10, 8))
-    longitude = Column(Numeric(11, 8))
+    latitude = Column(Float)
+    longitude = Column(Float)
+    geo_cell = Column(BigInteger)  # app.utils.geo.encode_cell(latitude, longitude)
     notes = Column(String)
+    client_entry_id = Column(String(64))  # idempotency key generated by the mobile app
     created_at = Column(DateTime, default=datetime.utcnow)
 
     # Relationships
     employee = relationship("User", foreign_keys=[employee_id])
     job = relationship("Job")
 
+
+event.listen(TimeEntry, "before_insert", set_geo_cell)
+event.listen(TimeEntry, "before_update", set_geo_cell)
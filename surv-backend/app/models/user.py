@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, Boolean, DateTime, Enum
+from sqlalchemy import Column, String, Boolean, DateTime, Enum, JSON
 from sqlalchemy.orm import relationship
 from datetime import datetime
 import uuid
@@ -24,6 +24,7 @@ class User(Base):
     phone = Column(String(20))
     role = Column(Enum(UserRole), nullable=False, default=UserRole.technician)
     is_active = Column(Boolean, default=True)
+    skills = Column(JSON)  # job types a technician handles; empty means any
     email_verified = Column(Boolean, default=False)
     last_login = Column(DateTime, nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow)
@@ -0,0 +1,11 @@
+from sqlalchemy import Column, String, Float
+from app.database import Base
+
+
+class ZipCentroid(Base):
+    """ZIP code centre points, loaded by `python -m app.utils.routing load-zips <file>`"""
+    __tablename__ = "zip_centroids"
+
+    zip_code = Column(String(5), primary_key=True)
+    latitude = Column(Float, nullable=False)
+    longitude = Column(Float, nullable=False)
@@ -1,10 +1,10 @@
-from app.schemas.user import UserCreate, UserLogin, UserResponse, Token
+from app.schemas.user import UserCreate, UserLogin, UserResponse, UserSummary, Token
 from app.schemas.customer import CustomerCreate, CustomerUpdate, CustomerResponse
 from app.schemas.job import JobCreate, JobUpdate, JobResponse
 from app.schemas.invoice import InvoiceCreate, InvoiceUpdate, InvoiceResponse
 
 __all__ = [
-    "UserCreate", "UserLogin", "UserResponse", "Token",
+    "UserCreate", "UserLogin", "UserResponse", "UserSummary", "Token",
     "CustomerCreate", "CustomerUpdate", "CustomerResponse",
     "JobCreate", "JobUpdate", "JobResponse",
     "InvoiceCreate", "InvoiceUpdate", "InvoiceResponse"
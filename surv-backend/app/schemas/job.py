@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import Optional
+from typing import List, Optional
 from datetime import datetime, date, time
 
 
@@ -44,3 +44,9 @@ class JobResponse(JobBase):
     class Config:
         from_attributes = True
 
+
+
+class JobAutoAssign(BaseModel):
+    job_ids: Optional[List[str]] = None  # default: every unassigned pending job from date_from
+    date_from: Optional[date] = None
+    date_to: Optional[date] = None
@@ -0,0 +1,41 @@
+from pydantic import BaseModel
+from typing import Optional, List
+from datetime import datetime, date
+from decimal import Decimal
+
+
+class SegmentFilters(BaseModel):
+    cities: List[str] = []
+    zip_codes: List[str] = []
+    job_types: List[str] = []  # customers who have had any job of these types
+    last_service_before: Optional[date] = None  # last completed job before this date
+    last_service_after: Optional[date] = None  # last completed job on or after this date
+    min_outstanding_balance: Optional[Decimal] = None
+    service_plan_status: Optional[str] = None  # active, paused, cancelled, none
+    has_email: bool = True
+
+
+class SegmentCreate(BaseModel):
+    name: str
+    description: Optional[str] = None
+    filters: SegmentFilters
+
+
+class SegmentUpdate(BaseModel):
+    name: Optional[str] = None
+    description: Optional[str] = None
+    filters: Optional[SegmentFilters] = None
+
+
+class SegmentResponse(BaseModel):
+    id: str
+    name: str
+    description: Optional[str] = None
+    filters: SegmentFilters
+    estimated_count: Optional[int] = None
+    estimated_at: Optional[datetime] = None
+    created_at: datetime
+    updated_at: datetime
+    
+    class Config:
+        from_attributes = True
@@ -1,22 +1,37 @@
-from pydantic import BaseModel
-from typing import Optional
+from pydantic import BaseModel, Field
+from typing import List, Optional
 from datetime import datetime
-from decimal import Decimal
 
 
 class TimeEntryBase(BaseModel):
     entry_type: str  # clock_in, clock_out, break_start, break_end
     entry_time: datetime
     job_id: Optional[str] = None
-    latitude: Optional[Decimal] = None
-    longitude: Optional[Decimal] = None
+    latitude: Optional[float] = Field(None, ge=-90, le=90)
+    longitude: Optional[float] = Field(None, ge=-180, le=180)
     notes: Optional[str] = None
+    client_entry_id: Optional[str] = Field(None, max_length=64)  # idempotency key for replayed punches
 
 
 class TimeEntryCreate(TimeEntryBase):
     pass
 
 
+class TimeEntryBatchItem(TimeEntryCreate):
+    client_entry_id: str = Field(..., min_length=1, max_length=64)
+
+
+class TimeEntryBatch(BaseModel):
+    entries: List[TimeEntryBatchItem] = Field(..., max_length=500)
+
+
+class TimeEntryBatchResult(BaseModel):
+    client_entry_id: str
+    status: str  # created, duplicate, rejected
+    id: Optional[str] = None
+    error: Optional[str] = None
+
+
 class TimeEntryResponse(TimeEntryBase):
     id: str
     employee_id: str
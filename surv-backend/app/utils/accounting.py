@@ -0,0 +1,353 @@
+import csv
+import hashlib
+import io
+import tempfile
+import zipfile
+from datetime import datetime, timedelta
+from decimal import Decimal
+from typing import BinaryIO, Dict, List
+from sqlalchemy import bindparam, func, or_, update
+from sqlalchemy.orm import Session
+from app.config import settings
+from app.database import SessionLocal
+from app.models.accounting_export import AccountingExport
+from app.models.customer import Customer
+from app.models.invoice import Invoice
+from app.models.invoice_line_item import InvoiceLineItem
+from app.models.payment import Payment
+from app.utils.sync import current_change_seq
+
+# Invoices QuickBooks should not see
+UNEXPORTED_STATUSES = ["draft", "void"]
+
+# Invoices or payments read, written and marked per transaction
+BATCH_SIZE = 500
+
+# Voided or modified invoice numbers kept on an export record
+MAX_REPORTED = 1000
+
+ZERO = Decimal("0.00")
+
+
+def _money(value) -> str:
+    return f"{Decimal(value or 0):.2f}"
+
+
+def _qb_date(value) -> str:
+    return value.strftime("%m/%d/%Y") if value else ""
+
+
+def _invoice_digest(invoice, lines: List[InvoiceLineItem]) -> str:
+    """Fingerprint of what an export sends for an invoice; payments do not change it"""
+    fields = [invoice.invoice_number, invoice.customer_id, _qb_date(invoice.issue_date), _qb_date(invoice.due_date),
+              invoice.notes or "", _money(invoice.subtotal), _money(invoice.tax_amount),
+              _money(invoice.discount_amount), _money(invoice.total_amount)]
+    for line in lines:
+        fields += [line.item_name, line.description or "", _money(line.quantity), _money(line.unit_price),
+                   _money(line.total_price)]
+    return hashlib.sha256("\x1f".join(str(field) for field in fields).encode()).hexdigest()
+
+
+def _customer_name(first_name, last_name, company_name) -> str:
+    return company_name or f"{first_name or ''} {last_name or ''}".strip()
+
+
+class IIFWriter:
+    """QuickBooks Desktop IIF: one balanced TRNS/SPL block per invoice and payment"""
+    suffix = "iif"
+
+    def __init__(self, output: BinaryIO):
+        self.file = io.TextIOWrapper(output, encoding="utf-8", newline="")
+        self._row("!TRNS", "TRNSID", "TRNSTYPE", "DATE", "ACCNT", "NAME", "AMOUNT", "DOCNUM", "MEMO", "DUEDATE")
+        self._row("!SPL", "SPLID", "TRNSTYPE", "DATE", "ACCNT", "NAME", "AMOUNT", "DOCNUM", "MEMO", "QNTY", "PRICE", "INVITEM")
+        self._row("!ENDTRNS")
+
+    def _row(self, *values):
+        # IIF is tab separated with no quoting, so fields cannot carry tabs or line breaks
+        self.file.write("\t".join(" ".join(str(value).split()) for value in values) + "\r\n")
+
+    def invoice(self, invoice, name: str, lines: List[InvoiceLineItem]):
+        day = _qb_date(invoice.issue_date)
+        number = invoice.invoice_number
+        self._row("TRNS", "", "INVOICE", day, settings.QB_AR_ACCOUNT, name, _money(invoice.total_amount),
+                  number, invoice.notes or "", _qb_date(invoice.due_date))
+        for line in lines:
+            self._row("SPL", "", "INVOICE", day, settings.QB_INCOME_ACCOUNT, name, _money(-line.total_price),
+                      number, line.description or "", _money(-line.quantity), _money(line.unit_price), line.item_name)
+        # Keep the transaction balanced when line items do not add up to the subtotal
+        remainder = Decimal(invoice.subtotal or 0) - sum((Decimal(line.total_price) for line in lines), ZERO)
+        if remainder or not lines:
+            self._row("SPL", "", "INVOICE", day, settings.QB_INCOME_ACCOUNT, name, _money(-remainder),
+                      number, "", "", "", "")
+        if invoice.tax_amount:
+            self._row("SPL", "", "INVOICE", day, settings.QB_TAX_ACCOUNT, name, _money(-invoice.tax_amount),
+                      number, "Sales tax", "", "", "")
+        if invoice.discount_amount:
+            self._row("SPL", "", "INVOICE", day, settings.QB_DISCOUNT_ACCOUNT, name, _money(invoice.discount_amount),
+                      number, "Discount", "", "", "")
+        self._row("ENDTRNS")
+
+    def start_payments(self):
+        pass
+
+    def payment(self, payment, invoice_number: str, name: str):
+        day = _qb_date(payment.received_at)
+        self._row("TRNS", "", "PAYMENT", day, settings.QB_DEPOSIT_ACCOUNT, name, _money(payment.amount),
+                  payment.reference or invoice_number, payment.notes or payment.payment_method or "", "")
+        self._row("SPL", "", "PAYMENT", day, settings.QB_AR_ACCOUNT, name, _money(-payment.amount),
+                  invoice_number, "", "", "", "")
+        self._row("ENDTRNS")
+
+    def close(self):
+        self.file.flush()
+        self.file.detach()
+
+
+class CSVWriter:
+    """QuickBooks Online import CSVs: invoices.csv (one row per line) and payments.csv, zipped"""
+    suffix = "zip"
+
+    def __init__(self, output: BinaryIO):
+        self.archive = zipfile.ZipFile(output, "w", compression=zipfile.ZIP_DEFLATED)
+        self._open("invoices.csv", [
+            "InvoiceNo", "Customer", "InvoiceDate", "DueDate", "Memo", "Item(Product/Service)",
+            "ItemDescription", "ItemQuantity", "ItemRate", "ItemAmount", "TaxAmount", "DiscountAmount"
+        ])
+
+    def _open(self, name: str, header: List[str]):
+        self.entry = io.TextIOWrapper(self.archive.open(name, "w", force_zip64=True), encoding="utf-8", newline="")
+        self.writer = csv.writer(self.entry)
+        self.writer.writerow(header)
+
+    def invoice(self, invoice, name: str, lines: List[InvoiceLineItem]):
+        rows = [(line.item_name, line.description or "", _money(line.quantity), _money(line.unit_price),
+                 _money(line.total_price)) for line in lines]
+        remainder = Decimal(invoice.subtotal or 0) - sum((Decimal(line.total_price) for line in lines), ZERO)
+        if remainder or not lines:
+            rows.append((settings.QB_INCOME_ACCOUNT, "", "1.00", _money(remainder), _money(remainder)))
+        for index, row in enumerate(rows):
+            # Invoice-level tax and discount go on the first line only
+            first = index == 0
+            self.writer.writerow([
+                invoice.invoice_number, name, _qb_date(invoice.issue_date), _qb_date(invoice.due_date),
+                (invoice.notes or "") if first else "", *row,
+                _money(invoice.tax_amount) if first else "", _money(invoice.discount_amount) if first else ""
+            ])
+
+    def start_payments(self):
+        self.entry.close()
+        self._open("payments.csv", [
+            "PaymentDate", "Customer", "InvoiceNo", "Amount", "PaymentMethod", "ReferenceNo", "Memo", "DepositTo"
+        ])
+
+    def payment(self, payment, invoice_number: str, name: str):
+        self.writer.writerow([
+            _qb_date(payment.received_at), name, invoice_number, _money(payment.amount),
+            payment.payment_method or "", payment.reference or "", payment.notes or "", settings.QB_DEPOSIT_ACCOUNT
+        ])
+
+    def close(self):
+        self.entry.close()
+        self.archive.close()
+
+
+WRITERS = {"iif": IIFWriter, "csv": CSVWriter}
+
+
+def release_export(db: Session, export: AccountingExport):
+    """Hand a failed run's invoices and payments back: to the next export, or to the export a re-export copies"""
+    for model in (Invoice, Payment):
+        db.execute(
+            update(model).where(model.accounting_export_id == export.id).values(
+                accounting_export_id=export.source_export_id
+            )
+        )
+
+
+def release_stale_exports(db: Session):
+    """Fail runs that stopped reporting progress (e.g. the process was restarted mid-run)"""
+    cutoff = datetime.utcnow() - timedelta(minutes=settings.ACCOUNTING_EXPORT_STALE_MINUTES)
+    stale = db.query(AccountingExport).filter(
+        AccountingExport.status.in_(["pending", "running"]),
+        func.coalesce(AccountingExport.started_at, AccountingExport.created_at) < cutoff
+    ).all()
+    for export in stale:
+        release_export(db, export)
+        export.status = "failed"
+        export.error = "Export stopped before finishing"
+    db.commit()
+
+
+def _line_items(db: Session, invoice_ids: List[str]) -> Dict[str, List[InvoiceLineItem]]:
+    lines: Dict[str, List[InvoiceLineItem]] = {}
+    for line in db.query(InvoiceLineItem).filter(InvoiceLineItem.invoice_id.in_(invoice_ids)).order_by(
+        InvoiceLineItem.invoice_id, InvoiceLineItem.sort_order
+    ):
+        lines.setdefault(line.invoice_id, []).append(line)
+    return lines
+
+
+# Core update: marking an invoice exported is not itself a change to export
+_mark_invoice = update(Invoice.__table__).where(Invoice.__table__.c.id == bindparam("invoice_id"))
+
+
+def _export_invoices(db: Session, export: AccountingExport, writer):
+    scope = [Invoice.status.notin_(UNEXPORTED_STATUSES)]
+    if export.kind == "reexport":
+        scope.append(Invoice.accounting_export_id == export.source_export_id)
+    else:
+        scope.append(Invoice.accounting_export_id.is_(None))
+    if export.kind == "incremental":
+        scope += [Invoice.change_seq > export.seq_from, Invoice.change_seq <= export.seq_to]
+    elif export.kind == "backfill":
+        scope += [Invoice.issue_date >= export.date_from, Invoice.issue_date <= export.date_to]
+
+    while True:
+        # Marked rows drop out of scope, so each batch is simply the first unexported ones
+        rows = db.query(Invoice, Customer.first_name, Customer.last_name, Customer.company_name).join(
+            Customer, Customer.id == Invoice.customer_id
+        ).filter(*scope).order_by(Invoice.id).limit(BATCH_SIZE).all()
+        if not rows:
+            break
+        lines = _line_items(db, [invoice.id for invoice, *_ in rows])
+
+        marks = []
+        for invoice, *name in rows:
+            invoice_lines = lines.get(invoice.id, [])
+            writer.invoice(invoice, _customer_name(*name), invoice_lines)
+            export.line_count += len(invoice_lines)
+            marks.append({"invoice_id": invoice.id, "digest": _invoice_digest(invoice, invoice_lines)})
+        export.invoice_count += len(rows)
+        db.execute(
+            _mark_invoice.values(accounting_export_id=export.id, accounting_digest=bindparam("digest")), marks
+        )
+        db.commit()
+
+
+def _modified_invoices(db: Session, export: AccountingExport) -> List[str]:
+    """
+    Invoices exported by an earlier run whose exported fields changed within this
+    run's change_seq range. Their stored digest is updated so each edit is reported once.
+    """
+    scope = [
+        Invoice.change_seq > export.seq_from,
+        Invoice.change_seq <= export.seq_to,
+        Invoice.accounting_export_id.isnot(None),
+        Invoice.accounting_export_id != export.id,
+        Invoice.status != "void"
+    ]
+    modified = []
+    last_id = ""
+    while True:
+        invoices = db.query(Invoice).filter(*scope, Invoice.id > last_id).order_by(Invoice.id).limit(BATCH_SIZE).all()
+        if not invoices:
+            break
+        last_id = invoices[-1].id
+        lines = _line_items(db, [invoice.id for invoice in invoices])
+
+        changes = []
+        for invoice in invoices:
+            digest = _invoice_digest(invoice, lines.get(invoice.id, []))
+            if digest == invoice.accounting_digest:
+                continue
+            # Invoices exported before digests were kept only get one recorded
+            if invoice.accounting_digest:
+                modified.append(invoice.invoice_number)
+            changes.append({"invoice_id": invoice.id, "digest": digest})
+        if changes:
+            db.execute(_mark_invoice.values(accounting_digest=bindparam("digest")), changes)
+    return sorted(modified)[:MAX_REPORTED]
+
+
+def _export_payments(db: Session, export: AccountingExport, writer):
+    writer.start_payments()
+    in_this_run = Payment.invoice_id.in_(
+        db.query(Invoice.id).filter(Invoice.accounting_export_id == export.id)
+    )
+    if export.kind == "reexport":
+        scope = [Payment.accounting_export_id == export.source_export_id]
+    else:
+        if export.kind == "incremental":
+            selected = [Payment.change_seq <= export.seq_to, or_(Payment.change_seq > export.seq_from, in_this_run)]
+        else:
+            range_start = datetime.combine(export.date_from, datetime.min.time())
+            range_end = datetime.combine(export.date_to, datetime.max.time())
+            selected = [or_(Payment.received_at.between(range_start, range_end), in_this_run)]
+        # Payments wait until QuickBooks has the invoice they apply to
+        scope = [Payment.accounting_export_id.is_(None), Invoice.accounting_export_id.isnot(None), *selected]
+
+    while True:
+        rows = db.query(
+            Payment, Invoice.invoice_number, Customer.first_name, Customer.last_name, Customer.company_name
+        ).join(Invoice, Invoice.id == Payment.invoice_id).join(
+            Customer, Customer.id == Invoice.customer_id
+        ).filter(*scope).order_by(Payment.id).limit(BATCH_SIZE).all()
+        if not rows:
+            break
+        for payment, invoice_number, *name in rows:
+            writer.payment(payment, invoice_number, _customer_name(*name))
+        export.payment_count += len(rows)
+        db.execute(
+            update(Payment).where(Payment.id.in_([payment.id for payment, *_ in rows])).values(accounting_export_id=export.id)
+        )
+        db.commit()
+
+
+def run_export(export_id: str):
+    """Background job: write one export file and mark what it contains as exported"""
+    db = SessionLocal()
+    export = db.query(AccountingExport).filter(AccountingExport.id == export_id).first()
+    if not export or export.status != "pending":
+        db.close()
+        return
+
+    output = tempfile.TemporaryFile()
+    writer = None
+    try:
+        export.status = "running"
+        export.started_at = datetime.utcnow()
+        if export.kind == "incremental":
+            # High-water mark: where the last completed incremental run stopped
+            export.seq_from = db.query(func.max(AccountingExport.seq_to)).filter(
+                AccountingExport.kind == "incremental",
+                AccountingExport.status == "completed"
+            ).scalar() or 0
+            export.seq_to = current_change_seq(db)
+        export.invoice_count = export.line_count = export.payment_count = 0
+        db.commit()
+
+        writer = WRITERS[export.format](output)
+        _export_invoices(db, export, writer)
+        _export_payments(db, export, writer)
+        writer.close()
+        writer = None
+
+        if export.kind == "incremental":
+            # Already in QuickBooks, so the bookkeeper voids or edits them there by hand
+            voided = db.query(Invoice.invoice_number).filter(
+                Invoice.change_seq > export.seq_from,
+                Invoice.change_seq <= export.seq_to,
+                Invoice.status == "void",
+                Invoice.accounting_export_id.isnot(None)
+            ).order_by(Invoice.invoice_number).limit(MAX_REPORTED).all()
+            export.voided_invoices = [number for number, in voided]
+            export.modified_invoices = _modified_invoices(db, export)
+        # Stored with the rows it marks: local disk is per dyno and lost on restart
+        output.seek(0)
+        export.content = output.read()
+        export.status = "completed"
+        export.completed_at = datetime.utcnow()
+        db.commit()
+    except Exception as e:
+        print(f"[ACCOUNTING EXPORT ERROR] {export_id}: {e}")
+        db.rollback()
+        if writer:
+            writer.close()
+        release_export(db, export)
+        db.query(AccountingExport).filter(AccountingExport.id == export_id).update(
+            {"status": "failed", "error": str(e), "completed_at": datetime.utcnow()}, synchronize_session=False
+        )
+        db.commit()
+    finally:
+        output.close()
+        db.close()
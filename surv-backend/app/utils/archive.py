@@ -0,0 +1,135 @@
+from datetime import date, datetime
+from typing import Dict, List, Optional
+from sqlalchemy import and_, delete, insert, select, union_all, update
+from sqlalchemy.orm import Session
+from app.config import settings
+from app.database import SessionLocal
+from app.models.archive_segment import ArchiveSegment, job_timeline_archive, sms_messages_archive, time_entries_archive
+from app.models.job_timeline import JobTimeline
+from app.models.outbox_message import OutboxMessage
+from app.models.sms_message import SMSMessage
+from app.models.time_entry import TimeEntry
+
+# Append-only tables, their archive table and the timestamp that decides which month a row belongs to
+ARCHIVED_TABLES = {
+    "time_entries": (TimeEntry, time_entries_archive, "entry_time"),
+    "sms_messages": (SMSMessage, sms_messages_archive, "received_at"),
+    "job_timeline": (JobTimeline, job_timeline_archive, "event_time")
+}
+
+# Rows per segment; each chunk is copied, deleted and recorded in its own transaction
+CHUNK_SIZE = 50000
+
+
+def month_start(value) -> date:
+    return date(value.year, value.month, 1)
+
+
+def add_months(month: date, months: int) -> date:
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def _archive_chunk(db: Session, table_name: str, month: date) -> int:
+    """Move up to CHUNK_SIZE rows of one month into the archive table"""
+    model, archive, time_name = ARCHIVED_TABLES[table_name]
+    table = model.__table__
+    time_column = table.c[time_name]
+    in_month = and_(
+        time_column >= datetime.combine(month, datetime.min.time()),
+        time_column < datetime.combine(add_months(month, 1), datetime.min.time())
+    )
+
+    rows = db.execute(
+        select(table.c.id, time_column).where(in_month).order_by(time_column, table.c.id).limit(CHUNK_SIZE)
+    ).all()
+    if not rows:
+        return 0
+
+    # Copy and delete commit together, so a row is always in exactly one of the two tables
+    ids = [row_id for row_id, _ in rows]
+    names = [column.name for column in archive.columns]
+    db.execute(insert(archive).from_select(names, select(*[table.c[name] for name in names]).where(table.c.id.in_(ids))))
+    if table_name == "sms_messages":
+        db.execute(update(OutboxMessage).where(OutboxMessage.sms_message_id.in_(ids)).values(sms_message_id=None))
+    db.execute(delete(table).where(table.c.id.in_(ids)))
+    db.add(ArchiveSegment(
+        table_name=table_name,
+        month=month,
+        row_count=len(rows),
+        min_time=rows[0][1],
+        max_time=rows[-1][1]
+    ))
+    db.commit()
+    return len(rows)
+
+
+def run_retention(months: Optional[int] = None) -> Dict[str, int]:
+    """Archive every row older than `months` full months (default ARCHIVE_RETENTION_MONTHS)"""
+    months = months if months is not None else settings.ARCHIVE_RETENTION_MONTHS
+    cutoff = add_months(month_start(date.today()), -months)
+    archived = {}
+
+    db = SessionLocal()
+    try:
+        for table_name, (model, _, time_name) in ARCHIVED_TABLES.items():
+            time_column = model.__table__.c[time_name]
+            archived[table_name] = 0
+            while True:
+                oldest = db.execute(select(time_column).order_by(time_column).limit(1)).scalar()
+                if oldest is None or month_start(oldest) >= cutoff:
+                    break
+                moved = _archive_chunk(db, table_name, month_start(oldest))
+                if not moved:
+                    break
+                archived[table_name] += moved
+    finally:
+        db.close()
+    return archived
+
+
+def archive_covers(db: Session, table_name: str, start: datetime, end: datetime) -> bool:
+    """Whether any archived rows fall in the range (one indexed lookup)"""
+    return db.query(ArchiveSegment.id).filter(
+        ArchiveSegment.table_name == table_name,
+        ArchiveSegment.month <= month_start(end),
+        ArchiveSegment.max_time >= start,
+        ArchiveSegment.min_time <= end
+    ).first() is not None
+
+
+def read_archive(
+    db: Session,
+    table_name: str,
+    start: datetime,
+    end: datetime,
+    **equals
+) -> List[dict]:
+    """
+    Archived rows of `table_name` with their timestamp in [start, end] and
+    matching every column=value in `equals`.
+    """
+    _, archive, time_name = ARCHIVED_TABLES[table_name]
+    time_column = archive.c[time_name]
+    query = select(archive).where(
+        time_column >= start,
+        time_column <= end,
+        *[archive.c[key] == value for key, value in equals.items()]
+    ).order_by(time_column)
+    return [dict(row) for row in db.execute(query).mappings()]
+
+
+def with_archive(table_name: str, **equals):
+    """Hot and archived rows of `table_name` matching every column=value in `equals`, as one selectable"""
+    model, archive, _ = ARCHIVED_TABLES[table_name]
+    return union_all(*[
+        select(*[table.c[column.name] for column in archive.columns]).where(
+            *[table.c[key] == value for key, value in equals.items()]
+        )
+        for table in (model.__table__, archive)
+    ])
+
+
+if __name__ == "__main__":
+    # For external schedulers: python -m app.utils.archive
+    print(run_retention())
@@ -0,0 +1,338 @@
+import threading
+import time
+from dataclasses import dataclass
+from datetime import date, datetime
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+from sqlalchemy import event, func, inspect, select, tuple_
+from sqlalchemy.orm import Session
+from app.config import settings
+from app.database import SessionLocal
+from app.models.customer import Customer
+from app.models.job import Job
+from app.models.job_state import JobState
+from app.models.technician_day_load import TechnicianDayLoad
+from app.models.user import User, UserRole
+from app.models.zip_centroid import ZipCentroid
+from app.utils.breadcrumbs import METERS_PER_MILE
+from app.utils.geo import haversine_m
+from app.utils.sql import dialect_insert
+
+# Jobs that take up a technician's day
+LOADED_STATUSES_EXCLUDED = ["cancelled"]
+
+_WATCHED_FIELDS = ("assigned_to", "scheduled_date", "scheduled_start_time", "estimated_duration", "status", "customer_id")
+_WATCHED_CUSTOMER_FIELDS = ("latitude", "longitude", "zip_code")
+
+# How long per-technician duration averages are reused
+HISTORY_TTL_SECONDS = 600
+
+_history: Optional[Tuple[float, Dict[Tuple[str, str], Tuple[float, int]]]] = None
+_history_lock = threading.Lock()
+
+
+def _site_columns():
+    """Job site coordinates: the customer's own, else their ZIP centroid"""
+    return (
+        func.coalesce(Customer.latitude, ZipCentroid.latitude),
+        func.coalesce(Customer.longitude, ZipCentroid.longitude)
+    )
+
+
+def _with_sites(query):
+    return query.join(Customer, Customer.id == Job.customer_id).outerjoin(
+        ZipCentroid, ZipCentroid.zip_code == func.substr(Customer.zip_code, 1, 5)
+    )
+
+
+def _minute(value) -> Optional[int]:
+    return value.hour * 60 + value.minute if value else None
+
+
+def compute_day_loads(conn, pairs: Iterable[Tuple[str, date]]) -> Dict[Tuple[str, date], dict]:
+    """Workload rows for (technician_id, date) pairs straight from the jobs table"""
+    loads = {pair: {"job_count": 0, "booked_minutes": 0, "stops": []} for pair in pairs}
+    if not loads:
+        return loads
+    latitude, longitude = _site_columns()
+    rows = conn.execute(
+        _with_sites(select(
+            Job.id, Job.assigned_to, Job.scheduled_date, Job.scheduled_start_time,
+            Job.estimated_duration, latitude, longitude
+        ).select_from(Job)).where(
+            tuple_(Job.assigned_to, Job.scheduled_date).in_(list(loads)),
+            Job.status.notin_(LOADED_STATUSES_EXCLUDED)
+        )
+    )
+    for job_id, technician_id, scheduled_date, start_time, duration, lat, lng in rows:
+        load = loads[(technician_id, scheduled_date)]
+        duration = duration or settings.ROUTE_DEFAULT_DURATION_MINUTES
+        start = _minute(start_time)
+        load["job_count"] += 1
+        load["booked_minutes"] += duration
+        load["stops"].append([start, start + duration if start is not None else None, lat, lng, job_id])
+    for load in loads.values():
+        # Timed stops in order, untimed ones after them
+        load["stops"].sort(key=lambda stop: (stop[0] is None, stop[0] or 0))
+    return loads
+
+
+def refresh_day_loads(conn, pairs: Iterable[Tuple[str, date]]):
+    """Recompute the load rows for the given technician-days"""
+    loads = compute_day_loads(conn, set(pairs))
+    if not loads:
+        return
+    now = datetime.utcnow()
+    stmt = dialect_insert(conn, TechnicianDayLoad.__table__)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["technician_id", "load_date"],
+        set_={
+            "job_count": stmt.excluded.job_count,
+            "booked_minutes": stmt.excluded.booked_minutes,
+            "stops": stmt.excluded.stops,
+            "refreshed_at": now
+        }
+    )
+    conn.execute(stmt, [
+        {"technician_id": technician_id, "load_date": load_date, "refreshed_at": now, **load}
+        for (technician_id, load_date), load in loads.items()
+    ])
+
+
+def get_day_loads(db: Session, load_date: date, technician_ids: List[str]) -> Dict[str, dict]:
+    """
+    Load rows for one day. Technician-days without a row yet are computed from
+    the jobs table but not stored, so read paths never write or commit; job
+    writes create the rows.
+    """
+    rows = db.query(
+        TechnicianDayLoad.technician_id, TechnicianDayLoad.job_count,
+        TechnicianDayLoad.booked_minutes, TechnicianDayLoad.stops
+    ).filter(
+        TechnicianDayLoad.load_date == load_date,
+        TechnicianDayLoad.technician_id.in_(technician_ids)
+    ).all()
+    loads = {
+        technician_id: {"job_count": job_count, "booked_minutes": booked_minutes, "stops": stops}
+        for technician_id, job_count, booked_minutes, stops in rows
+    }
+
+    missing = [(technician_id, load_date) for technician_id in technician_ids if technician_id not in loads]
+    if missing:
+        computed = compute_day_loads(db.connection(), missing)
+        loads.update({technician_id: load for (technician_id, _), load in computed.items()})
+    return loads
+
+
+def duration_history(db: Session) -> Dict[Tuple[str, str], Tuple[float, int]]:
+    """(technician_id, job_type) -> (average on-site minutes, completed jobs), cached briefly"""
+    global _history
+    now = time.monotonic()
+    with _history_lock:
+        if _history and now - _history[0] < HISTORY_TTL_SECONDS:
+            return _history[1]
+
+    rows = db.query(
+        Job.assigned_to, Job.job_type, func.avg(JobState.on_site_seconds), func.count(Job.id)
+    ).join(JobState, JobState.job_id == Job.id).filter(
+        Job.assigned_to.isnot(None),
+        Job.job_type.isnot(None),
+        JobState.on_site_seconds > 0
+    ).group_by(Job.assigned_to, Job.job_type).all()
+    history = {
+        (technician_id, job_type): (float(seconds) / 60, count)
+        for technician_id, job_type, seconds, count in rows
+    }
+    with _history_lock:
+        _history = (now, history)
+    return history
+
+
+@dataclass
+class JobRequest:
+    job_id: str
+    job_type: Optional[str]
+    scheduled_date: date
+    latitude: Optional[float]
+    longitude: Optional[float]
+    start: Optional[int]  # minutes after midnight
+    duration: int  # minutes
+    priority: str = "normal"
+
+
+def load_job_requests(db: Session, job_ids: List[str]) -> List[JobRequest]:
+    latitude, longitude = _site_columns()
+    rows = _with_sites(db.query(
+        Job.id, Job.job_type, Job.scheduled_date, latitude, longitude,
+        Job.scheduled_start_time, Job.estimated_duration, Job.priority
+    )).filter(Job.id.in_(job_ids)).all()
+    return [
+        JobRequest(job_id, job_type, scheduled_date, lat, lng, _minute(start_time),
+                   duration or settings.ROUTE_DEFAULT_DURATION_MINUTES, priority or "normal")
+        for job_id, job_type, scheduled_date, lat, lng, start_time, duration, priority in rows
+    ]
+
+
+class AssignmentBoard:
+    """
+    Every active technician's load for one day, held in memory so that ranking
+    a job is a pass over technicians with no queries. Lower scores are better:
+    travel minutes from the previous stop, plus the expected on-site minutes
+    (the technician's own average for the job type when known), plus
+    ASSIGN_LOAD_WEIGHT per hour already booked.
+    """
+
+    def __init__(self, db: Session, day: date):
+        self.day = day
+        technicians = db.query(User.id, User.first_name, User.last_name, User.skills).filter(
+            User.role == UserRole.technician,
+            User.is_active == True
+        ).all()
+        self.names = {technician_id: f"{first} {last}" for technician_id, first, last, _ in technicians}
+        self.skills = {technician_id: set(skills or ()) for technician_id, _, _, skills in technicians}
+        loads = get_day_loads(db, day, list(self.names)) if technicians else {}
+        self.booked = {technician_id: load["booked_minutes"] for technician_id, load in loads.items()}
+        self.job_counts = {technician_id: load["job_count"] for technician_id, load in loads.items()}
+        self.stops = {technician_id: [list(stop) for stop in load["stops"]] for technician_id, load in loads.items()}
+        self.history = duration_history(db)
+        self.minutes_per_meter = settings.ROUTE_CIRCUITY_FACTOR * 60 / (settings.ROUTE_AVERAGE_SPEED_MPH * METERS_PER_MILE)
+
+    def _travel(self, technician_id: str, job: JobRequest) -> float:
+        stops = [stop for stop in self.stops.get(technician_id, ()) if stop[2] is not None]
+        if job.latitude is None or not stops:
+            return settings.ASSIGN_EMPTY_DAY_TRAVEL_MINUTES
+        if job.start is not None:
+            # The last timed stop starting before this job (stops are sorted by start)
+            previous = None
+            for stop in stops:
+                if stop[0] is not None and stop[0] <= job.start:
+                    previous = stop
+            if previous:
+                return haversine_m(previous[2], previous[3], job.latitude, job.longitude) * self.minutes_per_meter
+        # Untimed jobs (or none earlier): closest stop of the day
+        return min(haversine_m(stop[2], stop[3], job.latitude, job.longitude) for stop in stops) * self.minutes_per_meter
+
+    def expected_duration(self, technician_id: str, job: JobRequest) -> float:
+        """The technician's own average for the job type when known, else the job's estimate"""
+        average, count = self.history.get((technician_id, job.job_type), (None, 0))
+        return average if count >= settings.ASSIGN_MIN_HISTORY_JOBS else job.duration
+
+    def rank(self, job: JobRequest) -> List[dict]:
+        """Eligible technicians for a job, best first"""
+        candidates = []
+        for technician_id, name in self.names.items():
+            skills = self.skills[technician_id]
+            if skills and job.job_type and job.job_type not in skills:
+                continue
+
+            duration = self.expected_duration(technician_id, job)
+            booked = self.booked.get(technician_id, 0)
+            if booked + duration > settings.ASSIGN_DAY_CAPACITY_MINUTES:
+                continue
+            if job.start is not None and any(
+                start is not None and start < job.start + duration and job.start < end
+                for start, end, _, _, _ in self.stops.get(technician_id, ())
+            ):
+                continue
+
+            travel = self._travel(technician_id, job)
+            candidates.append({
+                "technician_id": technician_id,
+                "name": name,
+                "score": round(travel + duration + settings.ASSIGN_LOAD_WEIGHT * booked / 60, 1),
+                "travel_minutes": round(travel, 1),
+                "expected_duration_minutes": round(duration),
+                "booked_minutes": booked,
+                "jobs_that_day": self.job_counts.get(technician_id, 0),
+                "skill_match": job.job_type in skills if skills and job.job_type else None
+            })
+        candidates.sort(key=lambda candidate: candidate["score"])
+        return candidates
+
+    def assign(self, technician_id: str, job: JobRequest):
+        """Count a job against a technician so later rankings in this batch see it"""
+        duration = self.expected_duration(technician_id, job)
+        self.booked[technician_id] = self.booked.get(technician_id, 0) + duration
+        self.job_counts[technician_id] = self.job_counts.get(technician_id, 0) + 1
+        stops = self.stops.setdefault(technician_id, [])
+        stops.append([job.start, job.start + duration if job.start is not None else None,
+                      job.latitude, job.longitude, job.job_id])
+        stops.sort(key=lambda stop: (stop[0] is None, stop[0] or 0))
+
+
+# Higher-priority jobs pick their technician first in a batch
+PRIORITY_ORDER = {"urgent": 0, "high": 1, "normal": 2, "low": 3}
+
+
+def auto_assign_jobs(db: Session, jobs: List[Job]) -> List[dict]:
+    """
+    Give each job its best-ranked technician, day by day, updating the in-memory
+    board after every pick. The caller commits.
+    """
+    requests = {request.job_id: request for request in load_job_requests(db, [job.id for job in jobs])}
+    by_day: Dict[date, List[Job]] = {}
+    for job in jobs:
+        by_day.setdefault(job.scheduled_date, []).append(job)
+
+    results = []
+    for day, day_jobs in sorted(by_day.items()):
+        board = AssignmentBoard(db, day)
+        day_jobs.sort(key=lambda job: (
+            PRIORITY_ORDER.get(job.priority, 2),
+            requests[job.id].start is None,
+            requests[job.id].start or 0
+        ))
+        for job in day_jobs:
+            request = requests[job.id]
+            ranking = board.rank(request)
+            if not ranking:
+                results.append({"job_id": job.id, "job_number": job.job_number, "assigned_to": None,
+                                "reason": "No technician is available"})
+                continue
+            best = ranking[0]
+            job.assigned_to = best["technician_id"]
+            board.assign(best["technician_id"], request)
+            results.append({"job_id": job.id, "job_number": job.job_number, "assigned_to": best["technician_id"],
+                            "technician_name": best["name"], "score": best["score"]})
+    return results
+
+
+@event.listens_for(SessionLocal, "before_flush")
+def _collect_changed_loads(session, flush_context, instances):
+    """Remember which technician-days are touched by job writes and job-site moves"""
+    pairs: Set[Tuple[str, date]] = session.info.setdefault("load_pairs", set())
+    customers: Set[str] = session.info.setdefault("load_customers", set())
+
+    for obj in list(session.new) + list(session.deleted):
+        if isinstance(obj, Job):
+            pairs.add((obj.assigned_to, obj.scheduled_date))
+
+    for obj in session.dirty:
+        if isinstance(obj, Customer):
+            attrs = inspect(obj).attrs
+            if any(attrs[field].history.has_changes() for field in _WATCHED_CUSTOMER_FIELDS):
+                customers.add(obj.id)
+        if not isinstance(obj, Job):
+            continue
+        attrs = inspect(obj).attrs
+        if any(attrs[field].history.has_changes() for field in _WATCHED_FIELDS):
+            technicians = {obj.assigned_to, *attrs.assigned_to.history.deleted}
+            dates = {obj.scheduled_date, *attrs.scheduled_date.history.deleted}
+            pairs.update((technician_id, day) for technician_id in technicians for day in dates)
+
+
+@event.listens_for(SessionLocal, "after_flush")
+def _refresh_changed_loads(session, flush_context):
+    """Refresh load rows in the same transaction as the write"""
+    pairs = session.info.pop("load_pairs", set())
+    customers = session.info.pop("load_customers", set())
+    conn = session.connection()
+    if customers:
+        pairs.update(conn.execute(
+            select(Job.assigned_to, Job.scheduled_date).where(
+                Job.customer_id.in_(customers),
+                Job.scheduled_date >= date.today()
+            )
+        ).all())
+    pairs = {(technician_id, day) for technician_id, day in pairs if technician_id and day}
+    if pairs:
+        refresh_day_loads(conn, pairs)
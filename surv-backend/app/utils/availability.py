@@ -0,0 +1,112 @@
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterable
+from sqlalchemy import event, inspect, select
+from sqlalchemy.orm import Session
+from app.database import SessionLocal
+from app.models.availability import AvailabilityDay
+from app.models.job import Job
+from app.utils.sql import dialect_insert
+
+# Bookable slots: 8am-5pm in 2-hour blocks
+SLOT_TIMES = ["08:00", "10:00", "12:00", "14:00", "16:00"]
+
+# Jobs that can share one slot before it shows as unavailable
+SLOT_CAPACITY = 1
+
+# Job statuses that occupy a slot
+BOOKED_STATUSES = ["scheduled", "in_progress"]
+
+_WATCHED_FIELDS = ("scheduled_date", "scheduled_start_time", "status")
+
+
+def count_booked_slots(conn, dates: Iterable[date]) -> Dict[date, Dict[str, int]]:
+    """Count occupied slots per day straight from the jobs table"""
+    counts = {d: {} for d in dates}
+    rows = conn.execute(
+        select(Job.scheduled_date, Job.scheduled_start_time).where(
+            Job.scheduled_date.in_(list(counts)),
+            Job.status.in_(BOOKED_STATUSES),
+            Job.scheduled_start_time.isnot(None)
+        )
+    )
+    for scheduled_date, start_time in rows:
+        slot = start_time.strftime("%H:%M")
+        if slot in SLOT_TIMES:
+            day = counts[scheduled_date]
+            day[slot] = day.get(slot, 0) + 1
+    return counts
+
+
+def refresh_availability(conn, dates: Iterable[date]):
+    """Recompute the grid rows for the given days"""
+    counts = count_booked_slots(conn, sorted(set(dates)))
+    if not counts:
+        return
+
+    now = datetime.utcnow()
+    stmt = dialect_insert(conn, AvailabilityDay.__table__)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["slot_date"],
+        set_={"booked_counts": stmt.excluded.booked_counts, "refreshed_at": now}
+    )
+    conn.execute(stmt, [
+        {"slot_date": d, "booked_counts": booked, "refreshed_at": now}
+        for d, booked in counts.items()
+    ])
+
+
+def get_availability_grid(db: Session, start_date: date, end_date: date) -> Dict[date, Dict[str, int]]:
+    """
+    Read booked slot counts for a date range. Days not on the grid yet are
+    counted from jobs without being stored, so this read never writes; job
+    writes and slot holds add a day's row when they touch it.
+    """
+    rows = db.query(AvailabilityDay.slot_date, AvailabilityDay.booked_counts).filter(
+        AvailabilityDay.slot_date >= start_date,
+        AvailabilityDay.slot_date <= end_date
+    ).all()
+    grid = {slot_date: booked for slot_date, booked in rows}
+
+    missing = []
+    current_date = start_date
+    while current_date <= end_date:
+        if current_date not in grid:
+            missing.append(current_date)
+        current_date += timedelta(days=1)
+
+    if missing:
+        grid.update(count_booked_slots(db.connection(), missing))
+
+    return grid
+
+
+@event.listens_for(SessionLocal, "before_flush")
+def _collect_changed_job_dates(session, flush_context, instances):
+    """Remember which days are touched by job creates, reschedules and cancellations"""
+    dates = session.info.setdefault("availability_dates", set())
+
+    for obj in session.new:
+        if isinstance(obj, Job) and (obj.status is None or obj.status in BOOKED_STATUSES):
+            dates.add(obj.scheduled_date)
+
+    for obj in session.deleted:
+        if isinstance(obj, Job):
+            dates.add(obj.scheduled_date)
+
+    for obj in session.dirty:
+        if not isinstance(obj, Job):
+            continue
+        attrs = inspect(obj).attrs
+        if any(attrs[field].history.has_changes() for field in _WATCHED_FIELDS):
+            dates.add(obj.scheduled_date)
+            dates.update(attrs.scheduled_date.history.deleted)
+
+    dates.discard(None)
+
+
+@event.listens_for(SessionLocal, "after_flush")
+def _refresh_changed_job_dates(session, flush_context):
+    """Refresh grid rows in the same transaction as the job write"""
+    dates = session.info.pop("availability_dates", None)
+    if dates:
+        refresh_availability(session.connection(), dates)
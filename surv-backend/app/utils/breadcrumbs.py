@@ -0,0 +1,292 @@
+import math
+import sys
+import uuid
+from array import array
+from bisect import bisect_left
+from dataclasses import dataclass, field
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+from sqlalchemy.orm import Session
+from app.config import settings
+from app.models.breadcrumb_day import BreadcrumbDay
+from app.models.job_timeline import JobTimeline
+from app.utils.geo import EARTH_RADIUS_M
+from app.utils.sql import dialect_insert
+
+METERS_PER_MILE = 1609.344
+
+UNKNOWN_ACCURACY = 0xFFFF
+
+# array typecode per packed column
+_TYPECODES = {"seconds": "I", "lat_e6": "i", "lng_e6": "i", "accuracy": "H"}
+
+
+def _unpack(typecode: str, data: bytes) -> array:
+    values = array(typecode)
+    values.frombytes(data or b"")
+    if sys.byteorder == "big":
+        values.byteswap()
+    return values
+
+
+def _pack(values: array) -> bytes:
+    if sys.byteorder == "big":
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values.tobytes()
+
+
+@dataclass
+class Track:
+    """One technician-day of breadcrumbs as parallel arrays sorted by time"""
+    day: date
+    seconds: array = field(default_factory=lambda: array("I"))
+    lat_e6: array = field(default_factory=lambda: array("i"))
+    lng_e6: array = field(default_factory=lambda: array("i"))
+    accuracy: array = field(default_factory=lambda: array("H"))
+    mileage: Optional[dict] = None
+
+    @classmethod
+    def from_row(cls, row: BreadcrumbDay) -> "Track":
+        columns = {name: _unpack(code, getattr(row, name)) for name, code in _TYPECODES.items()}
+        return cls(row.day, mileage=row.mileage, **columns)
+
+    def __len__(self):
+        return len(self.seconds)
+
+    def merge(self, points: Iterable[Tuple[int, int, int, int]]):
+        """Add (seconds, lat_e6, lng_e6, accuracy) points, keeping time order; the first fix per second wins"""
+        combined = sorted(
+            list(zip(self.seconds, self.lat_e6, self.lng_e6, self.accuracy)) + list(points),
+            key=lambda point: point[0]
+        )
+        merged = [point for i, point in enumerate(combined) if i == 0 or point[0] != combined[i - 1][0]]
+        columns = list(zip(*merged)) or [()] * len(_TYPECODES)
+        for (name, code), column in zip(_TYPECODES.items(), columns):
+            setattr(self, name, array(code, column))
+
+    def downsample(self, interval: int):
+        """Keep the first fix of every `interval` seconds"""
+        keep = []
+        bucket = -1
+        for i, seconds in enumerate(self.seconds):
+            if seconds // interval != bucket:
+                bucket = seconds // interval
+                keep.append(i)
+        for name, code in _TYPECODES.items():
+            values = getattr(self, name)
+            setattr(self, name, array(code, (values[i] for i in keep)))
+
+    def store(self, row: BreadcrumbDay):
+        for name in _TYPECODES:
+            setattr(row, name, _pack(getattr(self, name)))
+        row.point_count = len(self)
+
+
+def append_breadcrumbs(db: Session, employee_id: str, points: Iterable[Tuple[datetime, float, float, Optional[float]]]) -> Dict[date, int]:
+    """
+    Merge (recorded_at, latitude, longitude, accuracy_m) points into the
+    technician's per-day tracks. Returns the point count of each day touched.
+    """
+    by_day: Dict[date, List[Tuple[int, int, int, int]]] = {}
+    for recorded_at, latitude, longitude, accuracy_m in points:
+        midnight = datetime.combine(recorded_at.date(), datetime.min.time())
+        by_day.setdefault(recorded_at.date(), []).append((
+            int((recorded_at - midnight).total_seconds()),
+            round(latitude * 1e6),
+            round(longitude * 1e6),
+            UNKNOWN_ACCURACY if accuracy_m is None else min(int(math.ceil(accuracy_m)), UNKNOWN_ACCURACY - 1)
+        ))
+
+    conn = db.connection()
+    counts = {}
+    for day in sorted(by_day):
+        conn.execute(
+            dialect_insert(conn, BreadcrumbDay.__table__)
+            .values(
+                id=str(uuid.uuid4()),
+                employee_id=employee_id,
+                day=day,
+                point_count=0,
+                seconds=b"",
+                lat_e6=b"",
+                lng_e6=b"",
+                accuracy=b"",
+                updated_at=datetime.utcnow()
+            )
+            .on_conflict_do_nothing(index_elements=["employee_id", "day"])
+        )
+        # Concurrent uploads for the same day are serialized on the row lock
+        row = db.query(BreadcrumbDay).filter(
+            BreadcrumbDay.employee_id == employee_id,
+            BreadcrumbDay.day == day
+        ).with_for_update().populate_existing().one()
+        track = Track.from_row(row)
+        track.merge(by_day[day])
+        track.store(row)
+        row.resolution_seconds = 0
+        # Miles stored when the day was thinned no longer cover the new points
+        row.mileage = None
+        counts[day] = row.point_count
+    return counts
+
+
+def downsample_breadcrumbs(db: Session, before: date, interval: int) -> int:
+    """
+    Thin every trail from before `before` to one fix per `interval` seconds; returns days thinned.
+    Mileage is measured and stored first, so thinning never changes a day's reported miles.
+    """
+    day_ids = [day_id for (day_id,) in db.query(BreadcrumbDay.id).filter(
+        BreadcrumbDay.day < before,
+        BreadcrumbDay.resolution_seconds < interval
+    )]
+    for day_id in day_ids:
+        row = db.query(BreadcrumbDay).filter(BreadcrumbDay.id == day_id).with_for_update().populate_existing().one()
+        if row.resolution_seconds < interval:
+            track = Track.from_row(row)
+            if row.mileage is None:
+                mileage = track_mileage(track, day_travel_intervals(db, row.employee_id, row.day, row.day))
+                del mileage["date"]
+                row.mileage = mileage
+            track.downsample(interval)
+            track.store(row)
+            row.resolution_seconds = interval
+        db.commit()
+    return len(day_ids)
+
+
+def load_tracks(db: Session, employee_id: str, date_from: date, date_to: date) -> List[Track]:
+    rows = db.query(BreadcrumbDay).filter(
+        BreadcrumbDay.employee_id == employee_id,
+        BreadcrumbDay.day >= date_from,
+        BreadcrumbDay.day <= date_to
+    ).order_by(BreadcrumbDay.day).all()
+    return [Track.from_row(row) for row in rows]
+
+
+def travel_intervals(db: Session, employee_id: str, start: datetime, end: datetime) -> List[Tuple[datetime, datetime, str]]:
+    """
+    (start, end, job_id) for each trip: from an `on_my_way` event to the
+    technician's next timeline event (normally `arrived`/`started` at that job)
+    """
+    events = db.query(JobTimeline.event_type, JobTimeline.event_time, JobTimeline.job_id).filter(
+        JobTimeline.employee_id == employee_id,
+        JobTimeline.event_time >= start,
+        JobTimeline.event_time < end
+    ).order_by(JobTimeline.event_time).all()
+    return [
+        (event_time, events[i + 1].event_time, job_id)
+        for i, (event_type, event_time, job_id) in enumerate(events[:-1])
+        if event_type == "on_my_way"
+    ]
+
+
+def track_mileage(track: Track, intervals: List[Tuple[datetime, datetime, str]]) -> dict:
+    """
+    Distance driven along one day's track. Inaccurate fixes and jumps faster than
+    MILEAGE_MAX_SPEED_MPH (spikes) are dropped; a move of at least
+    MILEAGE_MIN_MOVE_METERS only counts once the following fix confirms it, so
+    jitter while parked adds nothing. Each counted segment goes to the trip its
+    end point falls in.
+    """
+    min_move = settings.MILEAGE_MIN_MOVE_METERS
+    max_speed = settings.MILEAGE_MAX_SPEED_MPH * METERS_PER_MILE / 3600
+    max_accuracy = settings.MILEAGE_MAX_ACCURACY_METERS
+    midnight = datetime.combine(track.day, datetime.min.time())
+    trip_starts = [(start - midnight).total_seconds() for start, _, _ in intervals]
+    trip_ends = [(end - midnight).total_seconds() for _, end, _ in intervals]
+
+    radians_per_e6 = math.pi / 180 / 1e6
+    sin, cos, asin, sqrt = math.sin, math.cos, math.asin, math.sqrt
+
+    def distance(origin, fix) -> float:
+        """Haversine meters between fixes held as (seconds, phi, lambda, cos phi, accuracy)"""
+        a = sin((fix[1] - origin[1]) / 2) ** 2 + origin[3] * fix[3] * sin((fix[2] - origin[2]) / 2) ** 2
+        return 2 * EARTH_RADIUS_M * asin(min(1.0, sqrt(a)))
+
+    def is_move(origin, fix, meters) -> bool:
+        elapsed = fix[0] - origin[0]
+        return meters >= min_move and elapsed > 0 and meters / elapsed <= max_speed
+
+    total = 0.0
+    by_job: Dict[str, float] = {}
+    kept = 0
+    anchor = None  # last counted fix
+    pending = None  # (fix, meters) moved away from anchor, awaiting confirmation
+
+    def count(fix, meters):
+        nonlocal total
+        total += meters
+        trip = bisect_left(trip_starts, fix[0]) - 1
+        if trip >= 0 and fix[0] <= trip_ends[trip]:
+            job_id = intervals[trip][2]
+            by_job[job_id] = by_job.get(job_id, 0.0) + meters
+
+    for seconds, lat, lng, accuracy in zip(track.seconds, track.lat_e6, track.lng_e6, track.accuracy):
+        if accuracy != UNKNOWN_ACCURACY and accuracy > max_accuracy:
+            continue
+        phi = lat * radians_per_e6
+        fix = (seconds, phi, lng * radians_per_e6, cos(phi), accuracy)
+        if anchor is None:
+            anchor = fix
+            kept += 1
+            continue
+        meters = distance(anchor, fix)
+        if meters < min_move:
+            # Back within range of the anchor: the pending fix was jitter
+            pending = None
+            continue
+        if not is_move(anchor, fix, meters):
+            continue
+        if pending is None:
+            pending = (fix, meters)
+            continue
+        count(*pending)
+        anchor = pending[0]
+        kept += 1
+        meters = distance(anchor, fix)
+        pending = (fix, meters) if is_move(anchor, fix, meters) else None
+
+    # Nothing follows to confirm the last move, so it only counts on a reported, accurate fix
+    if pending and pending[0][4] <= max_accuracy:
+        count(*pending)
+        kept += 1
+
+    attributed = sum(by_job.values())
+    return {
+        "date": track.day,
+        "points": len(track),
+        "kept_points": kept,
+        "miles": round(total / METERS_PER_MILE, 2),
+        "job_miles": {job_id: round(meters / METERS_PER_MILE, 2) for job_id, meters in by_job.items()},
+        "unattributed_miles": round((total - attributed) / METERS_PER_MILE, 2)
+    }
+
+
+def day_travel_intervals(db: Session, employee_id: str, date_from: date, date_to: date) -> List[Tuple[datetime, datetime, str]]:
+    # A trip may begin the evening before the first day
+    return travel_intervals(
+        db, employee_id,
+        datetime.combine(date_from - timedelta(days=1), datetime.min.time()),
+        datetime.combine(date_to + timedelta(days=2), datetime.min.time())
+    )
+
+
+def compute_mileage(db: Session, employee_id: str, date_from: date, date_to: date) -> List[dict]:
+    """
+    Per-day mileage for one technician with miles split across the jobs they drove to.
+    Thinned days report the mileage stored before they were thinned.
+    """
+    tracks = load_tracks(db, employee_id, date_from, date_to)
+    if not tracks:
+        return []
+    intervals = None
+    days = []
+    for track in tracks:
+        if track.mileage is not None:
+            days.append({"date": track.day, **track.mileage})
+            continue
+        if intervals is None:
+            intervals = day_travel_intervals(db, employee_id, date_from, date_to)
+        days.append(track_mileage(track, intervals))
+    return days
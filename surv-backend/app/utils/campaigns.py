@@ -0,0 +1,283 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import List, Optional
+from sqlalchemy.orm import Session
+from app.config import settings
+from app.database import SessionLocal
+from app.models.campaign import Campaign, CampaignRecipient
+from app.models.customer import Customer
+from app.utils.email import SendGridClient, SENDGRID_MAX_PERSONALIZATIONS
+from app.utils.rate_limit import RateLimiter
+from app.schemas.segment import SegmentFilters
+from app.utils.segments import segment_query
+from app.utils.templates import CompiledMessage, fetch_field_values
+
+# Recipients per provider call (and per persisted progress step)
+BATCH_SIZE = SENDGRID_MAX_PERSONALIZATIONS
+
+# Attempts per batch before its recipients are marked failed
+SEND_ATTEMPTS = 3
+
+_scheduler_stop = threading.Event()
+
+
+def target_customers_query(
+    db: Session,
+    target_customers: Optional[List[str]] = None,
+    segment: Optional[SegmentFilters] = None
+):
+    """Customers a campaign goes to: a segment and/or the given IDs, or everyone with an email"""
+    columns = (Customer.id, Customer.email, Customer.first_name, Customer.last_name)
+    query = segment_query(db, segment, *columns) if segment else db.query(*columns)
+    query = query.filter(Customer.email.isnot(None))
+    if target_customers:
+        query = query.filter(Customer.id.in_(target_customers))
+    return query
+
+
+def materialize_recipients(
+    campaign_id: str,
+    target_customers: Optional[List[str]] = None,
+    segment: Optional[SegmentFilters] = None
+) -> int:
+    """Stream target customers into campaign_recipients, numbering provider-sized batches"""
+    db = SessionLocal()
+    try:
+        table = CampaignRecipient.__table__
+        rows = []
+        total = 0
+
+        # Re-running preparation starts the recipient list over
+        db.execute(table.delete().where(table.c.campaign_id == campaign_id))
+
+        customers = target_customers_query(db, target_customers, segment).order_by(Customer.id).yield_per(BATCH_SIZE)
+        for customer_id, email, first_name, last_name in customers:
+            rows.append({
+                "campaign_id": campaign_id,
+                "customer_id": customer_id,
+                "email": email,
+                "name": f"{first_name} {last_name}".strip(),
+                "batch_number": total // BATCH_SIZE,
+                "status": "pending"
+            })
+            total += 1
+            if len(rows) == BATCH_SIZE:
+                db.execute(table.insert(), rows)
+                rows = []
+        if rows:
+            db.execute(table.insert(), rows)
+
+        db.query(Campaign).filter(Campaign.id == campaign_id).update(
+            {"recipients_count": total}, synchronize_session=False
+        )
+        db.commit()
+        return total
+    finally:
+        db.close()
+
+
+def _send_batch(campaign_id: str, batch_number: int, message: CompiledMessage,
+                client: SendGridClient, limiter: RateLimiter):
+    """Claim, send and record one batch; progress is committed per batch"""
+    db = SessionLocal()
+    try:
+        batch_filter = (
+            CampaignRecipient.campaign_id == campaign_id,
+            CampaignRecipient.batch_number == batch_number
+        )
+
+        claimed = db.query(CampaignRecipient).filter(
+            *batch_filter, CampaignRecipient.status == "pending"
+        ).update({"status": "sending"}, synchronize_session=False)
+        db.commit()
+        if not claimed:
+            return
+
+        recipients = [
+            {"customer_id": customer_id, "email": email, "name": name}
+            for customer_id, email, name in db.query(
+                CampaignRecipient.customer_id, CampaignRecipient.email, CampaignRecipient.name
+            ).filter(*batch_filter, CampaignRecipient.status == "sending")
+        ]
+
+        # Placeholders are filled in by SendGrid from per-recipient substitutions
+        if message.fields:
+            values = fetch_field_values(db, "customer", [r["customer_id"] for r in recipients], message.fields)
+            for recipient in recipients:
+                recipient["substitutions"] = message.substitutions(values.get(recipient["customer_id"], {}))
+
+        error = None
+        for attempt in range(SEND_ATTEMPTS):
+            limiter.acquire()
+            try:
+                client.send_batch(message.subject.provider_text, message.body.provider_text, recipients)
+                error = None
+                break
+            except Exception as e:
+                error = e
+                if attempt < SEND_ATTEMPTS - 1:
+                    time.sleep(2 ** attempt)
+
+        if error:
+            print(f"[CAMPAIGN ERROR] Campaign {campaign_id} batch {batch_number}: {error}")
+
+        db.query(CampaignRecipient).filter(
+            *batch_filter, CampaignRecipient.status == "sending"
+        ).update(
+            {"status": "failed"} if error else {"status": "sent", "sent_at": datetime.utcnow()},
+            synchronize_session=False
+        )
+        counter = Campaign.failed_count if error else Campaign.sent_count
+        db.query(Campaign).filter(Campaign.id == campaign_id).update(
+            {counter: counter + len(recipients)}, synchronize_session=False
+        )
+        db.commit()
+    finally:
+        db.close()
+
+
+def send_campaign(campaign_id: str, resume: bool = False, client: Optional[SendGridClient] = None):
+    """
+    Send every pending batch of a campaign through a rate-limited worker pool.
+    With resume=True, batches left in flight by a crashed send are sent again.
+    """
+    db = SessionLocal()
+    try:
+        campaign = db.query(Campaign).filter(Campaign.id == campaign_id).first()
+        if not campaign:
+            return
+
+        if resume:
+            db.query(CampaignRecipient).filter(
+                CampaignRecipient.campaign_id == campaign_id,
+                CampaignRecipient.status == "sending"
+            ).update({"status": "pending"}, synchronize_session=False)
+
+        campaign.status = "sending"
+        campaign.started_at = campaign.started_at or datetime.utcnow()
+        db.commit()
+        message = CompiledMessage(campaign.subject, campaign.body)
+
+        batches = [
+            batch_number for (batch_number,) in db.query(CampaignRecipient.batch_number).filter(
+                CampaignRecipient.campaign_id == campaign_id,
+                CampaignRecipient.status == "pending"
+            ).distinct().order_by(CampaignRecipient.batch_number)
+        ]
+    finally:
+        db.close()
+
+    own_client = client is None
+    client = client or SendGridClient()
+    limiter = RateLimiter(settings.SENDGRID_REQUESTS_PER_SECOND)
+    try:
+        with ThreadPoolExecutor(max_workers=settings.CAMPAIGN_SEND_WORKERS) as pool:
+            for _ in pool.map(lambda n: _send_batch(campaign_id, n, message, client, limiter), batches):
+                pass
+    finally:
+        if own_client:
+            client.close()
+
+    db = SessionLocal()
+    try:
+        campaign = db.query(Campaign).filter(Campaign.id == campaign_id).first()
+        campaign.status = "failed" if campaign.failed_count and not campaign.sent_count else "sent"
+        campaign.completed_at = datetime.utcnow()
+        db.commit()
+    finally:
+        db.close()
+
+
+def prepare_campaign(
+    campaign_id: str,
+    target_customers: Optional[List[str]] = None,
+    segment: Optional[SegmentFilters] = None,
+    send_now: bool = True
+):
+    """Background task run after a campaign is created, or to retry a failed preparation"""
+    db = SessionLocal()
+    try:
+        materialize_recipients(campaign_id, target_customers, segment)
+        if not send_now:
+            db.query(Campaign).filter(Campaign.id == campaign_id).update(
+                {"status": "scheduled"}, synchronize_session=False
+            )
+            db.commit()
+    except Exception as e:
+        # Left in "preparing" the campaign could never be sent or resumed
+        print(f"[CAMPAIGN ERROR] Campaign {campaign_id} preparation failed: {e}")
+        db.rollback()
+        db.query(Campaign).filter(Campaign.id == campaign_id).update(
+            {"status": "failed"}, synchronize_session=False
+        )
+        db.commit()
+        return
+    finally:
+        db.close()
+
+    if send_now:
+        send_campaign(campaign_id)
+
+
+def needs_preparation(db: Session, campaign: Campaign) -> bool:
+    """True when preparation failed or its worker died before finishing"""
+    if campaign.status == "preparing":
+        stale_before = datetime.utcnow() - timedelta(minutes=settings.CAMPAIGN_PREPARE_STALE_MINUTES)
+        return (campaign.updated_at or campaign.created_at) < stale_before
+    if campaign.status == "failed":
+        # A failed send has recipients to resume; a failed preparation has none
+        return not db.query(CampaignRecipient.customer_id).filter(
+            CampaignRecipient.campaign_id == campaign.id
+        ).first()
+    return False
+
+
+def send_due_campaigns() -> int:
+    """Send every scheduled campaign whose scheduled_at has passed; returns how many were started"""
+    db = SessionLocal()
+    try:
+        due = [campaign_id for (campaign_id,) in db.query(Campaign.id).filter(
+            Campaign.status == "scheduled",
+            Campaign.scheduled_at <= datetime.utcnow()
+        )]
+        started = []
+        for campaign_id in due:
+            # Only one scheduler may claim a campaign
+            claimed = db.query(Campaign).filter(
+                Campaign.id == campaign_id,
+                Campaign.status == "scheduled"
+            ).update({"status": "sending"}, synchronize_session=False)
+            db.commit()
+            if claimed:
+                started.append(campaign_id)
+    finally:
+        db.close()
+
+    for campaign_id in started:
+        send_campaign(campaign_id)
+    return len(started)
+
+
+def _run_scheduler():
+    """Check for due campaigns every CAMPAIGN_SCHEDULE_POLL_SECONDS"""
+    while not _scheduler_stop.wait(settings.CAMPAIGN_SCHEDULE_POLL_SECONDS):
+        try:
+            send_due_campaigns()
+        except Exception as e:
+            print(f"[CAMPAIGN ERROR] Scheduled send failed: {e}")
+
+
+def start_campaign_scheduler():
+    _scheduler_stop.clear()
+    threading.Thread(target=_run_scheduler, name="campaign-scheduler", daemon=True).start()
+
+
+def stop_campaign_scheduler():
+    _scheduler_stop.set()
+
+
+if __name__ == "__main__":
+    # For external schedulers: python -m app.utils.campaigns
+    print(f"Started {send_due_campaigns()} scheduled campaigns")
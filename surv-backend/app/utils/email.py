@@ -0,0 +1,54 @@
+import httpx
+from typing import Dict, List, Optional
+from app.config import settings
+
+# SendGrid accepts at most 1000 personalizations per mail/send call
+SENDGRID_MAX_PERSONALIZATIONS = 1000
+
+
+class SendGridClient:
+    """Pooled client for the SendGrid v3 mail/send API (logs instead of sending when no API key is set)"""
+
+    def __init__(self, api_key: Optional[str] = None, api_url: Optional[str] = None, timeout: float = 30.0):
+        self.api_key = settings.SENDGRID_API_KEY if api_key is None else api_key
+        self.api_url = api_url or settings.SENDGRID_API_URL
+        self._http = httpx.Client(
+            timeout=timeout,
+            headers={"Authorization": f"Bearer {self.api_key}"}
+        )
+
+    def send_batch(
+        self,
+        subject: str,
+        html_content: str,
+        recipients: List[Dict],
+        from_email: Optional[str] = None
+    ):
+        """
+        Send one message to up to 1000 recipients in a single API call.
+        Each recipient is {"email", "name"} plus optional "substitutions".
+        """
+        if len(recipients) > SENDGRID_MAX_PERSONALIZATIONS:
+            raise ValueError(f"At most {SENDGRID_MAX_PERSONALIZATIONS} recipients per batch")
+
+        if not self.api_key:
+            print(f"[EMAIL MOCK] Subject: {subject}, Recipients: {len(recipients)}")
+            return
+
+        personalizations = []
+        for recipient in recipients:
+            personalization = {"to": [{"email": recipient["email"], "name": recipient.get("name") or ""}]}
+            if recipient.get("substitutions"):
+                personalization["substitutions"] = recipient["substitutions"]
+            personalizations.append(personalization)
+
+        response = self._http.post(self.api_url, json={
+            "personalizations": personalizations,
+            "from": {"email": from_email or settings.SENDGRID_FROM_EMAIL},
+            "subject": subject,
+            "content": [{"type": "text/html", "value": html_content}]
+        })
+        response.raise_for_status()
+
+    def close(self):
+        self._http.close()
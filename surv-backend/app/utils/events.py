@@ -0,0 +1,173 @@
+import asyncio
+import threading
+from datetime import date
+from typing import Dict, List, Optional
+from sqlalchemy import event, inspect, select
+from app.database import SessionLocal
+from app.models.job import Job
+from app.models.job_timeline import JobTimeline
+
+# Job fields whose changes are pushed to the dispatch board
+_WATCHED_FIELDS = (
+    "status", "assigned_to", "scheduled_date", "scheduled_start_time", "scheduled_end_time",
+    "title", "priority", "job_type", "estimated_duration"
+)
+
+# Events a slow subscriber may fall behind by before it is told to resync
+SUBSCRIBER_QUEUE_SIZE = 1000
+
+
+class Subscription:
+    """One connected dispatcher: a queue on their event loop plus their filters"""
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, board_date: Optional[date], technician_id: Optional[str]):
+        self.loop = loop
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        self.board_date = board_date.isoformat() if board_date else None
+        self.technician_id = technician_id
+        self.overflowed = False
+
+    def wants(self, payload: dict) -> bool:
+        if self.board_date and self.board_date not in payload["dates"]:
+            return False
+        if self.technician_id and self.technician_id not in payload["technicians"]:
+            return False
+        return True
+
+    def _put(self, payload: dict):
+        if self.overflowed:
+            return
+        try:
+            self.queue.put_nowait(payload)
+        except asyncio.QueueFull:
+            # Drop the backlog; the client reloads the board instead
+            self.overflowed = True
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait({"type": "resync"})
+
+
+class EventBus:
+    """In-process fan-out of committed job changes to dispatch board subscribers"""
+
+    def __init__(self):
+        self._subscriptions: List[Subscription] = []
+        self._lock = threading.Lock()
+
+    def subscribe(self, board_date: Optional[date] = None, technician_id: Optional[str] = None) -> Subscription:
+        subscription = Subscription(asyncio.get_running_loop(), board_date, technician_id)
+        with self._lock:
+            self._subscriptions.append(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        with self._lock:
+            if subscription in self._subscriptions:
+                self._subscriptions.remove(subscription)
+
+    def publish(self, payloads: List[dict]):
+        """Deliver events to matching subscribers; safe to call from any thread"""
+        with self._lock:
+            subscriptions = list(self._subscriptions)
+        for subscription in subscriptions:
+            for payload in payloads:
+                if subscription.wants(payload):
+                    try:
+                        subscription.loop.call_soon_threadsafe(subscription._put, payload)
+                    except RuntimeError:
+                        # Event loop already closed
+                        self.unsubscribe(subscription)
+                        break
+
+    @property
+    def subscriber_count(self) -> int:
+        with self._lock:
+            return len(self._subscriptions)
+
+
+event_bus = EventBus()
+
+
+def _job_payload(event_type: str, job: Job, **extra) -> dict:
+    return {
+        "type": event_type,
+        "job_id": job.id,
+        "job_number": job.job_number,
+        "status": job.status,
+        "assigned_to": job.assigned_to,
+        "scheduled_date": job.scheduled_date,
+        "scheduled_start_time": job.scheduled_start_time,
+        **extra
+    }
+
+
+@event.listens_for(SessionLocal, "after_flush")
+def _collect_board_events(session, flush_context):
+    """Turn flushed job and timeline writes into board events, held until commit"""
+    if not event_bus.subscriber_count:
+        return
+    events: List[dict] = session.info.setdefault("board_events", [])
+
+    for obj in session.new:
+        if isinstance(obj, Job):
+            events.append(_job_payload("job.created", obj))
+    for obj in session.deleted:
+        if isinstance(obj, Job):
+            events.append(_job_payload("job.deleted", obj))
+    for obj in session.dirty:
+        if not isinstance(obj, Job):
+            continue
+        attrs = inspect(obj).attrs
+        changed = [field for field in _WATCHED_FIELDS if attrs[field].history.has_changes()]
+        if not changed:
+            continue
+        event_type = "job.assigned" if "assigned_to" in changed else "job.status" if "status" in changed else "job.updated"
+        previous = {
+            f"previous_{field}": attrs[field].history.deleted[0]
+            for field in ("status", "assigned_to", "scheduled_date")
+            if field in changed and attrs[field].history.deleted
+        }
+        events.append(_job_payload(event_type, obj, changed=changed, **previous))
+
+    timeline = [obj for obj in session.new if isinstance(obj, JobTimeline)]
+    if timeline:
+        jobs: Dict[str, tuple] = {
+            job_id: (job_number, scheduled_date, assigned_to)
+            for job_id, job_number, scheduled_date, assigned_to in session.connection().execute(
+                select(Job.id, Job.job_number, Job.scheduled_date, Job.assigned_to).where(
+                    Job.id.in_({obj.job_id for obj in timeline})
+                )
+            )
+        }
+        for obj in timeline:
+            job_number, scheduled_date, assigned_to = jobs.get(obj.job_id, (None, None, None))
+            events.append({
+                "type": "timeline",
+                "job_id": obj.job_id,
+                "job_number": job_number,
+                "event_type": obj.event_type,
+                "event_time": obj.event_time,
+                "employee_id": obj.employee_id,
+                "assigned_to": assigned_to,
+                "scheduled_date": scheduled_date
+            })
+
+
+@event.listens_for(SessionLocal, "after_commit")
+def _publish_after_commit(session):
+    events = session.info.pop("board_events", None)
+    if events:
+        for payload in events:
+            # Routing keys: a reschedule or reassignment reaches both the old and new board
+            payload["dates"] = {
+                value.isoformat() for value in (payload.get("scheduled_date"), payload.get("previous_scheduled_date")) if value
+            }
+            payload["technicians"] = {
+                value for value in (payload.get("assigned_to"), payload.get("previous_assigned_to"), payload.get("employee_id")) if value
+            }
+        event_bus.publish(events)
+
+
+@event.listens_for(SessionLocal, "after_rollback")
+def _discard_after_rollback(session):
+    session.info.pop("board_events", None)
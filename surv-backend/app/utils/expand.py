@@ -0,0 +1,110 @@
+from functools import lru_cache
+from typing import Dict, FrozenSet, List, Optional, Tuple, Type
+from fastapi import HTTPException, status
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel, ConfigDict, create_model
+from sqlalchemy import inspect
+from sqlalchemy.orm import Session, load_only, selectinload
+from sqlalchemy.orm.attributes import set_committed_value
+
+# name -> (relationship attribute, schema the related row is serialized with)
+Includes = Dict[str, Tuple[object, Type[BaseModel]]]
+
+
+def _split(value: Optional[str]) -> List[str]:
+    return [part.strip() for part in (value or "").split(",") if part.strip()]
+
+
+@lru_cache(maxsize=256)
+def _partial_schema(schema: Type[BaseModel], fields: FrozenSet[str]) -> Type[BaseModel]:
+    """`schema` cut down to `fields`, so sparse rows serialize exactly like full ones"""
+    return create_model(
+        f"{schema.__name__}Fields",
+        __config__=ConfigDict(from_attributes=True),
+        **{name: (info.annotation, info) for name, info in schema.model_fields.items() if name in fields}
+    )
+
+
+class ResourceView:
+    """
+    ?fields= and ?include= for a list endpoint: selects only the requested
+    columns, eager-loads the requested relationships with one SELECT ... IN
+    each, and serializes the rows to match
+    """
+
+    def __init__(self, model, schema: Type[BaseModel], includes: Includes,
+                 fields: Optional[str], include: Optional[str]):
+        self.model = model
+        self.schema = schema
+        self.includes = {}
+        for name in _split(include):
+            if name not in includes:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail=f"Unknown include '{name}'; allowed: {', '.join(includes)}"
+                )
+            self.includes[name] = includes[name]
+
+        self.fields = None
+        if fields is not None:
+            requested = set(_split(fields))
+            unknown = requested - set(schema.model_fields)
+            if unknown:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail=f"Unknown fields: {', '.join(sorted(unknown))}"
+                )
+            self.fields = frozenset(requested | {"id"})
+
+    @property
+    def active(self) -> bool:
+        return self.fields is not None or bool(self.includes)
+
+    def _selected(self) -> set:
+        return set(self.schema.model_fields) if self.fields is None else set(self.fields)
+
+    def apply(self, query):
+        """Add column selection and eager loads to a query of `model`"""
+        mapper = inspect(self.model)
+        selected = self._selected()
+        options = [
+            selectinload(getattr(self.model, name)) for name in selected if name in mapper.relationships
+        ]
+        for attribute, _ in self.includes.values():
+            options.append(selectinload(attribute))
+        if self.fields is not None:
+            columns = {name for name in selected if name in mapper.column_attrs}
+            # Foreign keys the eager loads join on must be loaded too
+            for attribute, _ in self.includes.values():
+                columns.update(column.key for column in attribute.property.local_columns)
+            options.append(load_only(*(getattr(self.model, name) for name in columns)))
+        return query.options(*options)
+
+    def attach(self, db: Session, rows: list):
+        """Load included relationships for rows built outside the session (e.g. from the archive)"""
+        transient = [row for row in rows if inspect(row).transient]
+        for name, (attribute, _) in self.includes.items():
+            prop = attribute.property
+            if not transient or prop.uselist or len(prop.local_remote_pairs) != 1:
+                continue
+            local, remote = prop.local_remote_pairs[0]
+            keys = {getattr(row, local.key) for row in transient} - {None}
+            related = {
+                getattr(obj, remote.key): obj
+                for obj in db.query(prop.mapper.class_).filter(remote.in_(keys))
+            } if keys else {}
+            for row in transient:
+                set_committed_value(row, attribute.key, related.get(getattr(row, local.key)))
+
+    def serialize(self, row) -> dict:
+        schema = self.schema if self.fields is None else _partial_schema(self.schema, self.fields)
+        result = schema.model_validate(row).model_dump(mode="json")
+        for name, (attribute, related_schema) in self.includes.items():
+            # The include name is the output key; the relationship may be named differently
+            related = getattr(row, attribute.key)
+            result[name] = None if related is None else related_schema.model_validate(related).model_dump(mode="json")
+        return result
+
+    def response(self, rows: list) -> JSONResponse:
+        return JSONResponse(jsonable_encoder([self.serialize(row) for row in rows]))
@@ -0,0 +1,107 @@
+import csv
+import io
+import json
+import zlib
+from datetime import date, datetime, time
+from decimal import Decimal
+from typing import Iterable, Iterator, List, Literal, Type
+from fastapi import HTTPException, Request, status
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+from sqlalchemy import inspect
+from app.database import SessionLocal
+from app.models.user import User, UserRole
+
+ExportFormat = Literal["csv", "ndjson"]
+
+# Rows fetched per round trip and written per chunk
+EXPORT_BATCH_SIZE = 2000
+
+MEDIA_TYPES = {"csv": "text/csv", "ndjson": "application/x-ndjson"}
+
+
+def require_export_role(current_user: User):
+    if current_user.role not in [UserRole.admin, UserRole.manager]:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Only admins and managers can export data"
+        )
+
+
+def export_columns(model, schema: Type[BaseModel]) -> list:
+    """The model's columns that appear in its API response, in response order"""
+    columns = inspect(model).columns
+    return [columns[name] for name in schema.model_fields if name in columns]
+
+
+def _json_value(value):
+    if isinstance(value, (datetime, date, time)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    return value
+
+
+def _csv_chunks(names: List[str], batches: Iterable[list]) -> Iterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(names)
+    for rows in batches:
+        writer.writerows(
+            ["" if value is None else value.isoformat() if isinstance(value, (datetime, date, time)) else value
+             for value in row]
+            for row in rows
+        )
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    # Header-only exports still send the header
+    if buffer.tell():
+        yield buffer.getvalue().encode()
+
+
+def _ndjson_chunks(names: List[str], batches: Iterable[list]) -> Iterator[bytes]:
+    for rows in batches:
+        yield "".join(
+            json.dumps(dict(zip(names, map(_json_value, row))), separators=(",", ":")) + "\n"
+            for row in rows
+        ).encode()
+
+
+def _gzip(chunks: Iterator[bytes]) -> Iterator[bytes]:
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits=31: gzip container
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def export_response(request: Request, statement, export_format: ExportFormat, filename: str) -> StreamingResponse:
+    """
+    Stream the rows of a SELECT as CSV or NDJSON. Rows come from a server-side
+    cursor EXPORT_BATCH_SIZE at a time and each batch is written out before the
+    next is fetched, so memory stays flat however many rows match. The body is
+    gzipped on the fly when the client accepts it.
+    """
+    names = [column.key for column in statement.selected_columns]
+
+    def batches():
+        # The request's session may be closed before the body finishes streaming
+        db = SessionLocal()
+        try:
+            result = db.execute(statement.execution_options(yield_per=EXPORT_BATCH_SIZE))
+            for rows in result.partitions():
+                yield rows
+        finally:
+            db.close()
+
+    chunks = (_csv_chunks if export_format == "csv" else _ndjson_chunks)(names, batches())
+    headers = {
+        "Content-Disposition": f'attachment; filename="{filename}.{export_format}"',
+        "Vary": "Accept-Encoding"
+    }
+    if "gzip" in request.headers.get("accept-encoding", "").lower():
+        chunks = _gzip(chunks)
+        headers["Content-Encoding"] = "gzip"
+    return StreamingResponse(chunks, media_type=MEDIA_TYPES[export_format], headers=headers)
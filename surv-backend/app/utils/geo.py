@@ -0,0 +1,117 @@
+import math
+from typing import List, Optional, Tuple
+from sqlalchemy import and_, or_
+
+EARTH_RADIUS_M = 6371008.8
+
+# Bits per axis in a stored cell key (~0.3 m x 0.6 m cells at the equator)
+CELL_BITS = 26
+
+# Index ranges a bounding-box query is split into at most
+MAX_QUERY_CELLS = 16
+
+
+def haversine_m(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """Great-circle distance in meters"""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = phi2 - phi1
+    dlambda = math.radians(lon2 - lon1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2) ** 2
+    return 2 * EARTH_RADIUS_M * math.asin(min(1.0, math.sqrt(a)))
+
+
+def _spread(x: int) -> int:
+    """Move bit i of x to bit 2i"""
+    x &= 0xFFFFFFFF
+    x = (x | (x << 16)) & 0x0000FFFF0000FFFF
+    x = (x | (x << 8)) & 0x00FF00FF00FF00FF
+    x = (x | (x << 4)) & 0x0F0F0F0F0F0F0F0F
+    x = (x | (x << 2)) & 0x3333333333333333
+    x = (x | (x << 1)) & 0x5555555555555555
+    return x
+
+
+def _axis_index(value: float, low: float, span: float, bits: int) -> int:
+    cells = 1 << bits
+    return min(cells - 1, max(0, int((value - low) / span * cells)))
+
+
+def encode_cell(lat: Optional[float], lon: Optional[float]) -> Optional[int]:
+    """
+    Z-order cell key of a point: latitude and longitude bits interleaved, so
+    every coarser cell is one contiguous range of keys in a B-tree index.
+    """
+    if lat is None or lon is None:
+        return None
+    lat_index = _axis_index(float(lat), -90.0, 180.0, CELL_BITS)
+    lon_index = _axis_index(float(lon), -180.0, 360.0, CELL_BITS)
+    return (_spread(lon_index) << 1) | _spread(lat_index)
+
+
+def set_geo_cell(mapper, connection, target):
+    """before_insert/before_update hook keeping geo_cell in step with latitude/longitude"""
+    target.geo_cell = encode_cell(target.latitude, target.longitude)
+
+
+def bbox_around(lat: float, lon: float, radius_m: float) -> Tuple[float, float, float, float]:
+    """(min_lat, min_lon, max_lat, max_lon) enclosing a circle"""
+    dlat = math.degrees(radius_m / EARTH_RADIUS_M)
+    dlon = dlat / max(math.cos(math.radians(lat)), 1e-6)
+    return max(-90.0, lat - dlat), max(-180.0, lon - dlon), min(90.0, lat + dlat), min(180.0, lon + dlon)
+
+
+def covering_ranges(min_lat: float, min_lon: float, max_lat: float, max_lon: float,
+                    max_cells: int = MAX_QUERY_CELLS) -> List[Tuple[int, int]]:
+    """
+    Half-open key ranges [low, high) covering a bounding box, using the finest
+    cell level at which the box spans no more than max_cells cells.
+    """
+    for level in range(CELL_BITS, -1, -1):
+        lat_low = _axis_index(min_lat, -90.0, 180.0, level)
+        lat_high = _axis_index(max_lat, -90.0, 180.0, level)
+        lon_low = _axis_index(min_lon, -180.0, 360.0, level)
+        lon_high = _axis_index(max_lon, -180.0, 360.0, level)
+        if (lat_high - lat_low + 1) * (lon_high - lon_low + 1) <= max_cells:
+            break
+
+    shift = 2 * (CELL_BITS - level)
+    starts = sorted(
+        ((_spread(lon_index) << 1) | _spread(lat_index)) << shift
+        for lat_index in range(lat_low, lat_high + 1)
+        for lon_index in range(lon_low, lon_high + 1)
+    )
+    ranges = []
+    for start in starts:
+        end = start + (1 << shift)
+        if ranges and ranges[-1][1] == start:
+            ranges[-1] = (ranges[-1][0], end)
+        else:
+            ranges.append((start, end))
+    return ranges
+
+
+def bbox_filter(model, min_lat: float, min_lon: float, max_lat: float, max_lon: float):
+    """SQL condition for rows of `model` inside a bounding box, driven by the geo_cell index"""
+    return and_(
+        or_(*[and_(model.geo_cell >= low, model.geo_cell < high)
+              for low, high in covering_ranges(min_lat, min_lon, max_lat, max_lon)]),
+        model.latitude.between(min_lat, max_lat),
+        model.longitude.between(min_lon, max_lon)
+    )
+
+
+def radius_filter(model, lat: float, lon: float, radius_m: float):
+    """
+    SQL condition for rows of `model` within radius_m of a point: the bounding box
+    narrowed by an equirectangular distance check, which is plain arithmetic in
+    any database and within a fraction of a percent of haversine at street scale.
+    """
+    meters_per_degree = math.radians(EARTH_RADIUS_M)
+    lat_scale = meters_per_degree ** 2
+    lon_scale = (meters_per_degree * math.cos(math.radians(lat))) ** 2
+    dlat = model.latitude - lat
+    dlon = model.longitude - lon
+    return and_(
+        bbox_filter(model, *bbox_around(lat, lon, radius_m)),
+        dlat * dlat * lat_scale + dlon * dlon * lon_scale <= radius_m * radius_m
+    )
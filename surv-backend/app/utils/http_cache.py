@@ -0,0 +1,28 @@
+import hashlib
+import json
+from fastapi import Request, Response
+from fastapi.encoders import jsonable_encoder
+
+
+def cached_json_response(
+    request: Request,
+    payload,
+    max_age: int = 60,
+    stale_while_revalidate: int = 300
+) -> Response:
+    """JSON response with an ETag and Cache-Control, or 304 if the client copy is current"""
+    body = json.dumps(jsonable_encoder(payload), separators=(",", ":")).encode()
+    etag = f'"{hashlib.sha1(body).hexdigest()}"'
+    headers = {
+        "ETag": etag,
+        "Cache-Control": f"public, max-age={max_age}, stale-while-revalidate={stale_while_revalidate}"
+    }
+
+    # If-None-Match uses weak comparison, so ignore any W/ prefix
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match:
+        client_tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+        if "*" in client_tags or etag in client_tags:
+            return Response(status_code=304, headers=headers)
+
+    return Response(content=body, media_type="application/json", headers=headers)
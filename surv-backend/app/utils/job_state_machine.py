@@ -0,0 +1,96 @@
+from datetime import datetime
+from typing import Optional
+from fastapi import HTTPException, status
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from app.database import SessionLocal
+from app.models.job import Job
+from app.models.job_state import JobState
+from app.models.job_timeline import JobTimeline
+from app.utils.job_timeline import get_job_state, record_timeline_event
+from app.utils.sql import dialect_insert
+
+# Allowed status changes: current status -> statuses it may move to
+TRANSITIONS = {
+    "pending": {"scheduled", "cancelled"},  # online booking awaiting confirmation
+    "scheduled": {"pending", "in_progress", "completed", "cancelled"},
+    "in_progress": {"scheduled", "completed", "cancelled"},
+    "completed": {"in_progress"},  # reopened
+    "cancelled": {"scheduled"}  # reinstated
+}
+
+# Timeline event appended for each new status
+STATUS_EVENTS = {
+    "pending": "pending",
+    "scheduled": "scheduled",
+    "in_progress": "started",
+    "completed": "completed",
+    "cancelled": "cancelled"
+}
+
+
+def can_transition(current_status: Optional[str], new_status: str) -> bool:
+    return new_status == current_status or new_status in TRANSITIONS.get(current_status, ())
+
+
+def transition_job(
+    db: Session,
+    job: Job,
+    new_status: str,
+    employee_id: Optional[str] = None,
+    notes: Optional[str] = None
+) -> Optional[JobTimeline]:
+    """
+    Move a job to a new status: validate the transition against the locked
+    projection, append a timeline event and update job, projection and event
+    together in the caller's transaction. Returns None if the status is unchanged.
+    """
+    if new_status not in STATUS_EVENTS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unknown job status: {new_status}"
+        )
+
+    state = get_job_state(db, job.id)
+    current_status = state.status or job.status
+    if new_status == current_status:
+        return None
+    if not can_transition(current_status, new_status):
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"Cannot change job status from {current_status} to {new_status}"
+        )
+
+    now = datetime.utcnow()
+    timeline = record_timeline_event(
+        db, job.id, STATUS_EVENTS[new_status],
+        employee_id=employee_id,
+        event_time=now,
+        notes=notes or f"Status changed from {current_status} to {new_status}",
+        state=state
+    )
+    state.status = new_status
+    state.status_changed_at = now
+
+    job.status = new_status
+    if new_status == "in_progress" and not job.actual_start_time:
+        job.actual_start_time = now
+    elif new_status == "completed":
+        job.actual_end_time = now
+    return timeline
+
+
+@event.listens_for(SessionLocal, "after_flush")
+def _create_state_for_new_jobs(session, flush_context):
+    """Every job gets its projection row when it is inserted, whoever creates it"""
+    rows = [
+        {"job_id": obj.id, "status": obj.status, "status_changed_at": obj.created_at,
+         "event_count": 0, "travel_seconds": 0, "on_site_seconds": 0, "updated_at": datetime.utcnow()}
+        for obj in session.new if isinstance(obj, Job)
+    ]
+    if rows:
+        conn = session.connection()
+        conn.execute(
+            dialect_insert(conn, JobState.__table__).on_conflict_do_nothing(index_elements=["job_id"]),
+            rows
+        )
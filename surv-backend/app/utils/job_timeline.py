@@ -0,0 +1,97 @@
+from datetime import datetime
+from typing import Optional
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from app.models.job import Job
+from app.models.job_state import JobState
+from app.models.job_timeline import JobTimeline
+from app.utils.sql import dialect_insert
+
+# Event type -> JobState column holding its latest time
+EVENT_TIME_COLUMNS = {
+    "on_my_way": "on_my_way_at",
+    "arrived": "arrived_at",
+    "started": "started_at",
+    "completed": "completed_at",
+    "cancelled": "cancelled_at"
+}
+
+
+def _apply_event(state: JobState, event_type: str, event_time: datetime):
+    state.current_state = event_type
+    state.last_event_at = event_time
+    state.event_count += 1
+    column = EVENT_TIME_COLUMNS.get(event_type)
+    if column:
+        setattr(state, column, event_time)
+
+
+def get_job_state(db: Session, job_id: str) -> JobState:
+    """
+    Load a job's timeline projection, locked for update until the transaction ends.
+    Jobs whose timeline predates the projection are rebuilt from their events once.
+    """
+    conn = db.connection()
+    conn.execute(
+        dialect_insert(conn, JobState.__table__)
+        .values(
+            job_id=job_id,
+            status=select(Job.status).where(Job.id == job_id).scalar_subquery(),
+            event_count=0,
+            travel_seconds=0,
+            on_site_seconds=0,
+            updated_at=datetime.utcnow()
+        )
+        .on_conflict_do_nothing(index_elements=["job_id"])
+    )
+    state = db.query(JobState).filter(JobState.job_id == job_id).with_for_update().populate_existing().one()
+
+    if state.event_count == 0:
+        events = db.query(
+            JobTimeline.event_type, JobTimeline.event_time, JobTimeline.travel_time, JobTimeline.job_duration
+        ).filter(JobTimeline.job_id == job_id).order_by(JobTimeline.event_time).all()
+        for event_type, event_time, travel_time, job_duration in events:
+            _apply_event(state, event_type, event_time)
+            state.travel_seconds += travel_time or 0
+            state.on_site_seconds += job_duration or 0
+    return state
+
+
+def record_timeline_event(
+    db: Session,
+    job_id: str,
+    event_type: str,
+    employee_id: Optional[str] = None,
+    event_time: Optional[datetime] = None,
+    notes: Optional[str] = None,
+    state: Optional[JobState] = None,
+    latitude: Optional[float] = None,
+    longitude: Optional[float] = None
+) -> JobTimeline:
+    """Append a timeline event and update the job's projection in the same transaction"""
+    event_time = event_time or datetime.utcnow()
+    state = state or get_job_state(db, job_id)
+
+    travel_time = job_duration = None
+    # Travel runs from the latest "on my way" to the next start; on-site time from a start to the next completion
+    if event_type == "started" and state.on_my_way_at and (not state.started_at or state.on_my_way_at > state.started_at):
+        travel_time = int((event_time - state.on_my_way_at).total_seconds())
+        state.travel_seconds += travel_time
+    elif event_type == "completed" and state.started_at and (not state.completed_at or state.started_at > state.completed_at):
+        job_duration = int((event_time - state.started_at).total_seconds())
+        state.on_site_seconds += job_duration
+    _apply_event(state, event_type, event_time)
+
+    event = JobTimeline(
+        job_id=job_id,
+        event_type=event_type,
+        event_time=event_time,
+        employee_id=employee_id,
+        travel_time=travel_time,
+        job_duration=job_duration,
+        latitude=latitude,
+        longitude=longitude,
+        notes=notes
+    )
+    db.add(event)
+    return event
@@ -0,0 +1,188 @@
+import threading
+from datetime import date, datetime, timedelta
+from typing import Dict, List, NamedTuple, Optional, Tuple
+from app.config import settings
+from app.database import SessionLocal
+from app.models.technician_location import TechnicianLocation
+from app.models.user import User
+from app.utils.breadcrumbs import append_breadcrumbs, downsample_breadcrumbs
+from app.utils.sql import dialect_insert
+
+# (recorded_at, latitude, longitude, accuracy_m)
+Point = Tuple[datetime, float, float, Optional[float]]
+
+
+class Position(NamedTuple):
+    name: str
+    latitude: float
+    longitude: float
+    accuracy_m: Optional[float]
+    recorded_at: datetime
+
+
+class LiveLocationCache:
+    """
+    Latest position per technician held in memory and served without touching
+    the database. Positions and their history are written behind in batches;
+    positions written by other processes are picked up on the same cycle.
+    """
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._latest: Dict[str, Position] = {}
+        self._dirty: Dict[str, Position] = {}
+        self._history: Dict[str, List[Point]] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._refreshed_at: Optional[datetime] = None
+        self._downsampled_on: Optional[date] = None
+
+    def update(self, employee_id: str, name: str, points: List[Point]):
+        """Record a device's points; the newest becomes the technician's live position"""
+        if not points:
+            return
+        newest = max(points, key=lambda point: point[0])
+        position = Position(name, newest[1], newest[2], newest[3], newest[0])
+        with self._lock:
+            self._history.setdefault(employee_id, []).extend(points)
+            current = self._latest.get(employee_id)
+            if current is None or position.recorded_at >= current.recorded_at:
+                self._latest[employee_id] = position
+                self._dirty[employee_id] = position
+            if self._thread is None:
+                self._start_locked()
+
+    def snapshot(self) -> Dict[str, Position]:
+        """Every technician's latest position"""
+        with self._lock:
+            return dict(self._latest)
+
+    def flush(self) -> int:
+        """Persist buffered positions and history; returns the number of technicians written"""
+        with self._lock:
+            dirty, self._dirty = self._dirty, {}
+            history, self._history = self._history, {}
+        if not dirty and not history:
+            return 0
+
+        db = SessionLocal()
+        try:
+            if dirty:
+                table = TechnicianLocation.__table__
+                conn = db.connection()
+                now = datetime.utcnow()
+                stmt = dialect_insert(conn, table)
+                stmt = stmt.on_conflict_do_update(
+                    index_elements=["employee_id"],
+                    set_={
+                        "latitude": stmt.excluded.latitude,
+                        "longitude": stmt.excluded.longitude,
+                        "accuracy_m": stmt.excluded.accuracy_m,
+                        "recorded_at": stmt.excluded.recorded_at,
+                        "updated_at": stmt.excluded.updated_at
+                    },
+                    # Another process may already hold a newer fix
+                    where=table.c.recorded_at < stmt.excluded.recorded_at
+                )
+                conn.execute(stmt, [{
+                    "employee_id": employee_id,
+                    "latitude": position.latitude,
+                    "longitude": position.longitude,
+                    "accuracy_m": position.accuracy_m,
+                    "recorded_at": position.recorded_at,
+                    "updated_at": now
+                } for employee_id, position in dirty.items()])
+            for employee_id, points in history.items():
+                append_breadcrumbs(db, employee_id, points)
+            db.commit()
+        except Exception as e:
+            print(f"[LIVE LOCATIONS ERROR] {e}")
+            db.rollback()
+            self._requeue(dirty, history)
+            return 0
+        finally:
+            db.close()
+        return len(dirty)
+
+    def _requeue(self, dirty: Dict[str, Position], history: Dict[str, List[Point]]):
+        with self._lock:
+            for employee_id, position in dirty.items():
+                self._dirty.setdefault(employee_id, position)
+            for employee_id, points in history.items():
+                self._history[employee_id] = points + self._history.get(employee_id, [])
+
+    def refresh(self):
+        """Merge positions persisted since the last refresh (all of them the first time)"""
+        since = self._refreshed_at
+        started = datetime.utcnow()
+        db = SessionLocal()
+        try:
+            query = db.query(
+                TechnicianLocation.employee_id, User.first_name, User.last_name,
+                TechnicianLocation.latitude, TechnicianLocation.longitude,
+                TechnicianLocation.accuracy_m, TechnicianLocation.recorded_at
+            ).join(User, User.id == TechnicianLocation.employee_id)
+            if since:
+                # Overlap one cycle so rows committed during the last refresh are not missed
+                query = query.filter(TechnicianLocation.updated_at >= since - timedelta(seconds=self.interval))
+            rows = query.all()
+        finally:
+            db.close()
+
+        with self._lock:
+            for employee_id, first_name, last_name, latitude, longitude, accuracy_m, recorded_at in rows:
+                current = self._latest.get(employee_id)
+                if current is None or recorded_at > current.recorded_at:
+                    self._latest[employee_id] = Position(
+                        f"{first_name} {last_name}", latitude, longitude, accuracy_m, recorded_at
+                    )
+        self._refreshed_at = started
+
+    def downsample(self):
+        """Once a day, thin breadcrumb trails older than BREADCRUMB_FULL_RESOLUTION_DAYS"""
+        today = date.today()
+        if self._downsampled_on == today:
+            return
+        db = SessionLocal()
+        try:
+            downsample_breadcrumbs(
+                db,
+                today - timedelta(days=settings.BREADCRUMB_FULL_RESOLUTION_DAYS),
+                settings.BREADCRUMB_DOWNSAMPLE_SECONDS
+            )
+        finally:
+            db.close()
+        self._downsampled_on = today
+
+    def _run(self):
+        while True:
+            for step in (self.refresh, self.flush, self.downsample):
+                try:
+                    step()
+                except Exception as e:
+                    print(f"[LIVE LOCATIONS ERROR] {e}")
+            if self._stop.wait(self.interval):
+                break
+
+    def _start_locked(self):
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="live-locations", daemon=True)
+        self._thread.start()
+
+    def start(self):
+        with self._lock:
+            if self._thread is None:
+                self._start_locked()
+
+    def stop(self):
+        """Stop the background cycle and write whatever is still buffered"""
+        self._stop.set()
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread:
+            thread.join(timeout=5)
+        self.flush()
+
+
+live_locations = LiveLocationCache(settings.LIVE_LOCATION_FLUSH_SECONDS)
@@ -0,0 +1,52 @@
+"""
+Schema steps for Alembic revisions (alembic/versions).
+
+A new database gets every column and index from Base.metadata.create_all, so
+each step checks the live schema first and only fills in what a database
+created before the model change is missing. Running `alembic upgrade head`
+is therefore safe on both.
+"""
+from typing import List
+import sqlalchemy as sa
+from alembic import op
+
+
+def _inspector():
+    return sa.inspect(op.get_bind())
+
+
+def add_column(table_name: str, column: sa.Column):
+    """Add a column unless the table already has it"""
+    if column.name not in {c["name"] for c in _inspector().get_columns(table_name)}:
+        # Batch mode lets SQLite add a column with a foreign key by rebuilding the table
+        with op.batch_alter_table(table_name) as batch_op:
+            batch_op.add_column(column)
+
+
+def column_type(table_name: str, column_name: str):
+    """Type of a column as the live database reports it"""
+    return next(c["type"] for c in _inspector().get_columns(table_name) if c["name"] == column_name)
+
+
+def alter_column_type(table_name: str, column_name: str, type_, postgresql_using: str = None):
+    """Change a column's type unless it already has that type"""
+    current = column_type(table_name, column_name)
+    if isinstance(current, type(type_)):
+        return
+    # SQLite cannot ALTER a column's type; batch mode copies the table, casting the values
+    with op.batch_alter_table(table_name) as batch_op:
+        batch_op.alter_column(column_name, type_=type_, existing_type=current, postgresql_using=postgresql_using)
+
+
+def create_index(name: str, table_name: str, columns: List[str], unique: bool = False):
+    """
+    Create an index unless one with this name exists. A unique index also
+    serves ON CONFLICT on both PostgreSQL and SQLite, so model UniqueConstraints
+    are added this way.
+    """
+    inspector = _inspector()
+    existing = {i["name"] for i in inspector.get_indexes(table_name)}
+    existing |= {c["name"] for c in inspector.get_unique_constraints(table_name)}
+    if name not in existing:
+        op.create_index(name, table_name, columns, unique=unique)
+
@@ -0,0 +1,158 @@
+import random
+import threading
+import uuid
+from datetime import datetime, timedelta
+from typing import List, Optional
+from sqlalchemy import and_, event, or_
+from sqlalchemy.orm import Session
+from app.config import settings
+from app.database import SessionLocal
+from app.models.outbox_message import OutboxMessage
+from app.models.sms_message import SMSMessage
+from app.utils.rate_limit import RateLimiter
+from app.utils.sms import send_sms_message
+
+# Delay before the first retry; doubled for each further attempt
+RETRY_BASE_DELAY = timedelta(seconds=30)
+RETRY_MAX_DELAY = timedelta(hours=1)
+
+# A claim older than this is assumed to belong to a crashed worker
+STALE_CLAIM = timedelta(minutes=5)
+
+_wake = threading.Event()
+_stop = threading.Event()
+_workers: List[threading.Thread] = []
+
+
+def enqueue_sms(db: Session, to_number: str, message: str, sms_message: Optional[SMSMessage] = None) -> OutboxMessage:
+    """
+    Queue an SMS in the caller's transaction; it is sent only if that transaction commits.
+    `sms_message` is the log row to mark sent (with its Twilio SID) once delivered.
+    """
+    outbox_message = OutboxMessage(channel="sms", recipient=to_number, body=message, sms_message=sms_message)
+    db.add(outbox_message)
+    db.info["outbox_pending"] = True
+    return outbox_message
+
+
+@event.listens_for(SessionLocal, "after_commit")
+def _wake_workers_after_commit(session):
+    if session.info.pop("outbox_pending", False):
+        _wake.set()
+
+
+@event.listens_for(SessionLocal, "after_rollback")
+def _discard_after_rollback(session):
+    session.info.pop("outbox_pending", None)
+
+
+def _retry_delay(attempts: int) -> timedelta:
+    delay = min(RETRY_BASE_DELAY * 2 ** (attempts - 1), RETRY_MAX_DELAY)
+    return delay * random.uniform(0.8, 1.2)
+
+
+def claim_batch(db: Session, limit: int) -> List[OutboxMessage]:
+    """
+    Claim up to `limit` due messages for this worker.
+    FOR UPDATE SKIP LOCKED lets concurrent workers take disjoint batches on
+    PostgreSQL; the conditional UPDATE keeps claims exclusive elsewhere.
+    """
+    now = datetime.utcnow()
+    claimable = or_(
+        and_(OutboxMessage.status == "pending", OutboxMessage.next_attempt_at <= now),
+        and_(OutboxMessage.status == "sending", OutboxMessage.claimed_at < now - STALE_CLAIM)
+    )
+    ids = [
+        message_id for (message_id,) in db.query(OutboxMessage.id).filter(claimable)
+        .order_by(OutboxMessage.next_attempt_at)
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+    ]
+    if not ids:
+        db.rollback()
+        return []
+
+    claim_id = str(uuid.uuid4())
+    db.query(OutboxMessage).filter(OutboxMessage.id.in_(ids), claimable).update(
+        {"status": "sending", "claim_id": claim_id, "claimed_at": now},
+        synchronize_session=False
+    )
+    db.commit()
+    return db.query(OutboxMessage).filter(OutboxMessage.claim_id == claim_id).all()
+
+
+def deliver_batch(limiter: RateLimiter) -> int:
+    """Claim and send one batch, scheduling a retry for each message that fails"""
+    db = SessionLocal()
+    try:
+        messages = claim_batch(db, settings.OUTBOX_BATCH_SIZE)
+        for message in messages:
+            limiter.acquire()
+            result = send_sms_message(message.recipient, message.body)
+            now = datetime.utcnow()
+            message.attempts += 1
+            message.claim_id = None
+
+            if result["status"] != "error":
+                message.status = "sent"
+                message.provider_message_id = result.get("sid")
+                message.last_error = None
+                message.sent_at = now
+            else:
+                message.last_error = result["message"]
+                if message.attempts >= settings.OUTBOX_MAX_ATTEMPTS:
+                    message.status = "failed"
+                else:
+                    message.status = "pending"
+                    message.next_attempt_at = now + _retry_delay(message.attempts)
+
+            if message.sms_message_id and message.status != "pending":
+                db.query(SMSMessage).filter(SMSMessage.id == message.sms_message_id).update(
+                    {"status": "sent", "message_sid": message.provider_message_id, "sent_at": now}
+                    if message.status == "sent" else {"status": "failed"},
+                    synchronize_session=False
+                )
+        db.commit()
+        return len(messages)
+    finally:
+        db.close()
+
+
+def _run_worker(limiter: RateLimiter):
+    while not _stop.is_set():
+        try:
+            delivered = deliver_batch(limiter)
+        except Exception as e:
+            print(f"[OUTBOX ERROR] {e}")
+            delivered = 0
+        if delivered < settings.OUTBOX_BATCH_SIZE:
+            _wake.wait(settings.OUTBOX_POLL_SECONDS)
+            _wake.clear()
+
+
+def start_outbox_workers():
+    """Start the delivery worker threads (they share one Twilio rate limit)"""
+    _stop.clear()
+    limiter = RateLimiter(settings.TWILIO_MESSAGES_PER_SECOND)
+    for number in range(settings.OUTBOX_WORKERS):
+        worker = threading.Thread(target=_run_worker, args=(limiter,), name=f"outbox-worker-{number}", daemon=True)
+        worker.start()
+        _workers.append(worker)
+
+
+def stop_outbox_workers():
+    _stop.set()
+    _wake.set()
+    for worker in _workers:
+        worker.join(timeout=10)
+    _workers.clear()
+
+
+if __name__ == "__main__":
+    # Dedicated worker process: python -m app.utils.outbox
+    start_outbox_workers()
+    try:
+        for worker in _workers:
+            worker.join()
+    except KeyboardInterrupt:
+        stop_outbox_workers()
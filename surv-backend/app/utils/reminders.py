@@ -0,0 +1,203 @@
+import threading
+import uuid
+from datetime import date, datetime, timedelta
+from typing import Optional
+from sqlalchemy import bindparam, or_, update
+from app.config import settings
+from app.database import SessionLocal
+from app.models.customer import Customer
+from app.models.job import Job
+from app.models.notification_delivery import NotificationDelivery
+from app.models.sms_message import SMSMessage
+from app.utils.email import SendGridClient, SENDGRID_MAX_PERSONALIZATIONS
+from app.utils.outbox import enqueue_sms
+from app.utils.sql import dialect_insert
+from app.utils.templates import fetch_field_values, get_compiled_template
+
+REMINDER_KIND = "job_reminder"
+
+# Rows per INSERT / IN (...) list
+CHUNK_SIZE = 1000
+
+# A claim older than this is assumed to belong to a crashed run
+STALE_CLAIM = timedelta(minutes=15)
+
+_scheduler_stop = threading.Event()
+
+
+def _chunks(items, size=CHUNK_SIZE):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def _record_results(db, results):
+    """Bulk-write per-message outcomes: [(delivery_id, status, provider_id, error)]"""
+    table = NotificationDelivery.__table__
+    stmt = update(table).where(table.c.id == bindparam("delivery_id")).values(
+        status=bindparam("new_status"),
+        provider_message_id=bindparam("provider_id"),
+        error=bindparam("error_text"),
+        sent_at=bindparam("sent")
+    )
+    now = datetime.utcnow()
+    for chunk in _chunks(results):
+        db.connection().execute(stmt, [
+            {
+                "delivery_id": delivery_id,
+                "new_status": new_status,
+                "provider_id": provider_id,
+                "error_text": error,
+                "sent": now if new_status in ("sent", "mock_sent") else None
+            }
+            for delivery_id, new_status, provider_id, error in chunk
+        ])
+    db.commit()
+
+
+def send_next_day_reminders(target_date: Optional[date] = None) -> dict:
+    """
+    Remind every customer with a scheduled job on target_date (default tomorrow).
+    Each (job, channel) is recorded once in notification_deliveries, so running
+    again for the same date only retries messages that were never sent.
+    """
+    target_date = target_date or date.today() + timedelta(days=1)
+    run_id = str(uuid.uuid4())
+    db = SessionLocal()
+    try:
+        # Tomorrow's jobs and their contact details in one query
+        jobs = db.query(Job.id, Customer.phone, Customer.email).join(
+            Customer, Customer.id == Job.customer_id
+        ).filter(
+            Job.scheduled_date == target_date,
+            Job.status == "scheduled"
+        ).all()
+
+        table = NotificationDelivery.__table__
+        rows = []
+        for job_id, phone, email in jobs:
+            for channel, recipient in (("sms", phone), ("email", email)):
+                if recipient:
+                    rows.append({
+                        "id": str(uuid.uuid4()),
+                        "job_id": job_id,
+                        "kind": REMINDER_KIND,
+                        "channel": channel,
+                        "notification_date": target_date,
+                        "recipient": recipient,
+                        "status": "pending"
+                    })
+        for chunk in _chunks(rows):
+            stmt = dialect_insert(db.connection(), table).on_conflict_do_nothing(
+                index_elements=["job_id", "kind", "channel", "notification_date"]
+            )
+            db.connection().execute(stmt, chunk)
+
+        # Claim unsent messages for this run so overlapping runs never double-send
+        now = datetime.utcnow()
+        db.query(NotificationDelivery).filter(
+            NotificationDelivery.kind == REMINDER_KIND,
+            NotificationDelivery.notification_date == target_date,
+            or_(
+                NotificationDelivery.status == "pending",
+                (NotificationDelivery.status == "sending") & (NotificationDelivery.claimed_at < now - STALE_CLAIM)
+            )
+        ).update({"status": "sending", "run_id": run_id, "claimed_at": now}, synchronize_session=False)
+        db.commit()
+
+        claimed = db.query(
+            NotificationDelivery.id, NotificationDelivery.job_id,
+            NotificationDelivery.channel, NotificationDelivery.recipient, Job.customer_id
+        ).join(Job, Job.id == NotificationDelivery.job_id).filter(NotificationDelivery.run_id == run_id).all()
+
+        message = get_compiled_template(db, REMINDER_KIND)
+        values = {}
+        job_ids = sorted({job_id for _, job_id, _, _, _ in claimed})
+        for chunk in _chunks(job_ids):
+            values.update(fetch_field_values(db, "job", chunk, message.fields))
+    finally:
+        db.close()
+
+    sms = [(d, job_id, customer_id, to) for d, job_id, channel, to, customer_id in claimed if channel == "sms"]
+    emails = [(d, job_id, to) for d, job_id, channel, to, _ in claimed if channel == "email"]
+    results = []
+
+    # SMS: logged and queued for the outbox workers, which send and retry them.
+    # Each chunk is queued in the same transaction that marks its deliveries.
+    db = SessionLocal()
+    try:
+        for chunk in _chunks(sms):
+            for _, job_id, customer_id, to_number in chunk:
+                body = message.body.render(values.get(job_id, {}))
+                sms_log = SMSMessage(
+                    from_number=settings.TWILIO_PHONE_NUMBER,
+                    to_number=to_number,
+                    body=body,
+                    direction="outbound",
+                    status="queued",
+                    job_id=job_id,
+                    customer_id=customer_id
+                )
+                db.add(sms_log)
+                enqueue_sms(db, to_number, body, sms_message=sms_log)
+            queued = [(delivery_id, "queued", None, None) for delivery_id, _, _, _ in chunk]
+            _record_results(db, queued)
+            results.extend(queued)
+    finally:
+        db.close()
+
+    # Email: up to 1000 reminders per SendGrid call, personalised by substitutions
+    email_results = []
+    client = SendGridClient()
+    try:
+        for chunk in _chunks(emails, SENDGRID_MAX_PERSONALIZATIONS):
+            recipients = [
+                {"email": to, "substitutions": message.substitutions(values.get(job_id, {}))}
+                for _, job_id, to in chunk
+            ]
+            try:
+                client.send_batch(message.subject.provider_text, message.body.provider_text, recipients)
+                new_status, error = ("sent" if client.api_key else "mock_sent"), None
+            except Exception as e:
+                print(f"[REMINDERS ERROR] Email batch failed: {e}")
+                new_status, error = "failed", str(e)
+            email_results.extend((delivery_id, new_status, None, error) for delivery_id, _, _ in chunk)
+    finally:
+        client.close()
+
+    db = SessionLocal()
+    try:
+        _record_results(db, email_results)
+    finally:
+        db.close()
+    results.extend(email_results)
+
+    summary = {"date": target_date, "jobs": len(jobs), "claimed": len(claimed)}
+    for _, new_status, _, _ in results:
+        summary[new_status] = summary.get(new_status, 0) + 1
+    return summary
+
+
+def _run_scheduler():
+    """Send reminders once a day at REMINDER_SEND_HOUR_UTC (catching up after a restart)"""
+    now = datetime.utcnow()
+    next_run = now.replace(hour=settings.REMINDER_SEND_HOUR_UTC, minute=0, second=0, microsecond=0)
+    while not _scheduler_stop.wait(max(0, (next_run - datetime.utcnow()).total_seconds())):
+        try:
+            print(f"[REMINDERS] {send_next_day_reminders()}")
+        except Exception as e:
+            print(f"[REMINDERS ERROR] {e}")
+        next_run += timedelta(days=1)
+
+
+def start_reminder_scheduler():
+    _scheduler_stop.clear()
+    threading.Thread(target=_run_scheduler, name="reminder-scheduler", daemon=True).start()
+
+
+def stop_reminder_scheduler():
+    _scheduler_stop.set()
+
+
+if __name__ == "__main__":
+    # For external schedulers: python -m app.utils.reminders
+    print(send_next_day_reminders())
@@ -0,0 +1,200 @@
+from datetime import date, datetime, timedelta
+from typing import Dict, Optional
+from fastapi import HTTPException, status
+from sqlalchemy import event, func, inspect, or_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from app.config import settings
+from app.database import SessionLocal
+from app.models.availability import AvailabilityDay
+from app.models.job import Job
+from app.models.slot_hold import SlotHold
+from app.utils.availability import SLOT_TIMES, SLOT_CAPACITY, count_booked_slots
+from app.utils.sql import dialect_insert
+
+# How long the booking widget keeps a slot while the customer fills in the form
+HOLD_TTL = timedelta(minutes=10)
+
+_WATCHED_FIELDS = ("scheduled_date", "scheduled_start_time", "status")
+
+
+def _live_holds_filter(now: datetime):
+    return or_(
+        SlotHold.status == "confirmed",
+        SlotHold.expires_at >= now
+    )
+
+
+def count_live_holds(db: Session, start_date: date, end_date: date) -> Dict[date, Dict[str, int]]:
+    """Count unexpired and confirmed holds per day and slot"""
+    rows = db.query(SlotHold.slot_date, SlotHold.time_slot, func.count(SlotHold.id)).filter(
+        SlotHold.slot_date >= start_date,
+        SlotHold.slot_date <= end_date,
+        _live_holds_filter(datetime.utcnow())
+    ).group_by(SlotHold.slot_date, SlotHold.time_slot).all()
+
+    counts = {}
+    for slot_date, time_slot, held in rows:
+        counts.setdefault(slot_date, {})[time_slot] = held
+    return counts
+
+
+def _lock_slot_day(db: Session, slot_date: date):
+    """
+    Lock the day's availability row so seat allocation for it is serialized.
+    The row is created first if the grid has not reached this day yet.
+    """
+    conn = db.connection()
+    booked = count_booked_slots(conn, [slot_date])[slot_date]
+    conn.execute(
+        dialect_insert(conn, AvailabilityDay.__table__)
+        .values(slot_date=slot_date, booked_counts=booked, refreshed_at=datetime.utcnow())
+        .on_conflict_do_nothing(index_elements=["slot_date"])
+    )
+    # SQLite has no row locks; the INSERT above already took its write lock
+    db.query(AvailabilityDay.slot_date).filter(
+        AvailabilityDay.slot_date == slot_date
+    ).with_for_update().one()
+
+
+def take_slot_hold(db: Session, slot_date: date, time_slot: str, client_key: Optional[str] = None) -> SlotHold:
+    """
+    Claim a free seat in a slot for HOLD_TTL.
+    Free seats are counted while holding a lock on the day's availability row,
+    so concurrent callers can never take more than SLOT_CAPACITY between them,
+    including seats already given back by approved bookings that now count as
+    scheduled jobs. A client_key may keep at most BOOKING_MAX_HOLDS_PER_CLIENT
+    unexpired holds. Commits its own transaction.
+    """
+    if time_slot not in SLOT_TIMES:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Invalid time slot. Choose one of: {', '.join(SLOT_TIMES)}"
+        )
+
+    now = datetime.utcnow()
+    if client_key:
+        active = db.query(func.count(SlotHold.id)).filter(
+            SlotHold.client_key == client_key,
+            SlotHold.status == "held",
+            SlotHold.expires_at >= now
+        ).scalar()
+        if active >= settings.BOOKING_MAX_HOLDS_PER_CLIENT:
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="Too many time slots are already held. Book or release one first."
+            )
+
+    _lock_slot_day(db, slot_date)
+
+    # Expired holds give their seat back
+    db.query(SlotHold).filter(
+        SlotHold.slot_date == slot_date,
+        SlotHold.time_slot == time_slot,
+        SlotHold.status == "held",
+        SlotHold.expires_at < now
+    ).delete(synchronize_session=False)
+
+    booked = count_booked_slots(db.connection(), [slot_date])[slot_date].get(time_slot, 0)
+    taken_seats = {seat for seat, in db.query(SlotHold.seat).filter(
+        SlotHold.slot_date == slot_date,
+        SlotHold.time_slot == time_slot
+    )}
+    free_seats = [seat for seat in range(SLOT_CAPACITY) if seat not in taken_seats]
+
+    if free_seats and booked + len(taken_seats) < SLOT_CAPACITY:
+        hold = SlotHold(
+            slot_date=slot_date,
+            time_slot=time_slot,
+            seat=free_seats[0],
+            expires_at=now + HOLD_TTL,
+            client_key=client_key
+        )
+        db.add(hold)
+        try:
+            db.commit()
+        except IntegrityError:
+            # Only reachable if a writer skipped the day lock
+            db.rollback()
+        else:
+            db.refresh(hold)
+            return hold
+    else:
+        db.rollback()
+
+    raise HTTPException(
+        status_code=status.HTTP_409_CONFLICT,
+        detail="This time slot is no longer available"
+    )
+
+
+def held_time_slot(db: Session, hold_id: str, slot_date: date) -> str:
+    """The slot an unexpired hold is for, when the booking form did not repeat it"""
+    time_slot = db.query(SlotHold.time_slot).filter(
+        SlotHold.id == hold_id,
+        SlotHold.slot_date == slot_date,
+        SlotHold.status == "held",
+        SlotHold.expires_at >= datetime.utcnow()
+    ).scalar()
+    if time_slot is None:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Your reserved time slot has expired. Please choose another time."
+        )
+    return time_slot
+
+
+def confirm_slot_hold(db: Session, hold_id: str, job_id: str, slot_date: date, time_slot: Optional[str]):
+    """Turn an unexpired hold into a confirmed booking for job_id (caller commits)"""
+    confirmed = db.query(SlotHold).filter(
+        SlotHold.id == hold_id,
+        SlotHold.slot_date == slot_date,
+        SlotHold.time_slot == time_slot,
+        SlotHold.status == "held",
+        SlotHold.expires_at >= datetime.utcnow()
+    ).update(
+        {"status": "confirmed", "job_id": job_id, "expires_at": None},
+        synchronize_session=False
+    )
+
+    if confirmed != 1:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Your reserved time slot has expired. Please choose another time."
+        )
+
+
+def release_slot_hold(db: Session, hold_id: str) -> bool:
+    """Give up an unconfirmed hold"""
+    released = db.query(SlotHold).filter(
+        SlotHold.id == hold_id,
+        SlotHold.status == "held"
+    ).delete(synchronize_session=False)
+    db.commit()
+    return released > 0
+
+
+@event.listens_for(SessionLocal, "before_flush")
+def _collect_rescheduled_jobs(session, flush_context, instances):
+    """Confirmed holds only cover pending bookings that stay in their slot"""
+    job_ids = session.info.setdefault("released_hold_jobs", set())
+    for obj in session.dirty:
+        if not isinstance(obj, Job):
+            continue
+        attrs = inspect(obj).attrs
+        if any(attrs[field].history.has_changes() for field in _WATCHED_FIELDS):
+            job_ids.add(obj.id)
+
+    for obj in session.deleted:
+        if isinstance(obj, Job):
+            job_ids.add(obj.id)
+
+
+@event.listens_for(SessionLocal, "after_flush")
+def _release_rescheduled_holds(session, flush_context):
+    """Free the seat once a booking is approved, cancelled or moved"""
+    job_ids = session.info.pop("released_hold_jobs", None)
+    if job_ids:
+        session.connection().execute(
+            SlotHold.__table__.delete().where(SlotHold.__table__.c.job_id.in_(job_ids))
+        )
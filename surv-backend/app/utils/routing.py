@@ -0,0 +1,343 @@
+import csv
+import sys
+import time as clock
+from dataclasses import dataclass
+from datetime import date
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from app.config import settings
+from app.database import SessionLocal
+from app.models.customer import Customer
+from app.models.job import Job
+from app.models.zip_centroid import ZipCentroid
+from app.utils.breadcrumbs import METERS_PER_MILE
+from app.utils.geo import haversine_m
+from app.utils.sql import dialect_insert
+
+# Jobs that still need a visit
+OPEN_STATUSES_EXCLUDED = ["completed", "cancelled"]
+
+# Improvement passes per local search before settling
+MAX_PASSES = 50
+
+
+@dataclass
+class Stop:
+    job_id: str
+    job_number: str
+    title: str
+    customer_name: str
+    latitude: Optional[float]
+    longitude: Optional[float]
+    location_source: Optional[str]  # customer, zip or None when unlocated
+    window_start: Optional[int]  # minutes after midnight
+    duration: int  # minutes
+
+
+def load_day_stops(db: Session, route_date: date, technician_ids: Optional[List[str]] = None) -> Dict[str, List[Stop]]:
+    """Open jobs per technician for a day in their current (hand-set) order, located in one query"""
+    query = db.query(
+        Job.id, Job.job_number, Job.title, Job.assigned_to, Job.scheduled_start_time, Job.estimated_duration,
+        Customer.first_name, Customer.last_name, Customer.latitude, Customer.longitude,
+        ZipCentroid.latitude, ZipCentroid.longitude
+    ).join(Customer, Customer.id == Job.customer_id).outerjoin(
+        ZipCentroid, ZipCentroid.zip_code == func.substr(Customer.zip_code, 1, 5)
+    ).filter(
+        Job.scheduled_date == route_date,
+        Job.assigned_to.isnot(None),
+        Job.status.notin_(OPEN_STATUSES_EXCLUDED)
+    )
+    if technician_ids is not None:
+        query = query.filter(Job.assigned_to.in_(technician_ids))
+
+    rows = sorted(query.all(), key=lambda row: (row.scheduled_start_time is None, row.scheduled_start_time or 0, row.job_number))
+    stops: Dict[str, List[Stop]] = {}
+    for (job_id, job_number, title, technician_id, start_time, duration,
+         first_name, last_name, customer_lat, customer_lng, zip_lat, zip_lng) in rows:
+        if customer_lat is not None and customer_lng is not None:
+            latitude, longitude, source = customer_lat, customer_lng, "customer"
+        elif zip_lat is not None:
+            latitude, longitude, source = zip_lat, zip_lng, "zip"
+        else:
+            latitude = longitude = source = None
+        stops.setdefault(technician_id, []).append(Stop(
+            job_id=job_id,
+            job_number=job_number,
+            title=title,
+            customer_name=f"{first_name} {last_name}",
+            latitude=latitude,
+            longitude=longitude,
+            location_source=source,
+            window_start=start_time.hour * 60 + start_time.minute if start_time else None,
+            duration=duration or settings.ROUTE_DEFAULT_DURATION_MINUTES
+        ))
+    return stops
+
+
+def _clock(minutes: float) -> str:
+    hours, minutes = divmod(int(round(minutes)), 60)
+    return f"{hours:02d}:{minutes:02d}"
+
+
+class RoutePlanner:
+    """
+    Orders one technician's stops: nearest-neighbour construction followed by
+    2-opt and, while any stop is late, relocation moves. Travel is straight-line
+    distance scaled by ROUTE_CIRCUITY_FACTOR at ROUTE_AVERAGE_SPEED_MPH. Cost is
+    travel minutes plus ROUTE_LATE_PENALTY per minute arriving after a stop's
+    start time plus ROUTE_ARRIVAL_WINDOW_MINUTES; arriving early means waiting.
+    """
+
+    def __init__(self, stops: List[Stop], start: Optional[Tuple[float, float]] = None):
+        self.stops = stops
+        self.n = len(stops)
+        self.day_start = settings.ROUTE_DAY_START_HOUR * 60
+        self.window = settings.ROUTE_ARRIVAL_WINDOW_MINUTES
+        self.penalty = settings.ROUTE_LATE_PENALTY
+        self.windows = [stop.window_start for stop in stops]
+        self.durations = [stop.duration for stop in stops]
+        minutes_per_meter = 60 / (settings.ROUTE_AVERAGE_SPEED_MPH * METERS_PER_MILE)
+
+        # Node n is the starting point; with no start given the first leg is free
+        points = [(stop.latitude, stop.longitude) for stop in stops]
+        self.meters = [[0.0] * (self.n + 1) for _ in range(self.n + 1)]
+        for i in range(self.n):
+            for j in range(i + 1, self.n):
+                meters = haversine_m(*points[i], *points[j]) * settings.ROUTE_CIRCUITY_FACTOR
+                self.meters[i][j] = self.meters[j][i] = meters
+            if start:
+                self.meters[self.n][i] = haversine_m(*start, *points[i]) * settings.ROUTE_CIRCUITY_FACTOR
+        self.minutes = [[meters * minutes_per_meter for meters in row] for row in self.meters]
+
+    def cost(self, route: List[int], bound: float = float("inf"), prefix: Optional[Tuple[int, float, float]] = None) -> float:
+        """
+        Route cost, resuming from prefix = (position, clock, cost) of a route known
+        to share its first `position` stops. Gives up (returns inf) once bound is passed.
+        """
+        minutes, windows, durations, window = self.minutes, self.windows, self.durations, self.window
+        position, now, total = prefix or (0, self.day_start, 0.0)
+        previous = route[position - 1] if position else self.n
+        for node in route[position:]:
+            travel = minutes[previous][node]
+            total += travel
+            now += travel
+            window_start = windows[node]
+            if window_start is not None:
+                if now < window_start:
+                    now = window_start
+                elif now > window_start + window:
+                    total += self.penalty * (now - window_start - window)
+            if total >= bound:
+                return float("inf")
+            now += durations[node]
+            previous = node
+        return total
+
+    def prefixes(self, route: List[int]) -> List[Tuple[int, float, float]]:
+        """(position, clock, cost) after each leading part of a route, for resuming cost()"""
+        states = [(0, self.day_start, 0.0)]
+        for position in range(1, len(route) + 1):
+            _, now, total = states[-1]
+            node = route[position - 1]
+            previous = route[position - 2] if position > 1 else self.n
+            travel = self.minutes[previous][node]
+            total += travel
+            now += travel
+            window_start = self.windows[node]
+            if window_start is not None:
+                if now < window_start:
+                    now = window_start
+                elif now > window_start + self.window:
+                    total += self.penalty * (now - window_start - self.window)
+            states.append((position, now + self.durations[node], total))
+        return states
+
+    def nearest_neighbour(self) -> List[int]:
+        """Greedy order: always go to the stop that is cheapest to serve next"""
+        minutes = self.minutes
+        remaining = set(range(self.n))
+        route = []
+        now = self.day_start
+        previous = self.n
+        while remaining:
+            best, best_score, best_time = None, None, None
+            for node in remaining:
+                arrival = now + minutes[previous][node]
+                window_start = self.windows[node]
+                score = minutes[previous][node]
+                if window_start is not None:
+                    if arrival < window_start:
+                        score += window_start - arrival
+                        arrival = window_start
+                    elif arrival > window_start + self.window:
+                        score += self.penalty * (arrival - window_start - self.window)
+                if best_score is None or score < best_score:
+                    best, best_score, best_time = node, score, arrival
+            route.append(best)
+            remaining.discard(best)
+            now = best_time + self.stops[best].duration
+            previous = best
+        return route
+
+    def two_opt(self, route: List[int], cost: float) -> Tuple[List[int], float]:
+        """Reverse segments that shorten the route; windows are checked only for those candidates"""
+        minutes = self.minutes
+        m = len(route)
+        for _ in range(MAX_PASSES):
+            improved = False
+            for i in range(m - 1):
+                a = route[i - 1] if i else self.n
+                for j in range(i + 1, m):
+                    b, c = route[i], route[j]
+                    delta = minutes[a][c] - minutes[a][b]
+                    if j + 1 < m:
+                        d = route[j + 1]
+                        delta += minutes[b][d] - minutes[c][d]
+                    if delta >= -1e-9:
+                        continue
+                    candidate = route[:i] + route[i:j + 1][::-1] + route[j + 1:]
+                    candidate_cost = self.cost(candidate, cost - 1e-9)
+                    if candidate_cost < cost - 1e-9:
+                        route, cost, improved = candidate, candidate_cost, True
+                        a = route[i - 1] if i else self.n
+            if not improved:
+                break
+        return route, cost
+
+    def relocate(self, route: List[int], cost: float) -> Tuple[List[int], float]:
+        """Move single stops to other positions, which can fix late arrivals that 2-opt cannot"""
+        m = len(route)
+        for _ in range(MAX_PASSES):
+            improved = False
+            for i in range(m):
+                states = self.prefixes(route)
+                for j in range(m):
+                    if i == j:
+                        continue
+                    candidate = route[:i] + route[i + 1:]
+                    candidate.insert(j, route[i])
+                    candidate_cost = self.cost(candidate, cost - 1e-9, states[min(i, j)])
+                    if candidate_cost < cost - 1e-9:
+                        route, cost, improved = candidate, candidate_cost, True
+                        states = self.prefixes(route)
+            if not improved:
+                break
+        return route, cost
+
+    def solve(self) -> List[int]:
+        # Seeds: greedy, and the current order (already sorted by start time)
+        best_route, best_cost = None, None
+        for seed in (self.nearest_neighbour(), list(range(self.n))):
+            route, cost = self.two_opt(seed, self.cost(seed))
+            if best_cost is None or cost < best_cost:
+                best_route, best_cost = route, cost
+        if any(window is not None for window in self.windows):
+            best_route, best_cost = self.relocate(best_route, best_cost)
+            best_route, best_cost = self.two_opt(best_route, best_cost)
+        return best_route
+
+    def schedule(self, route: List[int]) -> dict:
+        """Arrival, service and travel details for a route"""
+        now = self.day_start
+        previous = self.n
+        stops = []
+        travel_total = meters_total = late_total = 0.0
+        for position, node in enumerate(route, start=1):
+            stop = self.stops[node]
+            travel = self.minutes[previous][node]
+            arrival = now + travel
+            start = arrival
+            late = 0.0
+            if stop.window_start is not None:
+                start = max(arrival, stop.window_start)
+                late = max(0.0, arrival - stop.window_start - self.window)
+            stops.append({
+                "position": position,
+                "job_id": stop.job_id,
+                "job_number": stop.job_number,
+                "title": stop.title,
+                "customer_name": stop.customer_name,
+                "latitude": stop.latitude,
+                "longitude": stop.longitude,
+                "location_source": stop.location_source,
+                "travel_minutes": round(travel),
+                "travel_miles": round(self.meters[previous][node] / METERS_PER_MILE, 1),
+                "arrival": _clock(arrival),
+                "start": _clock(start),
+                "end": _clock(start + stop.duration),
+                "requested_start": _clock(stop.window_start) if stop.window_start is not None else None,
+                "wait_minutes": round(start - arrival),
+                "late_minutes": round(late)
+            })
+            travel_total += travel
+            meters_total += self.meters[previous][node]
+            late_total += late
+            now = start + stop.duration
+            previous = node
+        return {
+            "stops": stops,
+            "travel_minutes": round(travel_total),
+            "miles": round(meters_total / METERS_PER_MILE, 1),
+            "late_minutes": round(late_total),
+            "finish": _clock(now) if route else None
+        }
+
+
+def plan_route(stops: List[Stop], start: Optional[Tuple[float, float]] = None) -> dict:
+    """Proposed visit order for one technician's day, with the current order's totals for comparison"""
+    started = clock.perf_counter()
+    located = [stop for stop in stops if stop.location_source]
+    unlocated = [stop for stop in stops if not stop.location_source]
+    planner = RoutePlanner(located, start)
+    proposed = planner.schedule(planner.solve())
+    current = planner.schedule(list(range(len(located))))
+    return {
+        **proposed,
+        "current": {key: current[key] for key in ("travel_minutes", "miles", "late_minutes", "finish")},
+        "unlocated": [{"job_id": stop.job_id, "job_number": stop.job_number, "title": stop.title} for stop in unlocated],
+        "solve_ms": round((clock.perf_counter() - started) * 1000, 1)
+    }
+
+
+def load_zip_centroids(path: str) -> int:
+    """
+    Load ZIP centroids from a CSV with zip/latitude/longitude columns, or from
+    the Census ZCTA gazetteer file (tab-separated GEOID/INTPTLAT/INTPTLONG).
+    """
+    with open(path, newline="", encoding="utf-8") as source:
+        sample = source.readline()
+        source.seek(0)
+        reader = csv.DictReader(source, delimiter="\t" if "\t" in sample else ",")
+        rows = []
+        for record in reader:
+            record = {key.strip().lower(): value.strip() for key, value in record.items() if key}
+            zip_code = record.get("zip") or record.get("zip_code") or record.get("geoid")
+            latitude = record.get("latitude") or record.get("lat") or record.get("intptlat")
+            longitude = record.get("longitude") or record.get("lng") or record.get("intptlong")
+            if zip_code and latitude and longitude:
+                rows.append({"zip_code": zip_code.zfill(5)[:5], "latitude": float(latitude), "longitude": float(longitude)})
+
+    db = SessionLocal()
+    try:
+        conn = db.connection()
+        table = ZipCentroid.__table__
+        for start in range(0, len(rows), 1000):
+            stmt = dialect_insert(conn, table)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=["zip_code"],
+                set_={"latitude": stmt.excluded.latitude, "longitude": stmt.excluded.longitude}
+            )
+            conn.execute(stmt, rows[start:start + 1000])
+        db.commit()
+    finally:
+        db.close()
+    return len(rows)
+
+
+if __name__ == "__main__":
+    # python -m app.utils.routing load-zips 2020_Gaz_zcta_national.txt
+    if len(sys.argv) == 3 and sys.argv[1] == "load-zips":
+        print(f"Loaded {load_zip_centroids(sys.argv[2])} ZIP centroids")
+    else:
+        print("Usage: python -m app.utils.routing load-zips <file>")
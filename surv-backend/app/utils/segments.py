@@ -0,0 +1,109 @@
+import json
+import threading
+import time
+from collections import OrderedDict
+from sqlalchemy import exists, func
+from sqlalchemy.orm import Session
+from app.models.customer import Customer
+from app.models.invoice import Invoice
+from app.models.job import Job
+from app.models.service_plan import CustomerServicePlan
+from app.schemas.segment import SegmentFilters
+
+# How long an editing-time estimate is reused for identical filters
+ESTIMATE_TTL_SECONDS = 300
+
+_ESTIMATE_CACHE_SIZE = 512
+_estimates: "OrderedDict[str, tuple]" = OrderedDict()
+_estimates_lock = threading.Lock()
+
+
+def segment_query(db: Session, filters: SegmentFilters, *columns):
+    """Customers matching a segment, compiled into one query joining jobs and invoices"""
+    query = db.query(*(columns or (Customer.id,)))
+
+    if filters.has_email:
+        query = query.filter(Customer.email.isnot(None))
+
+    if filters.cities:
+        query = query.filter(func.lower(Customer.city).in_([city.lower() for city in filters.cities]))
+
+    if filters.zip_codes:
+        query = query.filter(Customer.zip_code.in_(filters.zip_codes))
+
+    if filters.job_types:
+        query = query.filter(exists().where(
+            Job.customer_id == Customer.id,
+            Job.job_type.in_(filters.job_types)
+        ))
+
+    if filters.last_service_before or filters.last_service_after:
+        last_service = db.query(
+            Job.customer_id.label("customer_id"),
+            func.max(Job.scheduled_date).label("last_service")
+        ).filter(Job.status == "completed").group_by(Job.customer_id).subquery()
+        query = query.join(last_service, last_service.c.customer_id == Customer.id)
+        if filters.last_service_before:
+            query = query.filter(last_service.c.last_service < filters.last_service_before)
+        if filters.last_service_after:
+            query = query.filter(last_service.c.last_service >= filters.last_service_after)
+
+    if filters.min_outstanding_balance is not None:
+        balances = db.query(
+            Invoice.customer_id.label("customer_id"),
+            func.sum(Invoice.amount_due).label("balance")
+        ).filter(Invoice.status.notin_(["paid", "void"])).group_by(Invoice.customer_id).subquery()
+        query = query.join(balances, balances.c.customer_id == Customer.id).filter(
+            balances.c.balance >= filters.min_outstanding_balance
+        )
+
+    if filters.service_plan_status == "none":
+        query = query.filter(~exists().where(CustomerServicePlan.customer_id == Customer.id))
+    elif filters.service_plan_status:
+        query = query.filter(exists().where(
+            CustomerServicePlan.customer_id == Customer.id,
+            CustomerServicePlan.status == filters.service_plan_status
+        ))
+
+    return query
+
+
+def count_segment(db: Session, filters: SegmentFilters) -> int:
+    """Exact segment size, used when a campaign is sent"""
+    return segment_query(db, filters).count()
+
+
+def estimate_segment_count(db: Session, filters: SegmentFilters) -> int:
+    """
+    Approximate segment size for the segment editor.
+    PostgreSQL answers from the planner's row estimate without scanning;
+    other databases fall back to an exact count. Results are cached briefly
+    per distinct filter set.
+    """
+    key = filters.model_dump_json()
+    now = time.monotonic()
+    with _estimates_lock:
+        cached = _estimates.get(key)
+        if cached and now - cached[0] < ESTIMATE_TTL_SECONDS:
+            _estimates.move_to_end(key)
+            return cached[1]
+
+    conn = db.connection()
+    if conn.dialect.name == "postgresql":
+        compiled = segment_query(db, filters).statement.compile(
+            dialect=conn.dialect,
+            compile_kwargs={"render_postcompile": True}
+        )
+        plan = conn.exec_driver_sql("EXPLAIN (FORMAT JSON) " + str(compiled), compiled.params).scalar()
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        estimate = int(plan[0]["Plan"]["Plan Rows"])
+    else:
+        estimate = count_segment(db, filters)
+
+    with _estimates_lock:
+        _estimates[key] = (now, estimate)
+        _estimates.move_to_end(key)
+        while len(_estimates) > _ESTIMATE_CACHE_SIZE:
+            _estimates.popitem(last=False)
+    return estimate
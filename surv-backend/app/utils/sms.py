@@ -0,0 +1,57 @@
+import re
+import threading
+from app.config import settings
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def twilio_configured() -> bool:
+    return bool(settings.TWILIO_ACCOUNT_SID and settings.TWILIO_AUTH_TOKEN)
+
+
+def valid_twilio_signature(url: str, params: dict, signature: str) -> bool:
+    """Check X-Twilio-Signature; without an auth token (local development) there is nothing to check against"""
+    if not settings.TWILIO_AUTH_TOKEN:
+        return True
+    from twilio.request_validator import RequestValidator
+    return RequestValidator(settings.TWILIO_AUTH_TOKEN).validate(url, params, signature or "")
+
+
+def normalize_phone(number: str) -> str:
+    """E.164 form of a phone number; 10-digit numbers are assumed to be US"""
+    digits = re.sub(r"\D", "", number or "")
+    if len(digits) == 10:
+        digits = "1" + digits
+    return "+" + digits if digits else ""
+
+
+def get_twilio_client():
+    """Shared Twilio client so HTTP connections are pooled across sends"""
+    global _client
+    with _client_lock:
+        if _client is None:
+            from twilio.rest import Client
+            _client = Client(settings.TWILIO_ACCOUNT_SID, settings.TWILIO_AUTH_TOKEN)
+        return _client
+
+
+def send_sms_message(to_number: str, message: str) -> dict:
+    """Send one SMS via Twilio (logged only when Twilio is not configured)"""
+    if not twilio_configured():
+        print(f"[SMS MOCK] To: {to_number}, Message: {message}")
+        return {"status": "mock_sent"}
+
+    try:
+        options = {"status_callback": settings.TWILIO_STATUS_CALLBACK_URL} if settings.TWILIO_STATUS_CALLBACK_URL else {}
+        msg = get_twilio_client().messages.create(
+            body=message,
+            from_=settings.TWILIO_PHONE_NUMBER,
+            to=to_number,
+            **options
+        )
+        print(f"[SMS SENT] To: {to_number}, SID: {msg.sid}")
+        return {"status": "sent", "sid": msg.sid}
+    except Exception as e:
+        print(f"[SMS ERROR] {e}")
+        return {"status": "error", "message": str(e)}
@@ -0,0 +1,132 @@
+import threading
+import time
+from datetime import datetime
+from typing import Dict, Optional, Tuple
+from sqlalchemy import or_
+from app.config import settings
+from app.database import SessionLocal
+from app.models.sms_message import SMSMessage
+
+# Twilio MessageStatus values in the order they can occur; a callback never
+# moves a message back to an earlier status, since Twilio does not guarantee
+# callbacks arrive in order.
+STATUS_RANK = {
+    "accepted": 0,
+    "queued": 1,
+    "sending": 2,
+    "sent": 3,
+    "delivered": 4,
+    "undelivered": 4,
+    "failed": 4,
+    "received": 4
+}
+
+FAILED_STATUSES = ["failed", "undelivered"]
+
+# How long a callback waits for its message_sid to be recorded by the sender
+UNMATCHED_TTL_SECONDS = 120
+
+
+class StatusBuffer:
+    """Collects status callbacks in memory and writes them as a few bulk UPDATEs"""
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._pending: Dict[str, Tuple[str, Optional[str], datetime]] = {}
+        self._unmatched_since: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def add(self, message_sid: str, message_status: str, error_code: Optional[str] = None):
+        """Record a callback; only the furthest-along status per message is kept"""
+        message_status = message_status.lower()
+        with self._lock:
+            current = self._pending.get(message_sid)
+            if current is None or STATUS_RANK.get(message_status, 0) >= STATUS_RANK.get(current[0], 0):
+                self._pending[message_sid] = (message_status, error_code, datetime.utcnow())
+            if self._thread is None:
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._run, name="sms-status-flusher", daemon=True)
+                self._thread.start()
+
+    def flush(self) -> int:
+        """Write buffered statuses, grouped by status; returns the number of messages updated"""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return 0
+
+        by_status: Dict[str, list] = {}
+        for message_sid, (message_status, error_code, updated_at) in pending.items():
+            by_status.setdefault(message_status, []).append(message_sid)
+
+        db = SessionLocal()
+        try:
+            known = {
+                message_sid for (message_sid,) in db.query(SMSMessage.message_sid).filter(
+                    SMSMessage.message_sid.in_(list(pending))
+                )
+            }
+            updated = 0
+            for message_status, sids in by_status.items():
+                sids = [sid for sid in sids if sid in known]
+                if not sids:
+                    continue
+                earlier = [s for s, rank in STATUS_RANK.items() if rank < STATUS_RANK.get(message_status, 0)]
+                values = {"status": message_status, "status_updated_at": datetime.utcnow()}
+                if message_status in FAILED_STATUSES:
+                    # One error code per UPDATE; failures are rare enough to write individually
+                    for sid in sids:
+                        updated += db.query(SMSMessage).filter(
+                            SMSMessage.message_sid == sid,
+                            or_(SMSMessage.status.is_(None), SMSMessage.status.in_(earlier))
+                        ).update({**values, "error_code": pending[sid][1]}, synchronize_session=False)
+                else:
+                    updated += db.query(SMSMessage).filter(
+                        SMSMessage.message_sid.in_(sids),
+                        or_(SMSMessage.status.is_(None), SMSMessage.status.in_(earlier))
+                    ).update(values, synchronize_session=False)
+            db.commit()
+        except Exception as e:
+            print(f"[SMS STATUS ERROR] {e}")
+            db.rollback()
+            self._requeue(pending, pending)
+            return 0
+        finally:
+            db.close()
+
+        # Callbacks can beat the sender recording the SID; keep those for a while
+        self._requeue(pending, {sid: value for sid, value in pending.items() if sid not in known})
+        return updated
+
+    def _requeue(self, pending, unmatched):
+        now = time.monotonic()
+        with self._lock:
+            for message_sid, value in unmatched.items():
+                first_seen = self._unmatched_since.setdefault(message_sid, now)
+                if now - first_seen > UNMATCHED_TTL_SECONDS:
+                    self._unmatched_since.pop(message_sid, None)
+                    continue
+                current = self._pending.get(message_sid)
+                if current is None or STATUS_RANK.get(value[0], 0) >= STATUS_RANK.get(current[0], 0):
+                    self._pending[message_sid] = value
+            for message_sid in pending:
+                if message_sid not in unmatched:
+                    self._unmatched_since.pop(message_sid, None)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.flush()
+
+    def stop(self):
+        """Stop the flusher and write whatever is still buffered"""
+        self._stop.set()
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread:
+            thread.join(timeout=5)
+        self.flush()
+
+
+status_buffer = StatusBuffer(settings.SMS_STATUS_FLUSH_SECONDS)
@@ -0,0 +1,163 @@
+import sys
+import uuid
+from datetime import datetime
+from sqlalchemy import bindparam, case, event, func, tuple_, update
+from app.database import SessionLocal
+from app.models.sms_message import SMSMessage
+from app.models.sms_thread import SMSThread
+from app.utils.sms import normalize_phone
+from app.utils.sql import dialect_insert
+
+PREVIEW_LENGTH = 160
+
+# Messages or threads handled per backfill transaction
+BACKFILL_BATCH_SIZE = 2000
+
+
+@event.listens_for(SessionLocal, "before_flush")
+def _update_threads_for_new_messages(session, flush_context, instances):
+    """Upsert the thread summary for every new SMS in the same transaction as the message"""
+    threads = {}
+    for obj in session.new:
+        if not isinstance(obj, SMSMessage):
+            continue
+        if obj.id is None:
+            obj.id = str(uuid.uuid4())
+        if obj.received_at is None:
+            obj.received_at = datetime.utcnow()
+        inbound = obj.direction == "inbound"
+        obj.counterpart_number = normalize_phone(obj.from_number if inbound else obj.to_number)
+
+        thread = threads.get(obj.counterpart_number)
+        if thread is None:
+            thread = threads[obj.counterpart_number] = {
+                "id": str(uuid.uuid4()),
+                "counterpart_number": obj.counterpart_number,
+                "customer_id": None,
+                "employee_id": None,
+                "message_count": 0,
+                "unread_count": 0,
+                "last_message_at": None
+            }
+        thread["message_count"] += 1
+        thread["unread_count"] += 1 if inbound else 0
+        thread["customer_id"] = obj.customer_id or thread["customer_id"]
+        # Inbound messages come from the employee; outbound ones only mention who sent them
+        if inbound:
+            thread["employee_id"] = obj.employee_id or thread["employee_id"]
+        if thread["last_message_at"] is None or obj.received_at >= thread["last_message_at"]:
+            thread.update({
+                "last_message_id": obj.id,
+                "last_message_at": obj.received_at,
+                "last_message_preview": (obj.body or "")[:PREVIEW_LENGTH],
+                "last_direction": obj.direction
+            })
+
+    if not threads:
+        return
+
+    _upsert_threads(session.connection(), threads.values(), recount=False)
+
+
+def _upsert_threads(conn, threads, recount: bool):
+    """Add message counts to existing threads, or replace them when `recount` is set"""
+    table = SMSThread.__table__
+    now = datetime.utcnow()
+    stmt = dialect_insert(conn, table)
+    newer = stmt.excluded.last_message_at >= table.c.last_message_at
+    conn.execute(
+        stmt.on_conflict_do_update(
+            index_elements=["counterpart_number"],
+            set_={
+                "message_count": stmt.excluded.message_count if recount else table.c.message_count + stmt.excluded.message_count,
+                "unread_count": table.c.unread_count + stmt.excluded.unread_count,
+                "customer_id": func.coalesce(stmt.excluded.customer_id, table.c.customer_id),
+                "employee_id": func.coalesce(stmt.excluded.employee_id, table.c.employee_id),
+                # Keep the latest message if an older one is inserted late
+                **{
+                    column: case((newer, stmt.excluded[column]), else_=table.c[column])
+                    for column in ("last_message_id", "last_message_at", "last_message_preview", "last_direction")
+                },
+                "updated_at": stmt.excluded.updated_at
+            }
+        ),
+        [{**thread, "updated_at": now} for thread in threads]
+    )
+
+
+def backfill_threads() -> int:
+    """
+    One-off rebuild for messages stored before threads existed: fills in
+    counterpart_number and recounts every thread from sms_messages.
+    Backfilled history counts as read. Returns the number of threads written.
+    """
+    db = SessionLocal()
+    try:
+        table = SMSMessage.__table__
+        while True:
+            rows = db.query(SMSMessage.id, SMSMessage.direction, SMSMessage.from_number, SMSMessage.to_number).filter(
+                SMSMessage.counterpart_number.is_(None)
+            ).limit(BACKFILL_BATCH_SIZE).all()
+            if not rows:
+                break
+            db.execute(
+                update(table).where(table.c.id == bindparam("message_id")).values(counterpart_number=bindparam("number")),
+                [{
+                    "message_id": message_id,
+                    "number": normalize_phone(from_number if direction == "inbound" else to_number)
+                } for message_id, direction, from_number, to_number in rows]
+            )
+            db.commit()
+
+        written = 0
+        last_number = ""
+        while True:
+            stats = db.query(
+                SMSMessage.counterpart_number,
+                func.count(SMSMessage.id),
+                func.max(SMSMessage.received_at),
+                func.max(SMSMessage.customer_id),
+                func.max(case((SMSMessage.direction == "inbound", SMSMessage.employee_id)))
+            ).filter(
+                SMSMessage.counterpart_number > last_number,
+                SMSMessage.received_at.isnot(None)
+            ).group_by(SMSMessage.counterpart_number).order_by(
+                SMSMessage.counterpart_number
+            ).limit(BACKFILL_BATCH_SIZE).all()
+            if not stats:
+                break
+            last_number = stats[-1][0]
+
+            latest = {}
+            for message in db.query(SMSMessage).filter(
+                tuple_(SMSMessage.counterpart_number, SMSMessage.received_at).in_(
+                    [(number, last_at) for number, _, last_at, _, _ in stats]
+                )
+            ).order_by(SMSMessage.id):
+                latest[message.counterpart_number] = message
+
+            _upsert_threads(db.connection(), [{
+                "id": str(uuid.uuid4()),
+                "counterpart_number": number,
+                "customer_id": customer_id,
+                "employee_id": employee_id,
+                "message_count": message_count,
+                "unread_count": 0,
+                "last_message_id": latest[number].id,
+                "last_message_at": last_at,
+                "last_message_preview": (latest[number].body or "")[:PREVIEW_LENGTH],
+                "last_direction": latest[number].direction
+            } for number, message_count, last_at, customer_id, employee_id in stats], recount=True)
+            db.commit()
+            written += len(stats)
+        return written
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    # One-off after upgrading: python -m app.utils.sms_threads backfill
+    if sys.argv[1:] != ["backfill"]:
+        sys.exit("usage: python -m app.utils.sms_threads backfill")
+    print(f"Backfilled {backfill_threads()} SMS threads")
+
@@ -0,0 +1,52 @@
+from functools import lru_cache
+from sqlalchemy import inspect, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+from app.models.number_sequence import NumberSequence
+
+
+def dialect_insert(bind, table):
+    """Return an INSERT that supports ON CONFLICT for the bound database"""
+    if bind.dialect.name == "postgresql":
+        return postgresql.insert(table)
+    return sqlite.insert(table)
+
+
+@lru_cache()
+def has_unique_index(engine, table_name: str, column: str) -> bool:
+    """
+    Check whether the live database enforces uniqueness on a single column.
+    create_all never alters existing tables, so a constraint added to a model
+    may be missing on databases created before it.
+    """
+    inspector = inspect(engine)
+    unique_sets = [c["column_names"] for c in inspector.get_unique_constraints(table_name)]
+    unique_sets += [i["column_names"] for i in inspector.get_indexes(table_name) if i.get("unique")]
+    return [column] in unique_sets
+
+
+def next_sequence_value(db: Session, name: str, seed) -> int:
+    """
+    Atomically increment a named counter and return the new value.
+    The counter row stays locked until the caller's transaction ends, so
+    concurrent writers never receive the same number.
+    `seed` is called once to pick the starting value when the counter is new.
+    """
+    table = NumberSequence.__table__
+    conn = db.connection()
+    bump = (
+        update(table)
+        .where(table.c.name == name)
+        .values(value=table.c.value + 1)
+        .returning(table.c.value)
+    )
+
+    value = conn.execute(bump).scalar()
+    if value is None:
+        conn.execute(
+            dialect_insert(conn, table)
+            .values(name=name, value=seed())
+            .on_conflict_do_nothing(index_elements=["name"])
+        )
+        value = conn.execute(bump).scalar()
+    return value
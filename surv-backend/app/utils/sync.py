@@ -0,0 +1,301 @@
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional
+from sqlalchemy import event, func, inspect, or_, select, update
+from sqlalchemy.orm import Session
+from app.config import settings
+from app.database import SessionLocal
+from app.models.customer import Customer
+from app.models.file_upload import FileUpload
+from app.models.invoice import Invoice
+from app.models.job import Job
+from app.models.job_note import JobNote
+from app.models.number_sequence import NumberSequence
+from app.models.payment import Payment
+from app.models.sync_tombstone import SyncTombstone
+from app.schemas.customer import CustomerResponse
+from app.schemas.job import JobResponse
+from app.utils.sql import dialect_insert, next_sequence_value
+
+# Rows the technician app keeps offline, by the name used in sync payloads
+SYNCED_MODELS = {Job: "job", Customer: "customer", JobNote: "note", FileUpload: "file"}
+
+# Every model stamped with change_seq; invoices and payments use it as the accounting export high-water mark
+SEQUENCED_MODELS = (*SYNCED_MODELS, Invoice, Payment)
+
+CHANGE_SEQUENCE = "sync_change"
+# Cursors older than this may have missed pruned tombstones
+HORIZON_SEQUENCE = "sync_horizon"
+# Ordinal of the last scheduled_date whose jobs were tombstoned for leaving the history window
+AGED_SEQUENCE = "sync_aged_through"
+
+# Row IDs per UPDATE when stamping a commit's changes, within SQLite's bound-parameter limit
+STAMP_CHUNK = 500
+
+
+def _sequence_value(db: Session, name: str) -> int:
+    return db.query(NumberSequence.value).filter(NumberSequence.name == name).scalar() or 0
+
+
+def _advance_sequence(conn, name: str, value: int):
+    """Move a named counter forward to `value`; it never goes back"""
+    table = NumberSequence.__table__
+    stmt = dialect_insert(conn, table).values(name=name, value=value)
+    conn.execute(stmt.on_conflict_do_update(
+        index_elements=["name"],
+        set_={"value": stmt.excluded.value},
+        where=table.c.value < stmt.excluded.value
+    ))
+
+
+def history_start() -> date:
+    """Earliest scheduled_date kept in a technician's synced set"""
+    return date.today() - timedelta(days=settings.SYNC_HISTORY_DAYS)
+
+
+def current_change_seq(db: Session) -> int:
+    """Highest committed change_seq; every row stamped at or below it is already visible"""
+    return _sequence_value(db, CHANGE_SEQUENCE)
+
+
+@event.listens_for(SessionLocal, "after_flush")
+def _collect_changes(session, flush_context):
+    """
+    Remember the sequenced rows written in this flush, which jobs entered a
+    technician's set, and the tombstones owed for rows leaving one. Nothing is
+    stamped until commit, see _stamp_change_seq.
+    """
+    changed = [obj for obj in session.new if type(obj) in SEQUENCED_MODELS]
+    changed += [obj for obj in session.dirty if type(obj) in SEQUENCED_MODELS and session.is_modified(obj)]
+    deleted = [obj for obj in session.deleted if type(obj) in SYNCED_MODELS]
+    if not changed and not deleted:
+        return
+    pending = session.info.setdefault("sync_changes", {"rows": {}, "scoped": set(), "tombstones": []})
+
+    for obj in changed:
+        pending["rows"].setdefault(type(obj).__table__, set()).add(obj.id)
+        if not isinstance(obj, Job):
+            continue
+        state = inspect(obj)
+        attrs = state.attrs
+        if (
+            obj in session.new
+            or attrs.assigned_to.history.has_changes()
+            or attrs.scheduled_date.history.has_changes()
+            or "cancelled" in attrs.status.history.deleted
+        ):
+            # Entering a technician's set: their app needs the customer, notes and files too
+            pending["scoped"].add(obj.id)
+        for previous in attrs.assigned_to.history.deleted:
+            if previous and previous != obj.assigned_to:
+                pending["tombstones"].append({"entity_type": "job", "entity_id": obj.id, "technician_id": previous})
+
+    for obj in deleted:
+        pending["tombstones"].append({
+            "entity_type": SYNCED_MODELS[type(obj)],
+            "entity_id": obj.id,
+            "technician_id": obj.assigned_to if isinstance(obj, Job) else None
+        })
+
+
+@event.listens_for(SessionLocal, "before_commit")
+def _stamp_change_seq(session):
+    """
+    Stamp this transaction's rows with one change sequence value just before
+    it commits. The counter row stays locked only from here to the commit, so
+    sequence order still matches commit order (a client never skips a change
+    by syncing while another write is in flight) without queueing writers for
+    the whole of their transactions.
+    """
+    session.flush()
+    pending = session.info.pop("sync_changes", None)
+    if not pending:
+        return
+
+    seq = next_sequence_value(session, CHANGE_SEQUENCE, lambda: 0)
+    conn = session.connection()
+    for table, ids in pending["rows"].items():
+        values = {"change_seq": seq}
+        if table is Job.__table__:
+            scoped = ids & pending["scoped"]
+            _stamp_rows(conn, table, scoped, dict(values, scope_seq=seq))
+            ids = ids - scoped
+        _stamp_rows(conn, table, ids, values)
+    if pending["tombstones"]:
+        conn.execute(SyncTombstone.__table__.insert(), [
+            dict(tombstone, change_seq=seq) for tombstone in pending["tombstones"]
+        ])
+
+
+def _stamp_rows(conn, table, ids, values: dict):
+    # Keep updated_at as it was: stamping is bookkeeping, not an edit
+    values = dict(values, **{column.name: column for column in table.c if column.onupdate is not None})
+    ids = list(ids)
+    for i in range(0, len(ids), STAMP_CHUNK):
+        conn.execute(update(table).where(table.c.id.in_(ids[i:i + STAMP_CHUNK])).values(values))
+
+
+@event.listens_for(SessionLocal, "after_rollback")
+def _discard_changes(session):
+    session.info.pop("sync_changes", None)
+
+
+def _note_json(note: JobNote) -> dict:
+    return {
+        "id": note.id,
+        "job_id": note.job_id,
+        "user_id": note.user_id,
+        "note": note.note,
+        "is_internal": note.is_internal,
+        "created_at": note.created_at
+    }
+
+
+def _file_json(f: FileUpload) -> dict:
+    return {
+        "id": f.id,
+        "entity_type": f.entity_type,
+        "entity_id": f.entity_id,
+        "filename": f.original_filename,
+        "file_size": f.file_size,
+        "file_type": f.file_type,
+        "category": f.category,
+        "description": f.description,
+        "uploaded_at": f.uploaded_at
+    }
+
+
+def sync_changes(db: Session, technician_id: str, since: int = 0) -> dict:
+    """
+    Everything in a technician's synced set that changed after `since`, plus the
+    IDs removed from it. The set is their jobs scheduled from SYNC_HISTORY_DAYS
+    ago onwards with those jobs' customers, notes and files. since=0 (or a
+    cursor older than the tombstone horizon) returns the whole set with reset=True.
+    Jobs rescheduled before the window are removed here; jobs that age out of it
+    are removed once retire_aged_jobs has run for their date.
+    """
+    reset = since <= 0 or since < _sequence_value(db, HORIZON_SEQUENCE)
+    if reset:
+        since = 0
+    # Read before the data so anything committed meanwhile is sent again, never skipped
+    cursor = current_change_seq(db)
+
+    window_start = history_start()
+    active = [
+        Job.assigned_to == technician_id,
+        Job.scheduled_date >= window_start,
+        Job.status != "cancelled"
+    ]
+    job_ids = select(Job.id).where(*active)
+    customer_ids = select(Job.customer_id).where(*active)
+
+    # Deltas include changed jobs outside the window, so ones moved before it get removed
+    jobs = db.query(Job).filter(*active) if reset else db.query(Job).filter(Job.assigned_to == technician_id)
+    customers = db.query(Customer).filter(Customer.id.in_(customer_ids))
+    notes = db.query(JobNote).filter(JobNote.job_id.in_(job_ids))
+    files = db.query(FileUpload).filter(or_(
+        (FileUpload.entity_type == "job") & FileUpload.entity_id.in_(job_ids),
+        (FileUpload.entity_type == "customer") & FileUpload.entity_id.in_(customer_ids)
+    ))
+    removed: Dict[str, List[str]] = {"jobs": [], "customers": [], "notes": [], "files": []}
+
+    if not reset:
+        entered_job_ids = select(Job.id).where(*active, Job.scope_seq > since)
+        entered_customer_ids = select(Job.customer_id).where(*active, Job.scope_seq > since)
+        jobs = jobs.filter(Job.change_seq > since)
+        customers = customers.filter(or_(Customer.change_seq > since, Customer.id.in_(entered_customer_ids)))
+        notes = notes.filter(or_(JobNote.change_seq > since, JobNote.job_id.in_(entered_job_ids)))
+        files = files.filter(or_(
+            FileUpload.change_seq > since,
+            (FileUpload.entity_type == "job") & FileUpload.entity_id.in_(entered_job_ids),
+            (FileUpload.entity_type == "customer") & FileUpload.entity_id.in_(entered_customer_ids)
+        ))
+        tombstones = db.query(SyncTombstone.entity_type, SyncTombstone.entity_id).filter(
+            SyncTombstone.change_seq > since,
+            or_(SyncTombstone.technician_id == technician_id, SyncTombstone.technician_id.is_(None))
+        ).distinct()
+        for entity_type, entity_id in tombstones:
+            removed[f"{entity_type}s"].append(entity_id)
+
+    changed_jobs = []
+    for job in jobs.order_by(Job.scheduled_date, Job.scheduled_start_time):
+        if job.status == "cancelled" or job.scheduled_date < window_start:
+            removed["jobs"].append(job.id)
+        else:
+            changed_jobs.append(JobResponse.model_validate(job))
+    # A job reassigned away and back again is current, not removed
+    current_ids = {job.id for job in changed_jobs}
+    removed["jobs"] = [job_id for job_id in dict.fromkeys(removed["jobs"]) if job_id not in current_ids]
+
+    return {
+        "cursor": max(cursor, since),
+        "reset": reset,
+        "jobs": changed_jobs,
+        "customers": [CustomerResponse.model_validate(customer) for customer in customers],
+        "notes": [_note_json(note) for note in notes.order_by(JobNote.created_at)],
+        "files": [_file_json(f) for f in files.order_by(FileUpload.uploaded_at)],
+        "removed": removed
+    }
+
+
+def prune_tombstones(days: Optional[int] = None) -> int:
+    """
+    Delete tombstones older than `days` (default SYNC_TOMBSTONE_RETENTION_DAYS)
+    and advance the horizon so clients that could have missed them resync fully
+    """
+    days = days if days is not None else settings.SYNC_TOMBSTONE_RETENTION_DAYS
+    cutoff = datetime.utcnow() - timedelta(days=days)
+    db = SessionLocal()
+    try:
+        horizon = db.query(func.max(SyncTombstone.change_seq)).filter(SyncTombstone.created_at < cutoff).scalar()
+        if horizon is None:
+            return 0
+        pruned = db.query(SyncTombstone).filter(
+            SyncTombstone.change_seq <= horizon
+        ).delete(synchronize_session=False)
+        _advance_sequence(db.connection(), HORIZON_SEQUENCE, horizon)
+        db.commit()
+        return pruned
+    finally:
+        db.close()
+
+
+def retire_aged_jobs() -> int:
+    """
+    Tombstone jobs whose scheduled_date has slid out of the SYNC_HISTORY_DAYS
+    window since the last run, so clients drop them without a full resync.
+    The first run covers SYNC_TOMBSTONE_RETENTION_DAYS back; returns jobs retired.
+    """
+    db = SessionLocal()
+    try:
+        last_day = history_start() - timedelta(days=1)
+        done = _sequence_value(db, AGED_SEQUENCE)
+        if done:
+            first_day = date.fromordinal(done + 1)
+        else:
+            first_day = last_day - timedelta(days=settings.SYNC_TOMBSTONE_RETENTION_DAYS)
+        if first_day > last_day:
+            return 0
+
+        aged = db.query(Job.id, Job.assigned_to).filter(
+            Job.assigned_to.isnot(None),
+            Job.scheduled_date >= first_day,
+            Job.scheduled_date <= last_day,
+            Job.status != "cancelled"
+        ).all()
+        if aged:
+            seq = next_sequence_value(db, CHANGE_SEQUENCE, lambda: 0)
+            db.execute(SyncTombstone.__table__.insert(), [
+                {"entity_type": "job", "entity_id": job_id, "technician_id": technician_id, "change_seq": seq}
+                for job_id, technician_id in aged
+            ])
+        _advance_sequence(db.connection(), AGED_SEQUENCE, last_day.toordinal())
+        db.commit()
+        return len(aged)
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    # For external schedulers, daily: python -m app.utils.sync
+    print(f"Retired {retire_aged_jobs()} aged-out jobs")
+    print(f"Pruned {prune_tombstones()} sync tombstones")
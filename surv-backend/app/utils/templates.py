@@ -0,0 +1,248 @@
+import re
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Dict, FrozenSet, Iterable, List, Tuple
+from fastapi import HTTPException, status
+from sqlalchemy.orm import Session, aliased
+from app.models.customer import Customer
+from app.models.invoice import Invoice
+from app.models.job import Job
+from app.models.message_template import MessageTemplate
+from app.models.user import User
+
+Technician = aliased(User, name="technician")
+
+# Built-in templates, used until a template of the same name is saved
+DEFAULT_TEMPLATES = {
+    "job_confirmation": {
+        "category": "operations",
+        "subject": "Your Service Appointment is Confirmed",
+        "body": "Dear {customer_name},\n\nYour {service_type} is scheduled for {date}."
+    },
+    "invoice_reminder": {
+        "category": "billing",
+        "subject": "Invoice Due Reminder",
+        "body": "Dear {customer_name},\n\nYour invoice #{invoice_number} is due on {due_date}."
+    },
+    "service_complete": {
+        "category": "operations",
+        "subject": "Service Completed - Thank You!",
+        "body": "Dear {customer_name},\n\nThank you for choosing Surv for your {service_type}."
+    },
+    "review_request": {
+        "category": "marketing",
+        "subject": "We'd Love Your Feedback",
+        "body": "Dear {customer_name},\n\nHow did we do on your {service_type}? We'd love to hear from you."
+    },
+    "job_reminder": {
+        "category": "notifications",
+        "subject": "Appointment Reminder",
+        "body": "Reminder: Your {service_type} is scheduled for {date}"
+    },
+    "job_confirmed": {
+        "category": "notifications",
+        "subject": "Job Confirmed",
+        "body": "Job Confirmed: {service_type} on {date}"
+    }
+}
+
+# Placeholder -> (entity, columns to fetch, formatter)
+FIELD_SOURCES = {
+    "first_name": ("customer", [Customer.first_name], lambda first: first or ""),
+    "last_name": ("customer", [Customer.last_name], lambda last: last or ""),
+    "customer_name": ("customer", [Customer.first_name, Customer.last_name],
+                      lambda first, last: f"{first or ''} {last or ''}".strip()),
+    "service_type": ("job", [Job.title], lambda title: title or ""),
+    "job_number": ("job", [Job.job_number], lambda number: number or ""),
+    "date": ("job", [Job.scheduled_date], lambda d: str(d) if d else ""),
+    "time": ("job", [Job.scheduled_start_time],
+             lambda t: t.strftime("%I:%M %p") if t else "TBD"),
+    "technician_name": ("technician", [Technician.first_name, Technician.last_name],
+                        lambda first, last: f"{first or ''} {last or ''}".strip()),
+    "invoice_number": ("invoice", [Invoice.invoice_number], lambda number: number or ""),
+    "due_date": ("invoice", [Invoice.due_date], lambda d: str(d) if d else ""),
+    "amount_due": ("invoice", [Invoice.amount_due],
+                   lambda amount: f"{amount:.2f}" if amount is not None else "")
+}
+
+# Entities whose fields can be rendered for each kind of record
+ROOT_ENTITIES = {
+    "customer": {"customer"},
+    "job": {"job", "customer", "technician", "invoice"},
+    "invoice": {"invoice", "customer", "job"}
+}
+
+# {name}, or a {{ / }} escape
+_TOKEN = re.compile(r"\{\{|\}\}|\{([A-Za-z_][A-Za-z0-9_]*)\}")
+
+_CACHE_SIZE = 256
+_cache: "OrderedDict[str, Tuple[int, CompiledMessage]]" = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+class CompiledTemplate:
+    """
+    A template parsed once into literal and placeholder parts. Only {name} with
+    an identifier inside is a placeholder; other braces (CSS, JSON) are literal
+    text, and {{ and }} stay available as escapes for a literal { or }.
+    """
+
+    def __init__(self, text: str):
+        self.text = text
+        self.parts: List[Tuple[str, str]] = []  # (literal, field) pairs
+        literal = []
+        position = 0
+        for match in _TOKEN.finditer(text):
+            literal.append(text[position:match.start()])
+            position = match.end()
+            if match.group(1) is None:
+                literal.append(match.group(0)[0])
+            else:
+                self.parts.append(("".join(literal), match.group(1)))
+                literal = []
+        self.parts.append(("".join(literal) + text[position:], None))
+        self.fields: FrozenSet[str] = frozenset(field for _, field in self.parts if field is not None)
+
+    def render(self, values: Dict[str, str]) -> str:
+        return "".join(
+            literal + (values.get(field, "") if field is not None else "")
+            for literal, field in self.parts
+        )
+
+    @property
+    def provider_text(self) -> str:
+        """The text with escapes resolved and each placeholder as its substitution key"""
+        return self.render({field: substitution_key(field) for field in self.fields})
+
+
+class CompiledMessage:
+    """Compiled subject and body of one template"""
+
+    def __init__(self, subject: str, body: str):
+        self.subject = compile_template(subject or "")
+        self.body = compile_template(body)
+        self.fields = self.subject.fields | self.body.fields
+
+    def substitutions(self, values: Dict[str, str]) -> Dict[str, str]:
+        """Substitution key -> value, for providers that substitute into provider_text server-side"""
+        return {substitution_key(field): values.get(field, "") for field in self.fields}
+
+
+@lru_cache(maxsize=_CACHE_SIZE)
+def compile_template(text: str) -> CompiledTemplate:
+    """Parse template text, reusing the result for identical text"""
+    return CompiledTemplate(text)
+
+
+def substitution_key(field: str) -> str:
+    # Unlike "{field}", this cannot come from an escaped literal such as "{{field}}"
+    return f"[%{field}%]"
+
+
+def validate_template(subject: str, body: str, root: str = "job") -> CompiledMessage:
+    """Compile a template, rejecting placeholders that cannot be rendered for `root` records"""
+    message = CompiledMessage(subject, body)
+    unknown = sorted(
+        field for field in message.fields
+        if field not in FIELD_SOURCES or FIELD_SOURCES[field][0] not in ROOT_ENTITIES[root]
+    )
+    if unknown:
+        allowed = sorted(f for f, source in FIELD_SOURCES.items() if source[0] in ROOT_ENTITIES[root])
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unknown placeholders: {', '.join(unknown)}. Available: {', '.join(allowed)}"
+        )
+    return message
+
+
+def get_template_text(db: Session, name: str) -> Tuple[str, str]:
+    """Subject and body of a saved template, or of the built-in one with that name"""
+    template = db.query(MessageTemplate.subject, MessageTemplate.body).filter(
+        MessageTemplate.name == name,
+        MessageTemplate.is_active == True
+    ).first()
+    if template:
+        return template.subject, template.body
+    if name in DEFAULT_TEMPLATES:
+        return DEFAULT_TEMPLATES[name]["subject"], DEFAULT_TEMPLATES[name]["body"]
+    raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Template not found")
+
+
+def get_compiled_template(db: Session, name: str) -> CompiledMessage:
+    """Look up a template by name, compiling it only when it is new or was edited"""
+    row = db.query(MessageTemplate.version).filter(
+        MessageTemplate.name == name,
+        MessageTemplate.is_active == True
+    ).first()
+    version = row.version if row else 0
+
+    with _cache_lock:
+        cached = _cache.get(name)
+        if cached and cached[0] == version:
+            _cache.move_to_end(name)
+            return cached[1]
+
+    compiled = CompiledMessage(*get_template_text(db, name))
+    with _cache_lock:
+        _cache[name] = (version, compiled)
+        _cache.move_to_end(name)
+        while len(_cache) > _CACHE_SIZE:
+            _cache.popitem(last=False)
+    return compiled
+
+
+def invalidate_template(name: str):
+    """Drop a template from this process's cache after an edit"""
+    with _cache_lock:
+        _cache.pop(name, None)
+
+
+def fetch_field_values(db: Session, root: str, ids: Iterable[str], fields: Iterable[str]) -> Dict[str, Dict[str, str]]:
+    """Fetch only the columns the given placeholders need, for a batch of root records"""
+    ids = list(ids)
+    fields = sorted(fields)
+    root_model = {"customer": Customer, "job": Job, "invoice": Invoice}[root]
+    entities = {FIELD_SOURCES[field][0] for field in fields}
+
+    columns = [root_model.id]
+    for field in fields:
+        columns.extend(FIELD_SOURCES[field][1])
+    query = db.query(*columns).select_from(root_model)
+
+    if root == "job":
+        if "customer" in entities:
+            query = query.join(Customer, Customer.id == Job.customer_id)
+        if "technician" in entities:
+            query = query.outerjoin(Technician, Technician.id == Job.assigned_to)
+        if "invoice" in entities:
+            query = query.outerjoin(Invoice, Invoice.job_id == Job.id)
+    elif root == "invoice":
+        if "customer" in entities:
+            query = query.join(Customer, Customer.id == Invoice.customer_id)
+        if "job" in entities:
+            query = query.outerjoin(Job, Job.id == Invoice.job_id)
+
+    values = {}
+    for row in query.filter(root_model.id.in_(ids)):
+        if row[0] in values:
+            continue
+        record = {}
+        position = 1
+        for field in fields:
+            _, field_columns, formatter = FIELD_SOURCES[field]
+            record[field] = formatter(*row[position:position + len(field_columns)])
+            position += len(field_columns)
+        values[row[0]] = record
+    return values
+
+
+def render_messages(db: Session, name: str, root: str, ids: Iterable[str]) -> Dict[str, Tuple[str, str]]:
+    """Render a stored template for a batch of records: {id: (subject, body)}"""
+    ids = list(ids)
+    message = get_compiled_template(db, name)
+    values = fetch_field_values(db, root, ids, message.fields) if message.fields else {i: {} for i in ids}
+    return {
+        record_id: (message.subject.render(record), message.body.render(record))
+        for record_id, record in values.items()
+    }
@@ -0,0 +1,181 @@
+from collections import defaultdict
+from dataclasses import dataclass, field
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterable, List, Optional
+from sqlalchemy.orm import Session
+from app.config import settings
+from app.models.time_entry import TimeEntry
+from app.utils.archive import archive_covers, read_archive
+
+ENTRY_TYPES = ("clock_in", "clock_out", "break_start", "break_end")
+
+# Punches this far outside the period are fetched so shifts crossing its edges still pair up
+EDGE_WINDOW = timedelta(days=1)
+
+
+@dataclass
+class DayTotals:
+    worked_seconds: int = 0
+    break_seconds: int = 0
+    shifts: int = 0
+    regular_hours: float = 0.0
+    overtime_hours: float = 0.0
+
+
+@dataclass
+class Timesheet:
+    employee_id: str
+    days: Dict[date, DayTotals] = field(default_factory=lambda: defaultdict(DayTotals))
+    flags: List[dict] = field(default_factory=list)
+
+    @property
+    def regular_hours(self) -> float:
+        return round(sum(day.regular_hours for day in self.days.values()), 2)
+
+    @property
+    def overtime_hours(self) -> float:
+        return round(sum(day.overtime_hours for day in self.days.values()), 2)
+
+    @property
+    def break_hours(self) -> float:
+        return round(sum(day.break_seconds for day in self.days.values()) / 3600, 2)
+
+    @property
+    def shifts(self) -> int:
+        return sum(day.shifts for day in self.days.values())
+
+
+def _pair_punches(rows: Iterable[tuple], period_start: datetime, period_end: datetime,
+                  count_start: datetime) -> Dict[str, Timesheet]:
+    """
+    Single pass over (employee_id, entry_id, entry_type, entry_time) rows ordered by
+    employee and time. Shifts count toward the day they were clocked in; break time
+    is deducted; punches in the period that cannot be paired are flagged. Shifts from
+    count_start on are totalled so weekly overtime can see the whole first week.
+    """
+    sheets: Dict[str, Timesheet] = {}
+    current = None
+    clock_in = break_start = None
+    break_seconds = 0
+
+    def flag(issue, entry_id, entry_time):
+        if period_start <= entry_time <= period_end:
+            sheet.flags.append({"type": issue, "entry_id": entry_id, "entry_time": entry_time})
+
+    def close_open_shift():
+        if clock_in:
+            flag("missing_clock_out", clock_in[0], clock_in[1])
+
+    for employee_id, entry_id, entry_type, entry_time in rows:
+        if employee_id != current:
+            if current is not None:
+                close_open_shift()
+            current = employee_id
+            sheet = sheets[employee_id] = Timesheet(employee_id)
+            clock_in = break_start = None
+            break_seconds = 0
+
+        if entry_type == "clock_in":
+            close_open_shift()
+            clock_in = (entry_id, entry_time)
+            break_start = None
+            break_seconds = 0
+        elif entry_type == "break_start":
+            if not clock_in:
+                flag("break_outside_shift", entry_id, entry_time)
+            elif break_start:
+                flag("missing_break_end", break_start[0], break_start[1])
+            else:
+                break_start = (entry_id, entry_time)
+        elif entry_type == "break_end":
+            if not clock_in or not break_start:
+                flag("missing_break_start", entry_id, entry_time)
+            else:
+                break_seconds += int((entry_time - break_start[1]).total_seconds())
+                break_start = None
+        elif entry_type == "clock_out":
+            if not clock_in:
+                flag("missing_clock_in", entry_id, entry_time)
+                continue
+            if break_start:
+                # Treat the break as running until clock-out
+                flag("missing_break_end", break_start[0], break_start[1])
+                break_seconds += int((entry_time - break_start[1]).total_seconds())
+            if count_start <= clock_in[1] <= period_end:
+                day = sheet.days[clock_in[1].date()]
+                day.worked_seconds += max(0, int((entry_time - clock_in[1]).total_seconds()) - break_seconds)
+                day.break_seconds += break_seconds
+                day.shifts += 1
+            clock_in = break_start = None
+            break_seconds = 0
+
+    if current is not None:
+        close_open_shift()
+    return sheets
+
+
+def _week_start(day_date: date) -> date:
+    return day_date - timedelta(days=(day_date.weekday() - settings.PAYROLL_WEEK_START_DAY) % 7)
+
+
+def _apply_overtime(sheet: Timesheet):
+    """Daily overtime first, then weekly overtime on the remaining regular hours"""
+    daily_limit = settings.PAYROLL_DAILY_OVERTIME_HOURS
+    weekly_limit = settings.PAYROLL_WEEKLY_OVERTIME_HOURS
+    week_regular: Dict[date, float] = defaultdict(float)
+
+    for day_date in sorted(sheet.days):
+        day = sheet.days[day_date]
+        hours = day.worked_seconds / 3600
+        regular = min(hours, daily_limit) if daily_limit else hours
+        overtime = hours - regular
+
+        if weekly_limit:
+            week = _week_start(day_date)
+            excess = max(0.0, week_regular[week] + regular - weekly_limit)
+            regular -= excess
+            overtime += excess
+            week_regular[week] += regular
+
+        day.regular_hours = round(regular, 2)
+        day.overtime_hours = round(overtime, 2)
+
+
+def build_timesheets(
+    db: Session,
+    date_from: date,
+    date_to: date,
+    employee_ids: Optional[List[str]] = None
+) -> Dict[str, Timesheet]:
+    """Timesheets for every employee with punches in the period, from one ordered fetch"""
+    period_start = datetime.combine(date_from, datetime.min.time())
+    period_end = datetime.combine(date_to, datetime.max.time())
+    # Hours worked earlier in the period's first payroll week count toward its weekly overtime
+    count_start = datetime.combine(_week_start(date_from), datetime.min.time())
+    fetch_start, fetch_end = count_start - EDGE_WINDOW, period_end + EDGE_WINDOW
+
+    query = db.query(
+        TimeEntry.employee_id, TimeEntry.id, TimeEntry.entry_type, TimeEntry.entry_time
+    ).filter(
+        TimeEntry.entry_time >= fetch_start,
+        TimeEntry.entry_time <= fetch_end
+    )
+    if employee_ids:
+        query = query.filter(TimeEntry.employee_id.in_(employee_ids))
+    rows = query.order_by(TimeEntry.employee_id, TimeEntry.entry_time).yield_per(10000)
+
+    # Periods reaching back past the retention window include archived punches
+    if archive_covers(db, "time_entries", fetch_start, fetch_end):
+        archived = [
+            (row["employee_id"], row["id"], row["entry_type"], row["entry_time"])
+            for row in read_archive(db, "time_entries", fetch_start, fetch_end)
+            if not employee_ids or row["employee_id"] in employee_ids
+        ]
+        rows = sorted(list(rows) + archived, key=lambda row: (row[0], row[3]))
+
+    sheets = _pair_punches(rows, period_start, period_end, count_start)
+    for sheet in sheets.values():
+        _apply_overtime(sheet)
+        for day_date in [day_date for day_date in sheet.days if day_date < date_from]:
+            del sheet.days[day_date]
+    return sheets